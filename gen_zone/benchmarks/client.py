@@ -0,0 +1,99 @@
+"""
+Асинхронный клиент, который обращается к ASGI-приложению напрямую, без сети.
+
+Так бенчмарк меряет сам Django/Channels (мидлвари, view, сериализаторы, БД, channel layer),
+а не сетевой стек и не сервер приложений.
+"""
+import asyncio
+import json
+from urllib.parse import urlencode
+
+
+class ASGIClient:
+
+    def __init__(self, application, host='localhost'):
+        self.application = application
+        self.host = host
+
+    def _scope(self, scope_type, path, query, headers):
+        return {
+            'type': scope_type,
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'scheme': 'ws' if scope_type == 'websocket' else 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': urlencode(query or {}).encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode()), *headers],
+            'client': ('127.0.0.1', 50000),
+            'server': (self.host, 80),
+        }
+
+    async def request(self, method, path, data=None, query=None, token=None):
+        """
+        Возвращает (status, body). data отправляется как JSON.
+        """
+        headers = []
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers.append((b'content-type', b'application/json'))
+            headers.append((b'content-length', str(len(body)).encode()))
+        if token is not None:
+            headers.append((b'authorization', f'Bearer {token}'.encode()))
+        scope = {**self._scope('http', path, query, headers), 'method': method}
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        status = None
+        chunks = []
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.application(scope, receive, send)
+        return status, b''.join(chunks)
+
+    async def websocket(self, path, query=None, subprotocols=()):
+        """
+        Открывает websocket-сессию; None, если приложение отклонило подключение.
+        """
+        headers = [(b'origin', f'http://{self.host}'.encode())]
+        scope = {**self._scope('websocket', path, query, headers), 'subprotocols': list(subprotocols)}
+        session = WebSocketSession()
+        session.task = asyncio.create_task(self.application(scope, session.inbound.get, session.outbound.put))
+        await session.inbound.put({'type': 'websocket.connect'})
+        message = await session.outbound.get()
+        if message['type'] != 'websocket.accept':
+            await session.task
+            return None
+        return session
+
+
+class WebSocketSession:
+
+    def __init__(self):
+        self.inbound = asyncio.Queue()
+        self.outbound = asyncio.Queue()
+        self.task = None
+
+    async def send_json(self, data):
+        await self.inbound.put({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_json(self):
+        while True:
+            message = await self.outbound.get()
+            if message['type'] == 'websocket.close':
+                raise ConnectionError('websocket закрыт приложением')
+            if message.get('text') is not None:
+                return json.loads(message['text'])
+
+    async def close(self):
+        await self.inbound.put({'type': 'websocket.disconnect', 'code': 1000})
+        await self.task
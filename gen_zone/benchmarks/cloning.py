@@ -0,0 +1,83 @@
+"""
+Бенчмарк копирования курса (courses/cloning.py): время и число запросов к БД для маленького
+курса и для курса с деревом из --modules x --lessons x --steps x --contents узлов
+(по умолчанию 10 x 10 x 25 x 1 - около 5 тысяч). Число запросов не должно расти с деревом;
+в SQLite добавляются только пачки bulk_create по 999 параметров.
+
+Запуск из каталога gen_zone (DATABASE_URL - база, на которой меряем):
+    python -m benchmarks.cloning --repeat 3
+"""
+import argparse
+import os
+import time
+from collections import Counter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=int, default=10)
+    parser.add_argument('--lessons', type=int, default=10, help='уроков в модуле')
+    parser.add_argument('--steps', type=int, default=25, help='шагов в уроке')
+    parser.add_argument('--contents', type=int, default=1, help='блоков контента в шаге')
+    parser.add_argument('--repeat', type=int, default=3, help='прогонов, берется лучший')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gen_zone.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from courses.cloning import clone_course
+    from courses.models import Course
+    from courses.teardown import delete_course
+    from gen_zone.testing import seed
+    from .database import throwaway_database
+
+    with throwaway_database():
+        data = seed(courses=1, modules=1, lessons=1, steps=1, contents=1, students=1, messages=0)
+        small = data.course
+        large = seed_tree(data.owner, args)
+        nodes = args.modules * (1 + args.lessons * (1 + args.steps * (1 + args.contents)))
+
+        print(f'{connection.vendor}: {nodes} узлов в большом курсе')
+        print(f"{'course':<8}{'nodes':>8}{'queries':>9}{'best ms':>10}  statements")
+        for name, course, size in (('small', small, 4), ('large', large, nodes)):
+            best = float('inf')
+            for _ in range(args.repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    clone = clone_course(course, data.owner)
+                    best = min(best, time.perf_counter() - started)
+                delete_course(Course.objects.get(pk=clone.pk))
+            statements = Counter(query['sql'].split(None, 1)[0] for query in queries)
+            print(f"{name:<8}{size:>8}{len(queries):>9}{best * 1000:>10.1f}  "
+                  + ', '.join(f'{kind} {count}' for kind, count in sorted(statements.items())))
+
+
+def seed_tree(owner, args):
+    from courses.models import Content, Course, Lesson, Module, Step
+
+    course = Course.objects.create(title='Large', description='', owner=owner, preview='courses/seed/large.png')
+    modules = Module.objects.bulk_create([
+        Module(course=course, module_num=number, module_title=f'Module {number}', module_description='')
+        for number in range(1, args.modules + 1)
+    ])
+    lessons = Lesson.objects.bulk_create([
+        Lesson(module=module, course=course, lesson_num=number, lesson_title=f'Lesson {number}', lesson_description='')
+        for module in modules for number in range(1, args.lessons + 1)
+    ])
+    steps = Step.objects.bulk_create([
+        Step(lesson=lesson, course=course, step_num=number)
+        for lesson in lessons for number in range(1, args.steps + 1)
+    ])
+    Content.objects.bulk_create([
+        Content(step=step, course=course, content_num=number, content_type=Content.TEXT_TYPE, text='Step text')
+        for step in steps for number in range(1, args.contents + 1)
+    ])
+    return course
+
+
+if __name__ == '__main__':
+    main()
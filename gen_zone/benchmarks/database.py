@@ -0,0 +1,16 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Тестовые базы для всех alias на время бенчмарка; рабочие данные не затрагиваются.
+    """
+    old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
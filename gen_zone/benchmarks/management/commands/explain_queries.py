@@ -0,0 +1,50 @@
+"""
+EXPLAIN горячих запросов (benchmarks/query_plans.py) на заполненной seed() тестовой базе.
+
+Запрос, план которого читает таблицу целиком, помечается SEQ SCAN, и команда завершается
+с ошибкой - в CI это ловит запросы, которым перестал подходить индекс. Рабочая база не затрагивается.
+
+    python manage.py explain_queries
+    python manage.py explain_queries --queries course-list-by-rating --plans
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from benchmarks.database import throwaway_database
+from benchmarks.query_plans import HOT_QUERIES, check_hot_queries
+from gen_zone.testing import seed
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN горячих запросов на тестовой базе; ошибка, если какой-то план читает таблицу целиком.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', nargs='+', choices=sorted(HOT_QUERIES), help='только эти запросы')
+        parser.add_argument('--scale', type=int, default=1,
+                            help='множитель данных: 10 курсов, 10 студентов и 10 диалогов на единицу')
+        parser.add_argument('--plans', action='store_true', help='печатать планы всех запросов')
+
+    def handle(self, *args, **options):
+        if options['scale'] < 1:
+            raise CommandError('--scale должен быть положительным')
+
+        with throwaway_database():
+            data = seed(courses=10 * options['scale'], students=10 * options['scale'], messages=30)
+            try:
+                results = check_hot_queries(data, options['queries'])
+            except NotImplementedError as error:
+                raise CommandError(str(error))
+
+        self.stdout.write(f'База: {connection.vendor}')
+        flagged = []
+        for name, (scans, plan) in results.items():
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.ERROR(f"SEQ SCAN  {name}: {', '.join(sorted(set(scans)))}"))
+            else:
+                self.stdout.write(f'ok        {name}')
+            if scans or options['plans']:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        if flagged:
+            raise CommandError(f"Полный проход по таблице в {len(flagged)} запросах: {', '.join(flagged)}")
@@ -0,0 +1,176 @@
+"""
+Нагрузочный бенчмарк REST и WebSocket путей.
+
+ASGI `application` из gen_zone/asgi.py поднимается внутри процесса, данные создаются
+seed() в отдельной тестовой базе (рабочая база не затрагивается) и удаляются после прогона.
+По умолчанию channel layer и кэш заменяются на in-memory, чтобы бенчмарк не зависел от Redis;
+--redis оставляет настроенные бэкенды.
+
+    python manage.py loadtest --scale 5 --concurrency 8 --requests 2000 --output before.json
+    python manage.py loadtest --scale 5 --concurrency 8 --requests 2000 --compare before.json
+"""
+import asyncio
+import datetime
+import json
+import platform
+import random
+import subprocess
+import time
+from types import SimpleNamespace
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmarks.client import ASGIClient
+from benchmarks.database import throwaway_database
+from benchmarks.stats import summarize
+from benchmarks.workloads import WORKLOADS, WorkloadError
+from gen_zone.testing import seed
+
+IN_MEMORY_BACKENDS = {
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+}
+
+# Размер дерева курса при seed(); сценарий lesson выбирает уроки и шаги в этих пределах
+MODULES, LESSONS, STEPS = 3, 3, 3
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_workload(workload_class, context, requests, concurrency, warmup):
+    workers = [workload_class(context, worker) for worker in range(concurrency)]
+    await asyncio.gather(*(worker.start() for worker in workers))
+
+    latencies = []
+    errors = 0
+
+    async def drive(worker, count, record=True):
+        nonlocal errors
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                await worker.operation()
+            except WorkloadError:
+                errors += record
+                continue
+            if record:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    try:
+        await asyncio.gather(*(drive(worker, warmup, record=False) for worker in workers))
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(worker, requests // concurrency) for worker in workers))
+        elapsed = time.perf_counter() - started
+    finally:
+        await asyncio.gather(*(worker.stop() for worker in workers))
+    return summarize(latencies, elapsed, errors)
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный бенчмарк ASGI-приложения внутри процесса; результат в JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workloads', nargs='+', choices=sorted(WORKLOADS), default=list(WORKLOADS))
+        parser.add_argument('--scale', type=int, default=1,
+                            help='множитель данных: 10 курсов, 10 студентов и 10 диалогов на единицу')
+        parser.add_argument('--requests', type=int, default=500, help='операций на сценарий')
+        parser.add_argument('--concurrency', type=int, default=4, help='одновременных виртуальных пользователей')
+        parser.add_argument('--warmup', type=int, default=5, help='операций прогрева на воркер')
+        parser.add_argument('--fanout', type=int, default=4, help='сокетов в комнате для сценария chat')
+        parser.add_argument('--seed', type=int, default=0, help='seed генератора случайных чисел')
+        parser.add_argument('--redis', action='store_true', help='не подменять channel layer и кэш')
+        parser.add_argument('--output', help='файл для JSON с результатами')
+        parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+
+    def handle(self, *args, **options):
+        if options['scale'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--scale и --concurrency должны быть положительными')
+        baseline = self.load_baseline(options['compare']) if options['compare'] else None
+
+        overrides = {'DEBUG': False, 'PERF_INSTRUMENTATION': False}
+        if not options['redis']:
+            overrides.update(IN_MEMORY_BACKENDS)
+
+        with override_settings(**overrides), throwaway_database():
+            context = self.prepare(options)
+            results = asyncio.run(self.run(context, options))
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'database': connection.vendor,
+                'channel_layer': 'redis' if options['redis'] else 'in-memory',
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                **{key: options[key] for key in ('scale', 'requests', 'concurrency', 'fanout', 'seed')},
+            },
+            'results': results,
+        }
+        self.print_table(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Результат записан в {options['output']}")
+
+    def prepare(self, options):
+        scale = options['scale']
+        self.stdout.write(f'Заполнение тестовой базы (scale={scale})...')
+        data = seed(courses=10 * scale, modules=MODULES, lessons=LESSONS, steps=STEPS,
+                    students=10 * scale, messages=30)
+        users = [data.owner, *data.students]
+        return SimpleNamespace(
+            data=data,
+            tokens={user.id: str(AccessToken.for_user(user)) for user in users},
+            conversations_by_user={conversation.initiator_id: conversation for conversation in data.conversations},
+            modules=MODULES, lessons=LESSONS, steps=STEPS,
+            fanout=options['fanout'],
+            rng=random.Random(options['seed']),
+        )
+
+    async def run(self, context, options):
+        from gen_zone.asgi import application
+
+        context.client = ASGIClient(application)
+        results = {}
+        try:
+            for name in options['workloads']:
+                self.stdout.write(f'{name}...')
+                results[name] = await run_workload(WORKLOADS[name], context, options['requests'],
+                                                   options['concurrency'], options['warmup'])
+        finally:
+            # соединения потока sync_to_async должны закрыться до удаления тестовой базы
+            await sync_to_async(connections.close_all)()
+        return results
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as baseline:
+                return json.load(baseline)['results']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def print_table(self, results, baseline):
+        columns = ('rps', 'p50_ms', 'p95_ms', 'p99_ms')
+        self.stdout.write(f"{'workload':<10}{'ops':>8}{'errors':>8}" + ''.join(f'{column:>18}' for column in columns))
+        for name, result in results.items():
+            cells = []
+            for column in columns:
+                value = result.get(column)
+                previous = (baseline or {}).get(name, {}).get(column)
+                cell = '-' if value is None else str(value)
+                if value is not None and previous:
+                    cell += f' ({(value - previous) / previous:+.0%})'
+                cells.append(f'{cell:>18}')
+            self.stdout.write(f"{name:<10}{result['operations']:>8}{result['errors']:>8}" + ''.join(cells))
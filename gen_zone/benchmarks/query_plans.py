@@ -0,0 +1,104 @@
+"""
+Планы горячих запросов: EXPLAIN каждого запроса из HOT_QUERIES и поиск полных проходов по таблицам.
+
+Запросы повторяют то, что делают view, пагинация и consumers на реальных параметрах из seed().
+На маленькой тестовой базе PostgreSQL предпочел бы Seq Scan любому индексу, поэтому план
+строится с enable_seqscan = off: Seq Scan в таком плане значит, что подходящего индекса нет.
+В SQLite полный проход - строка `SCAN <таблица>` без `USING INDEX`.
+"""
+import json
+import re
+from types import SimpleNamespace
+
+from django.db import connections, transaction
+from django.db.models import Q
+
+from chat.models import Conversation, Message
+from chat.search import context_queryset
+from courses.models import Course, Lesson, LessonSnapshot, Module, Review, Step
+from courses.publishing import current_snapshot
+from users.models import User
+
+re_sqlite_scan = re.compile(r'\bSCAN (?:TABLE )?(\w+)')
+
+
+def _context(data):
+    last = Message.objects.filter(conversation_id=data.conversation.id).order_by('-timestamp', '-id').first()
+    module = Module.objects.filter(course=data.course).first()
+    lesson = Lesson.objects.filter(module=module).first()
+    return SimpleNamespace(**vars(data), last=last, module=module, lesson=lesson)
+
+
+# имя -> queryset по данным seed() (+ last, module, lesson из _context);
+# для UPDATE (отметка прочтения) - SELECT с тем же WHERE
+HOT_QUERIES = {
+    # chat
+    'conversation-list': lambda c: Conversation.objects.filter(Q(initiator=c.student) | Q(receiver=c.student))[:10],
+    'conversation-pair': lambda c: Conversation.objects.filter(
+        pair_low=c.conversation.pair_low, pair_high=c.conversation.pair_high),
+    'conversation-last-message': lambda c: Message.objects.filter(
+        conversation_id=c.conversation.id).order_by('-timestamp')[:1],
+    'message-history-before': lambda c: Message.objects.filter(
+        Q(timestamp__lt=c.last.timestamp) | Q(timestamp=c.last.timestamp, id__lt=c.last.id),
+        conversation_id=c.conversation.id,
+    ).order_by('-timestamp', '-id')[:21],
+    'message-read-receipts': lambda c: Message.objects.filter(
+        conversation_id=c.conversation.id, id__lte=c.last.id, read_at__isnull=True,
+    ).exclude(sender_id=c.student.id).order_by(),
+    'message-search-context': lambda c: context_queryset([c.last]),
+    # courses
+    'course-list-by-rating': lambda c: Course.objects.order_by('-rating'),
+    'course-list-min-rating': lambda c: Course.objects.filter(rating__gte=c.course.rating + 1),
+    'course-list-by-score': lambda c: Course.objects.order_by('-rating_score'),
+    'course-list-by-price': lambda c: Course.objects.order_by('price'),
+    'course-list-max-price': lambda c: Course.objects.filter(price__lte=c.course.price),
+    'course-path-index': lambda c: Module.objects.filter(course_id=c.course.id).values_list(
+        'module_num', 'id', 'lessons__lesson_num', 'lessons__id', 'lessons__steps__step_num', 'lessons__steps__id'),
+    'course-renumber-modules': lambda c: c.course.modules.filter(module_num__gt=c.module.module_num),
+    'lesson-steps': lambda c: Step.objects.filter(lesson=c.lesson).order_by('step_num')[:10],
+    'course-steps': lambda c: Step.objects.filter(course_id=c.course.id),
+    'published-lesson': lambda c: current_snapshot(
+        c.course.id, LessonSnapshot.objects.filter(module_num=1, lesson_num=1), 'data'),
+    'course-reviews': lambda c: Review.objects.filter(course_id=c.course.id).order_by('-created_at')[:21],
+    # users
+    'user-by-email': lambda c: User.objects.filter(email=c.student.email),
+    'user-has-course': lambda c: c.student.courses.filter(pk=c.course.id),
+}
+
+
+def sequential_scans(queryset):
+    """
+    Таблицы, которые план queryset читает целиком, и текст плана.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=queryset.db):
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain(format='json')
+        scans = []
+        nodes = [json.loads(plan)[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                scans.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', ()))
+        return scans, plan
+    if connection.vendor == 'sqlite':
+        plan = queryset.explain()
+        scans = []
+        for line in plan.splitlines():
+            match = re_sqlite_scan.search(line)
+            # таблица или ее псевдоним в подзапросе (U0); SCAN CONSTANT ROW и SCAN SUBQUERY - не таблицы
+            if match and match.group(1) not in ('CONSTANT', 'SUBQUERY') and 'USING' not in line[match.end():]:
+                scans.append(match.group(1))
+        return scans, plan
+    raise NotImplementedError(f'EXPLAIN для {connection.vendor} не поддерживается')
+
+
+def check_hot_queries(data, names=None):
+    """
+    {имя запроса: (таблицы с полным проходом, план)} для запросов HOT_QUERIES по данным seed().
+    """
+    context = _context(data)
+    return {name: sequential_scans(HOT_QUERIES[name](context)) for name in names or HOT_QUERIES}
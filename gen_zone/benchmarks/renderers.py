@@ -0,0 +1,78 @@
+"""
+Бенчмарк JSON: стандартные JSONRenderer/JSONParser DRF против FastJSONRenderer/FastJSONParser
+на ответах реальных эндпоинтов (каталог, профиль, история диалога, список диалогов).
+
+Ответы получаются через тестовый клиент на данных seed() во временной тестовой базе,
+затем один и тот же payload многократно кодируется и разбирается обеими реализациями.
+
+Запуск из каталога gen_zone:
+    python -m benchmarks.renderers --scale 5 --repeat 20
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=5, help='10 курсов и 10 диалогов на единицу')
+    parser.add_argument('--repeat', type=int, default=20, help='прогонов, берется лучший')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gen_zone.settings')
+    import django
+    django.setup()
+
+    from django.test.utils import override_settings
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIClient
+
+    from gen_zone.fast_json import FastJSONParser, FastJSONRenderer, orjson
+    from gen_zone.testing import seed
+    from .database import throwaway_database
+
+    with override_settings(DEBUG=False), throwaway_database():
+        data = seed(courses=10 * args.scale, students=10 * args.scale, messages=30 * args.scale)
+        client = APIClient()
+        client.force_authenticate(data.owner)
+        endpoints = {
+            'catalog': '/api/courses/courses/',
+            'profile': f'/api/account/{data.owner.id}/',
+            'history': f'/api/conversations/{data.conversation.id}/?page_size=1000',
+            'inbox': '/api/conversations/?page_size=1000',
+        }
+        payloads = {}
+        for name, path in endpoints.items():
+            response = client.get(path)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            payloads[name] = json.loads(body)
+
+    print(f"orjson: {'установлен' if orjson is not None else 'не установлен, оба варианта - stdlib'}")
+    columns = ('render drf ms', 'render fast ms', 'parse drf ms', 'parse fast ms')
+    print(f"{'payload':<10}{'bytes':>10}" + ''.join(f'{column:>16}' for column in columns))
+    for name, payload in payloads.items():
+        body = JSONRenderer().render(payload)
+        timings = [
+            best_time(lambda: JSONRenderer().render(payload), args.repeat),
+            best_time(lambda: FastJSONRenderer().render(payload), args.repeat),
+            best_time(lambda: JSONParser().parse(io.BytesIO(body)), args.repeat),
+            best_time(lambda: FastJSONParser().parse(io.BytesIO(body)), args.repeat),
+        ]
+        cells = ''.join(f'{timing * 1000:>16.3f}' for timing in timings)
+        print(f'{name:<10}{len(body):>10}{cells}')
+
+
+if __name__ == '__main__':
+    main()
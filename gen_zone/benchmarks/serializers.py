@@ -0,0 +1,72 @@
+"""
+Микробенчмарк сериализаторов: объектов в секунду для DRF и скомпилированного представления.
+
+Данные создаются seed() во временной тестовой базе и загружаются заранее (со всеми
+prefetch_related), так что меряется только CPU сериализации, без запросов к БД.
+
+Запуск из каталога gen_zone:
+    python -m benchmarks.serializers --scale 5 --repeat 5
+"""
+import argparse
+import os
+import time
+
+
+def objects_per_second(serialize, objects, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for obj in objects:
+            serialize(obj)
+        best = min(best, time.perf_counter() - started)
+    return round(len(objects) / best)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=5, help='10 курсов и 10 диалогов на единицу')
+    parser.add_argument('--repeat', type=int, default=5, help='прогонов, берется лучший')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gen_zone.settings')
+    import django
+    django.setup()
+
+    from rest_framework.serializers import Serializer
+
+    from chat.models import Message
+    from chat.serializers import MessageSerializer
+    from courses.models import Course
+    from courses.serializers import CourseSerializer
+    from gen_zone.compiled_serializers import compile_serializer
+    from gen_zone.testing import seed
+    from .database import throwaway_database
+
+    with throwaway_database():
+        seed(courses=10 * args.scale, students=10 * args.scale, messages=30)
+        courses = list(Course.objects.select_related('owner').prefetch_related(
+            'modules__lessons', 'owner__groups', 'owner__user_permissions', 'owner__courses',
+            'owner__courses_owned', 'owner__courses_favorite', 'owner__courses_in_progress',
+        ))
+        messages = list(Message.objects.all())
+        rows = list(Message.objects.values())
+
+        cases = [
+            ('CourseSerializer', courses, CourseSerializer),
+            ('MessageSerializer', messages, MessageSerializer),
+        ]
+        print(f"{'serializer':<20}{'objects':>9}{'drf obj/s':>14}{'compiled obj/s':>16}{'.values() obj/s':>17}")
+        for name, objects, serializer_class in cases:
+            template = serializer_class()
+            drf = objects_per_second(lambda obj: Serializer.to_representation(template, obj), objects, args.repeat)
+            compiled_function = compile_serializer(serializer_class)
+            compiled = objects_per_second(lambda obj: compiled_function(obj, {}), objects, args.repeat)
+            from_rows = '-'
+            if serializer_class is MessageSerializer:
+                row_function = compile_serializer(serializer_class, rows=True)
+                from_rows = objects_per_second(lambda row: row_function(row, {}), rows, args.repeat)
+            print(f'{name:<20}{len(objects):>9}{drf:>14}{compiled:>16}{from_rows:>17}')
+
+
+if __name__ == '__main__':
+    main()
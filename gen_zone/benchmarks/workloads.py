@@ -0,0 +1,157 @@
+"""
+Нагрузочные сценарии для manage.py loadtest.
+
+Один экземпляр сценария - один виртуальный пользователь (воркер): start() готовит
+состояние, operation() выполняет одно действие пользователя, stop() освобождает ресурсы.
+Неожиданный ответ приложения - WorkloadError, такая операция считается ошибкой.
+"""
+import itertools
+
+from gen_zone.testing import PASSWORD
+
+
+class WorkloadError(Exception):
+    pass
+
+
+class Workload:
+    name = None
+
+    def __init__(self, context, worker):
+        self.context = context
+        self.client = context.client
+        self.data = context.data
+        self.rng = context.rng
+        self.worker = worker
+
+    async def start(self):
+        pass
+
+    async def operation(self):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+    async def get(self, path, expected=200, **options):
+        status, body = await self.client.request('GET', path, **options)
+        if status != expected:
+            raise WorkloadError(f'GET {path}: {status} {body[:200]!r}')
+        return body
+
+    def student(self):
+        return self.data.students[self.worker % len(self.data.students)]
+
+
+class CatalogWorkload(Workload):
+    """
+    Анонимный просмотр каталога: список курсов или карточка случайного курса.
+    """
+    name = 'catalog'
+
+    async def operation(self):
+        if self.rng.random() < 0.5:
+            await self.get('/api/courses/courses/')
+        else:
+            course = self.rng.choice(self.data.courses)
+            await self.get(f'/api/courses/course/{course.id}/')
+
+
+class LessonWorkload(Workload):
+    """
+    Студент читает урок постранично, по одному шагу.
+    """
+    name = 'lesson'
+
+    async def operation(self):
+        context = self.context
+        course = self.rng.choice(self.data.courses)
+        path = (f'/api/courses/course/{course.id}/module/{self.rng.randint(1, context.modules)}'
+                f'/lesson/{self.rng.randint(1, context.lessons)}/')
+        await self.get(path, query={'page': self.rng.randint(1, context.steps)},
+                       token=context.tokens[self.student().id])
+
+
+class LoginWorkload(Workload):
+    """
+    Вход по email и паролю: основная стоимость - проверка хеша пароля.
+    """
+    name = 'login'
+
+    async def operation(self):
+        path = '/api/account/login/'
+        status, body = await self.client.request('POST', path, data={
+            'email': self.student().email, 'password': PASSWORD,
+        })
+        if status != 200:
+            raise WorkloadError(f'POST {path}: {status} {body[:200]!r}')
+
+
+class InboxWorkload(Workload):
+    """
+    Список диалогов или последняя страница истории одного из них.
+    """
+    name = 'inbox'
+
+    async def operation(self):
+        student = self.student()
+        token = self.context.tokens[student.id]
+        if self.rng.random() < 0.5:
+            await self.get('/api/conversations/', token=token)
+        else:
+            conversation = self.context.conversations_by_user[student.id]
+            await self.get(f'/api/conversations/{conversation.id}/', token=token)
+
+
+class ChatFanoutWorkload(Workload):
+    """
+    В комнату диалога подключено context.fanout сокетов обоих участников. Операция -
+    отправка сообщения с первого сокета до его получения всеми сокетами комнаты.
+    """
+    name = 'chat'
+
+    async def start(self):
+        conversation = self.data.conversations[self.worker % len(self.data.conversations)]
+        participants = itertools.cycle([conversation.initiator_id, conversation.receiver_id])
+        self.sockets = []
+        for user_id in itertools.islice(participants, self.context.fanout):
+            socket = await self.client.websocket(f'/ws/chat/{conversation.id}/',
+                                                 query={'token': self.context.tokens[user_id]})
+            if socket is None:
+                raise WorkloadError(f'websocket диалога {conversation.id} отклонен')
+            self.sockets.append(socket)
+        self.counter = itertools.count()
+
+    async def operation(self):
+        text = f'w{self.worker}-{next(self.counter)}'
+        await self.sockets[0].send_json({'type': 'message', 'message': text})
+        for socket in self.sockets:
+            while True:
+                event = await socket.receive_json()
+                if event.get('e') == 'msg' and event['m'] == text:
+                    break
+
+    async def stop(self):
+        for socket in self.sockets:
+            await socket.close()
+
+
+class MixedWorkload(Workload):
+    """
+    Смесь HTTP-сценариев по весам MIXED_WEIGHTS: приближение к реальному трафику.
+    """
+    name = 'mixed'
+
+    async def start(self):
+        self.workloads = [WORKLOADS[name](self.context, self.worker) for name in MIXED_WEIGHTS]
+        self.weights = list(MIXED_WEIGHTS.values())
+
+    async def operation(self):
+        await self.rng.choices(self.workloads, self.weights)[0].operation()
+
+
+MIXED_WEIGHTS = {'catalog': 50, 'lesson': 35, 'inbox': 13, 'login': 2}
+
+WORKLOADS = {workload.name: workload for workload in (
+    CatalogWorkload, LessonWorkload, LoginWorkload, InboxWorkload, ChatFanoutWorkload, MixedWorkload,
+)}
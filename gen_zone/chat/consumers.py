@@ -1,49 +1,159 @@
+import asyncio
 import base64
-import json
 import secrets
-from datetime import datetime
 
 from asgiref.sync import async_to_sync
 from channels.generic.websocket import WebsocketConsumer
 from django.core.files.base import ContentFile
 
-from users.models import User
+from gen_zone.instrumentation import InstrumentedConsumerMixin
+
+from . import envelope, presence
 from .models import Message, Conversation
-from .serializers import MessageSerializer
 
 
-class ChatConsumer(WebsocketConsumer):
+def read_message_id(frame):
+    """
+    message_id кадра read или None, если его нет или это не положительное целое: исключение
+    в receive закрыло бы сокет вместе с несброшенными отметками прочтения.
+    """
+    message_id = frame.get("message_id")
+    if isinstance(message_id, str) and message_id.isdigit():
+        message_id = int(message_id)
+    if isinstance(message_id, int) and not isinstance(message_id, bool) and message_id > 0:
+        return message_id
+    return None
+
+
+class ChatConsumer(InstrumentedConsumerMixin, WebsocketConsumer):
     def connect(self):
         self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
         self.room_group_name = f"chat_{self.room_name}"
+        self.conversation = None
+
+        # Пользователь определяется один раз по JWT (?token=...) в WebSocketJWTAuthMiddleware
+        self.user = self.scope["user"]
+        if not self.user.is_authenticated or not self.room_name.isdigit():
+            self.close()
+            return
+
+        # Участие в диалоге проверяется один раз при подключении
+        conversation = Conversation.objects.only("initiator_id", "receiver_id").filter(id=int(self.room_name)).first()
+        if conversation is None or self.user.id not in (conversation.initiator_id, conversation.receiver_id):
+            self.close()
+            return
+        self.conversation = conversation
+        self.read_receipts = presence.ReadReceiptBuffer(conversation.id, self.user.id)
+        self.timers = {}
 
         # Join room group
         async_to_sync(self.channel_layer.group_add)(
             self.room_group_name, self.channel_name
         )
-        self.accept()
+        self.use_msgpack = envelope.MSGPACK_SUBPROTOCOL in self.scope.get("subprotocols", [])
+        self.accept(subprotocol=envelope.MSGPACK_SUBPROTOCOL if self.use_msgpack else None)
+
+        if presence.mark_online(self.room_name, self.user.id):
+            self.group_send_event(envelope.presence_envelope(self.user.id, True))
+        self.schedule("presence_heartbeat", presence.PRESENCE_HEARTBEAT_INTERVAL)
+
+        # Снимок присутствия участников отправляется только этому сокету
+        participants = [conversation.initiator_id, conversation.receiver_id]
+        self.send_encoded(envelope.encode(
+            envelope.presence_state_envelope(presence.online_users(self.room_name, participants))
+        ))
 
 
     def disconnect(self, close_code):
+        if self.conversation is None:
+            return
+
+        async_to_sync(self.cancel_timers)()
+        self.flush_read_receipts()
+        if presence.mark_offline(self.room_name, self.user.id):
+            self.group_send_event(envelope.presence_envelope(self.user.id, False))
+
         # Leave room group
         async_to_sync(self.channel_layer.group_discard)(
             self.room_group_name, self.channel_name
         )
 
+    def group_send_event(self, event):
+        # Один проход сериализации на рассылку; через channel layer идет только форма msgpack
+        async_to_sync(self.channel_layer.group_send)(
+            self.room_group_name, {"type": "chat_event", "packed": envelope.encode(event)}
+        )
+
+    def send_encoded(self, packed):
+        if self.use_msgpack:
+            self.send(bytes_data=packed)
+        else:
+            self.send(text_data=envelope.as_json(packed))
+
+    def schedule(self, event_type, delay):
+        """
+        Через delay секунд консьюмер получит событие event_type в свой канал и обработает его,
+        как событие группы. Таймер живет в цикле событий соединения и не ждет кадров клиента.
+        """
+        if event_type not in self.timers:
+            async_to_sync(self.start_timer)(event_type, delay)
+
+    async def start_timer(self, event_type, delay):
+        loop = asyncio.get_running_loop()
+        self.timers[event_type] = loop.call_later(delay, lambda: loop.create_task(
+            self.channel_layer.send(self.channel_name, {"type": event_type})
+        ))
+
+    async def cancel_timers(self):
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+
+    def presence_heartbeat(self, event):
+        self.timers.pop("presence_heartbeat", None)
+        presence.touch_presence(self.room_name, self.user.id)
+        self.schedule("presence_heartbeat", presence.PRESENCE_HEARTBEAT_INTERVAL)
+
+    def read_receipts_due(self, event):
+        self.timers.pop("read_receipts_due", None)
+        self.sync_read_receipts()
+
+    def sync_read_receipts(self):
+        # окно с прошлого сброса прошло - сбрасываем сразу, иначе по таймеру в конце окна
+        if self.read_receipts.is_due():
+            self.flush_read_receipts()
+        elif self.read_receipts.pending_up_to is not None:
+            self.schedule("read_receipts_due", self.read_receipts.seconds_until_due())
+
+    def flush_read_receipts(self):
+        up_to = self.read_receipts.flush()
+        if up_to is not None:
+            self.group_send_event(envelope.read_envelope(self.user.id, up_to))
+
     # Receive message from WebSocket
     def receive(self, text_data=None, bytes_data=None):
-        # parse the json data into dictionary object
-        text_data_json = json.loads(text_data)
+        # parse the json (or msgpack) data into dictionary object
+        text_data_json = envelope.decode_frame(text_data, bytes_data)
+
+        frame_type = text_data_json.get("type", "message")
+        if frame_type == "typing":
+            if presence.should_emit_typing(self.room_name, self.user.id):
+                self.group_send_event(envelope.typing_envelope(self.user.id))
+        elif frame_type == "read":
+            message_id = read_message_id(text_data_json)
+            if message_id is not None:
+                self.read_receipts.add(message_id)
+                self.sync_read_receipts()
+        elif frame_type == "message":
+            self.receive_message(text_data_json)
 
+    def receive_message(self, text_data_json):
         # unpack the dictionary into the necessary parts
         message, attachment = (
             text_data_json["message"],
             text_data_json.get("attachment"),
         )
 
-        conversation = Conversation.objects.get(id=int(self.room_name))
-        email = text_data_json["email"]
-        sender = User.objects.get(email=email)
         # Attachment
         if attachment:
             file_str, file_ext = attachment["data"], attachment["format"]
@@ -52,46 +162,20 @@ class ChatConsumer(WebsocketConsumer):
                 base64.b64decode(file_str), name=f"{secrets.token_hex(8)}.{file_ext}"
             )
             _message = Message.objects.create(
-                sender=sender,
+                sender=self.user,
                 attachment=file_data,
                 text=message,
-                conversation_id=conversation,
+                conversation_id=self.conversation,
             )
         else:
             _message = Message.objects.create(
-                sender=sender,
+                sender=self.user,
                 text=message,
-                conversation_id=conversation,
+                conversation_id=self.conversation,
             )
         # Send message to room group
-        chat_type = {"type": "chat_message"}
-        message_serializer = (dict(MessageSerializer(instance=_message).data))
-        return_dict = {**chat_type, **message_serializer}
-        if _message.attachment:
-            async_to_sync(self.channel_layer.group_send)(
-                self.room_group_name,
-                {
-                    "type": "chat_message",
-                    "message": message,
-                    "sender": sender.email,
-                    "attachment": _message.attachment.url,
-                    "time": str(_message.timestamp),
-                },
-            )
-        else:
-            async_to_sync(self.channel_layer.group_send)(
-                self.room_group_name,
-                return_dict,
-            )
+        self.group_send_event(envelope.message_envelope(_message))
 
-    # Receive message from room group
-    def chat_message(self, event):
-        dict_to_be_sent = event.copy()
-        dict_to_be_sent.pop("type")
-
-        # Send message to WebSocket
-        self.send(
-                text_data=json.dumps(
-                    dict_to_be_sent
-                )
-            )
\ No newline at end of file
+    # Receive event from room group
+    def chat_event(self, event):
+        self.send_encoded(event["packed"])
\ No newline at end of file
@@ -0,0 +1,73 @@
+import json
+from functools import lru_cache
+
+import msgpack
+
+# Версия формата событий сокета. Увеличивается при несовместимых изменениях ключей.
+ENVELOPE_VERSION = 1
+# Клиенты, запросившие этот сабпротокол, получают бинарные кадры msgpack вместо JSON
+MSGPACK_SUBPROTOCOL = "genzone.msgpack.v1"
+
+# Ключи конверта:
+#   v  - версия формата        e  - тип события
+#   id - id сообщения          u  - id пользователя
+#   m  - текст сообщения       a  - url вложения (только если есть)
+#   ts - время в мс от эпохи   on - онлайн (bool) или список онлайн-участников
+#   up - id, до которого сообщения прочитаны
+
+
+def _timestamp_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def message_envelope(message):
+    envelope = {
+        "v": ENVELOPE_VERSION,
+        "e": "msg",
+        "id": message.id,
+        "u": message.sender_id,
+        "m": message.text,
+        "ts": _timestamp_ms(message.timestamp),
+    }
+    if message.attachment:
+        envelope["a"] = message.attachment.url
+    return envelope
+
+
+def typing_envelope(user_id):
+    return {"v": ENVELOPE_VERSION, "e": "typing", "u": user_id}
+
+
+def presence_envelope(user_id, online):
+    return {"v": ENVELOPE_VERSION, "e": "presence", "u": user_id, "on": online}
+
+
+def presence_state_envelope(online_user_ids):
+    return {"v": ENVELOPE_VERSION, "e": "presence_state", "on": online_user_ids}
+
+
+def read_envelope(user_id, up_to):
+    return {"v": ENVELOPE_VERSION, "e": "read", "u": user_id, "up": up_to}
+
+
+def encode(envelope):
+    """
+    Кодирует конверт один раз на рассылку в msgpack - в этом виде он идет через channel layer
+    и уходит клиентам с сабпротоколом msgpack без изменений.
+    """
+    return msgpack.packb(envelope)
+
+
+@lru_cache(maxsize=256)
+def as_json(packed):
+    """
+    JSON-кадр для упакованного конверта. Сокеты комнаты в одном процессе получают одно
+    и то же событие, так что JSON строится один раз на процесс, а не на сокет.
+    """
+    return json.dumps(msgpack.unpackb(packed), separators=(",", ":"), ensure_ascii=False)
+
+
+def decode_frame(text_data=None, bytes_data=None):
+    if bytes_data is not None:
+        return msgpack.unpackb(bytes_data)
+    return json.loads(text_data)
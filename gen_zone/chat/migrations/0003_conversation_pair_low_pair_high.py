@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_conv_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='pair_high',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='pair_low',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+    ]
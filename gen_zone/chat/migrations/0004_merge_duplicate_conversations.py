@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def merge_duplicate_conversations(apps, schema_editor):
+    """
+    Заполняет канонический ключ пары (pair_low, pair_high) и сливает дубликаты:
+    сообщения переносятся в самый ранний диалог пары, остальные удаляются.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    keep = {}
+    duplicates = {}
+    to_update = []
+    conversations = (Conversation.objects
+                     .filter(initiator__isnull=False, receiver__isnull=False)
+                     .order_by('id')
+                     .only('id', 'initiator_id', 'receiver_id'))
+    for conversation in conversations.iterator():
+        first_id, second_id = conversation.initiator_id, conversation.receiver_id
+        pair = (first_id, second_id) if first_id <= second_id else (second_id, first_id)
+        if pair in keep:
+            duplicates.setdefault(keep[pair], []).append(conversation.id)
+            continue
+        keep[pair] = conversation.id
+        conversation.pair_low, conversation.pair_high = pair
+        to_update.append(conversation)
+
+    for kept_id, duplicate_ids in duplicates.items():
+        Message.objects.filter(conversation_id__in=duplicate_ids).update(conversation_id=kept_id)
+        Conversation.objects.filter(id__in=duplicate_ids).delete()
+
+    Conversation.objects.bulk_update(to_update, ['pair_low', 'pair_high'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversation_pair_low_pair_high'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_message_read_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('read_at__isnull', True)), fields=['conversation_id', 'id'], name='chat_msg_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# Триграммы для icontains по тексту: выражение индекса совпадает с тем, что строит Django
+# для text__icontains (UPPER("chat_message"."text"::text) LIKE UPPER(...)). Расширению pg_trgm
+# нужны права на CREATE EXTENSION (или оно уже установлено администратором).
+POSTGRES_INDEX = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX chat_message_text_trgm_idx ON chat_message USING gin ((UPPER(text::text)) gin_trgm_ops)',
+]
+POSTGRES_INDEX_DROP = [
+    'DROP INDEX chat_message_text_trgm_idx',
+]
+
+# Таблица FTS5 без своей копии текста (content=), триграммы без учета регистра. Синхронизируют ее
+# триггеры. Если Django пересоздаст chat_message (AlterField в SQLite), триггеры пропадут.
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE chat_message_fts USING fts5(
+        text, content='chat_message', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER chat_message_fts_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER chat_message_fts_delete AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER chat_message_fts_update AFTER UPDATE OF text ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO chat_message_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    # уже написанные сообщения
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+SQLITE_INDEX_DROP = [
+    'DROP TRIGGER chat_message_fts_insert',
+    'DROP TRIGGER chat_message_fts_delete',
+    'DROP TRIGGER chat_message_fts_update',
+    'DROP TABLE chat_message_fts',
+]
+
+
+def create_text_index(apps, schema_editor):
+    for statement in {'postgresql': POSTGRES_INDEX, 'sqlite': SQLITE_INDEX}.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_text_index(apps, schema_editor):
+    for statement in {'postgresql': POSTGRES_INDEX_DROP, 'sqlite': SQLITE_INDEX_DROP}.get(
+            schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_unread_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_text_index, drop_text_index),
+    ]
@@ -10,6 +10,25 @@ class Conversation(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="convo_participant"
     )
     start_time = models.DateTimeField(auto_now_add=True)
+    # Канонический ключ пары участников: (min(user_id), max(user_id)).
+    # Уникальный индекс по нему делает поиск диалога точечным запросом,
+    # а get_or_create - атомарным при конкурентном старте диалога.
+    pair_low = models.BigIntegerField(null=True, editable=False)
+    pair_high = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pair_low', 'pair_high'], name='chat_conversation_unique_pair'),
+        ]
+
+    @staticmethod
+    def pair_key(first_id, second_id):
+        return (first_id, second_id) if first_id <= second_id else (second_id, first_id)
+
+    def save(self, *args, **kwargs):
+        if self.initiator_id is not None and self.receiver_id is not None:
+            self.pair_low, self.pair_high = self.pair_key(self.initiator_id, self.receiver_id)
+        super().save(*args, **kwargs)
 
 
 class Message(models.Model):
@@ -19,6 +38,15 @@ class Message(models.Model):
     attachment = models.FileField(blank=True)
     conversation_id = models.ForeignKey(Conversation, on_delete=models.CASCADE,)
     timestamp = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ('-timestamp',)
+        indexes = [
+            # keyset-пагинация истории: WHERE conversation_id = ? AND (timestamp, id) < (?, ?)
+            models.Index(fields=['conversation_id', 'timestamp', 'id'], name='chat_msg_conv_ts_id_idx'),
+            # отметка прочтения (presence.ReadReceiptBuffer): WHERE conversation_id = ? AND id <= ?
+            # AND read_at IS NULL. Частичный индекс содержит только непрочитанные и остается маленьким
+            models.Index(fields=['conversation_id', 'id'], condition=models.Q(read_at__isnull=True),
+                         name='chat_msg_unread_idx'),
+        ]
@@ -0,0 +1,119 @@
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Message
+
+# Не чаще одного события "печатает" от пользователя в комнате за это время (сек)
+TYPING_THROTTLE = 2
+# Ключ присутствия живет столько без продления (сек): пропадает, если все сокеты пользователя
+# в комнате исчезли без disconnect (упал воркер)
+PRESENCE_TTL = 60
+# Открытый сокет продлевает ключ с этим интервалом, даже если клиент молчит (сек)
+PRESENCE_HEARTBEAT_INTERVAL = PRESENCE_TTL / 3
+# Прочтения копятся в консьюмере и сбрасываются в базу не чаще этого интервала (сек)
+READ_RECEIPT_FLUSH_INTERVAL = 2
+
+
+def _presence_key(room_name, user_id):
+    return f"chat:presence:{room_name}:{user_id}"
+
+
+def _typing_key(room_name, user_id):
+    return f"chat:typing:{room_name}:{user_id}"
+
+
+def mark_online(room_name, user_id):
+    """
+    Увеличивает счетчик открытых сокетов пользователя в комнате.
+    Возвращает True, если это первое подключение (пользователь стал онлайн).
+    """
+    key = _presence_key(room_name, user_id)
+    if cache.add(key, 1, timeout=PRESENCE_TTL):
+        return True
+    try:
+        connections = cache.incr(key)
+    except ValueError:
+        # ключ истек между add и incr
+        cache.set(key, 1, timeout=PRESENCE_TTL)
+        return True
+    cache.touch(key, PRESENCE_TTL)
+    return connections == 1
+
+
+def mark_offline(room_name, user_id):
+    """
+    Уменьшает счетчик сокетов. Возвращает True, если сокетов больше не осталось.
+    """
+    key = _presence_key(room_name, user_id)
+    try:
+        connections = cache.decr(key)
+    except ValueError:
+        return True
+    if connections <= 0:
+        cache.delete(key)
+        return True
+    return False
+
+
+def touch_presence(room_name, user_id):
+    cache.touch(_presence_key(room_name, user_id), PRESENCE_TTL)
+
+
+def online_users(room_name, user_ids):
+    """
+    Возвращает онлайн-участников комнаты одним запросом в кэш.
+    """
+    keys = {_presence_key(room_name, user_id): user_id for user_id in user_ids if user_id is not None}
+    found = cache.get_many(list(keys))
+    return [keys[key] for key, connections in found.items() if connections and connections > 0]
+
+
+def should_emit_typing(room_name, user_id):
+    """
+    Схлопывает всплески: первое событие в окне TYPING_THROTTLE проходит, остальные отбрасываются.
+    """
+    return cache.add(_typing_key(room_name, user_id), 1, timeout=TYPING_THROTTLE)
+
+
+class ReadReceiptBuffer:
+    """
+    Копит прочтения пользователя в комнате и сбрасывает их одним UPDATE.
+
+    Хранится только максимальный прочитанный id: все более ранние входящие
+    сообщения диалога помечаются прочитанными тем же запросом.
+    """
+
+    def __init__(self, conversation_id, reader_id):
+        self.conversation_id = conversation_id
+        self.reader_id = reader_id
+        self.pending_up_to = None
+        self.last_flush = None
+
+    def add(self, message_id):
+        if self.pending_up_to is None or message_id > self.pending_up_to:
+            self.pending_up_to = message_id
+
+    def seconds_until_due(self):
+        """
+        Сколько секунд осталось до конца окна с последнего сброса (0 - можно сбрасывать).
+        """
+        if self.last_flush is None:
+            return 0
+        return max(0, READ_RECEIPT_FLUSH_INTERVAL - (timezone.now() - self.last_flush).total_seconds())
+
+    def is_due(self):
+        return self.pending_up_to is not None and self.seconds_until_due() == 0
+
+    def flush(self):
+        """
+        Возвращает id, до которого помечены прочтения, или None, если нечего сбрасывать.
+        """
+        if self.pending_up_to is None:
+            return None
+        up_to, self.pending_up_to = self.pending_up_to, None
+        self.last_flush = timezone.now()
+        (Message.objects
+         .filter(conversation_id=self.conversation_id, id__lte=up_to, read_at__isnull=True)
+         .exclude(sender_id=self.reader_id)
+         .update(read_at=self.last_flush))
+        return up_to
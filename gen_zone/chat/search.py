@@ -0,0 +1,91 @@
+"""
+Поиск по сообщениям пользователя: подстрока в Message.text без учета регистра, только в диалогах,
+где он участник.
+
+Подстроку ищет триграммный индекс (миграция 0008): в PostgreSQL - GIN pg_trgm по UPPER(text),
+его использует обычный icontains (UPPER(text) LIKE UPPER('%...%')); в SQLite - таблица FTS5
+с токенизатором trigram, ее синхронизируют триггеры. Триграмме нужно не меньше трех символов.
+Результаты листаются той же keyset-пагинацией, что и история диалога (MessageKeysetPagination).
+Соседние сообщения найденных (context) догружаются для всей страницы одним запросом (context_queryset).
+"""
+import html
+import re
+from bisect import bisect_left
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Conversation, Message
+
+MIN_QUERY_LENGTH = 3
+FTS_TABLE = 'chat_message_fts'
+# Сколько сообщений диалога до и после найденного возвращается вместе с ним
+CONTEXT_MESSAGES = 2
+
+
+def _sqlite_match(query):
+    # весь запрос - одна фраза FTS5: синтаксис запросов пользователю не виден
+    phrase = '"%s"' % query.replace('"', '""')
+    return Q(id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [phrase]))
+
+
+def search_messages(user, query):
+    """
+    Сообщения диалогов user, в тексте которых есть query. Queryset без сортировки.
+    """
+    conversations = Conversation.objects.filter(Q(initiator=user) | Q(receiver=user)).values('id')
+    messages = Message.objects.filter(conversation_id__in=conversations)
+    if connections[router.db_for_read(Message)].vendor == 'sqlite':
+        return messages.filter(_sqlite_match(query))
+    return messages.filter(text__icontains=query)
+
+
+def highlight(text, query):
+    """
+    Текст сообщения, экранированный для HTML, с совпадениями query в <mark></mark>.
+    """
+    parts = re.split(f'({re.escape(query)})', text, flags=re.IGNORECASE)
+    return ''.join(f'<mark>{html.escape(part)}</mark>' if index % 2 else html.escape(part)
+                   for index, part in enumerate(parts))
+
+
+def context_queryset(hits, size=CONTEXT_MESSAGES):
+    """
+    Соседи hits одним запросом: UNION ALL двух keyset-выборок на находку - до size сообщений
+    до нее и после нее в ее диалоге, по индексу (conversation_id, timestamp, id). Стоимость -
+    O(находок * size) независимо от длины диалогов.
+    """
+    messages = Message.objects.using(hits[0]._state.db).order_by()
+    parts = []
+    for hit in hits:
+        same = messages.filter(conversation_id=hit.conversation_id_id)
+        # timestamp__lte/gte - граница диапазона индекса: по одному OR SQLite идет от края диалога
+        older = same.filter(Q(timestamp__lt=hit.timestamp) | Q(id__lt=hit.id), timestamp__lte=hit.timestamp)
+        newer = same.filter(Q(timestamp__gt=hit.timestamp) | Q(id__gt=hit.id), timestamp__gte=hit.timestamp)
+        # LIMIT в частях UNION SQLite не допускает, в подзапросе IN - допускает
+        parts += [messages.filter(id__in=older.order_by('-timestamp', '-id').values('id')[:size]),
+                  messages.filter(id__in=newer.order_by('timestamp', 'id').values('id')[:size])]
+    return parts[0].union(*parts[1:], all=True)
+
+
+def surrounding(hits, size=CONTEXT_MESSAGES):
+    """
+    Соседи найденных сообщений в их диалогах, по (timestamp, id): {id: (до, после)}, в каждом
+    списке до size сообщений от старых к новым.
+    """
+    if not hits:
+        return {}
+    conversations = {}
+    for message in context_queryset(hits, size):
+        conversations.setdefault(message.conversation_id_id, {})[message.timestamp, message.id] = message
+    for hit in hits:
+        conversations.setdefault(hit.conversation_id_id, {})[hit.timestamp, hit.id] = hit
+    ordered = {conversation_id: sorted(messages) for conversation_id, messages in conversations.items()}
+    context = {}
+    for hit in hits:
+        messages, keys = conversations[hit.conversation_id_id], ordered[hit.conversation_id_id]
+        position = bisect_left(keys, (hit.timestamp, hit.id))
+        context[hit.id] = ([messages[key] for key in keys[max(position - size, 0):position]],
+                           [messages[key] for key in keys[position + 1:position + 1 + size]])
+    return context
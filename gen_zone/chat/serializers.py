@@ -1,14 +1,133 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from gen_zone.compiled_serializers import CompiledRepresentationMixin
 from users.serializers import UserSerializer
 from .models import Conversation, Message
 from rest_framework import serializers
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 10  # Set the number of messages per page
     page_size_query_param = 'page_size'
     max_page_size = 1000
 
-class MessageSerializer(serializers.ModelSerializer):
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset-пагинация истории сообщений по (timestamp, id).
+
+    ?before=<cursor> - более старые сообщения, ?after=<cursor> - более новые, ?at=<cursor> - само
+    сообщение курсора и более старые.
+    Без курсора возвращается последняя страница диалога. Стоимость запроса не
+    зависит от того, насколько далеко пролистана история (нет OFFSET и COUNT).
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    before_query_param = 'before'
+    after_query_param = 'after'
+    at_query_param = 'at'
+    invalid_cursor_message = 'Неверный курсор'
+
+    @staticmethod
+    def encode_cursor(message):
+        raw = f'{message.timestamp.isoformat()}|{message.id}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode()).decode()
+            timestamp, pk = raw.rsplit('|', 1)
+            return datetime.fromisoformat(timestamp), int(pk)
+        except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+        at = request.query_params.get(self.at_query_param)
+
+        if after:
+            timestamp, pk = self.decode_cursor(after)
+            queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+            rows = list(queryset.order_by('timestamp', 'id')[:page_size + 1])
+            has_more = len(rows) > page_size
+            self.page = rows[:page_size][::-1]
+            self.has_newer, self.has_older = has_more, True
+        else:
+            if before:
+                timestamp, pk = self.decode_cursor(before)
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+            elif at:
+                timestamp, pk = self.decode_cursor(at)
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lte=pk))
+            rows = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+            has_more = len(rows) > page_size
+            self.page = rows[:page_size]
+            self.has_newer, self.has_older = bool(before or at), has_more
+        return self.page
+
+    def _link(self, param, message):
+        url = remove_query_param(self.base_url, self.before_query_param)
+        url = remove_query_param(url, self.after_query_param)
+        url = remove_query_param(url, self.at_query_param)
+        return replace_query_param(url, param, self.encode_cursor(message))
+
+    def get_next_link(self):
+        # "next" листает историю назад, к более старым сообщениям
+        if not self.page or not self.has_older:
+            return None
+        return self._link(self.before_query_param, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.page or not self.has_newer:
+            return None
+        return self._link(self.after_query_param, self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class MessageSearchPagination(MessageKeysetPagination):
+    # context найденных - две части UNION на находку, а SQLite допускает до 500 частей
+    max_page_size = 100
+
+
+class MessageSerializer(CompiledRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Message
         exclude = ('conversation_id',)
@@ -33,8 +152,7 @@ class ConversationListSerializer(serializers.ModelSerializer):
 class ConversationSerializer(serializers.ModelSerializer):
     initiator = UserSerializer()
     receiver = UserSerializer()
-    message_set = MessageSerializer(many=True)
 
     class Meta:
         model = Conversation
-        fields = ['initiator', 'receiver', 'message_set']
\ No newline at end of file
+        fields = ['initiator', 'receiver']
\ No newline at end of file
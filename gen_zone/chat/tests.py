@@ -1,3 +1,308 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import Serializer
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmarks.query_plans import sequential_scans
+from gen_zone.compiled_serializers import compile_serializer
+from gen_zone.testing import LOCAL_CACHES, EndpointBudgetMixin, seed
+from . import envelope, presence, routing, urls
+from .middlewares import WebSocketJWTAuthMiddleware
+from .models import Message
+from .search import context_queryset
+from .serializers import MessageSerializer
+
+# websocket-часть gen_zone/asgi.py без проверки Origin
+WEBSOCKET_APPLICATION = WebSocketJWTAuthMiddleware(URLRouter(routing.websocket_urlpatterns))
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+class CompiledMessageSerializerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=1, students=1, messages=3)
+        Message.objects.filter(id=Message.objects.order_by('id')[0].id).update(read_at=timezone.now(), sender=None)
+        cls.with_attachment = Message(conversation_id=cls.data.conversation, sender=cls.data.owner, text='file')
+        cls.with_attachment.attachment.name = 'attachments/file.txt'
+        cls.with_attachment.save()
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_instances_match_drf(self):
+        request = APIRequestFactory().get('/api/conversations/1/')
+        for context in ({}, {'request': request}):
+            for message in Message.objects.all():
+                with self.subTest(message=message.id, request='request' in context):
+                    drf = Serializer.to_representation(MessageSerializer(message, context=context), message)
+                    compiled = compile_serializer(MessageSerializer)(message, context)
+                    self.assertEqual(self.render(compiled), self.render(drf))
+
+    def test_values_rows_match_instances(self):
+        serialize_row = compile_serializer(MessageSerializer, rows=True)
+        serialize = compile_serializer(MessageSerializer)
+        rows = Message.objects.order_by('id').values()
+        messages = Message.objects.order_by('id')
+        self.assertEqual([self.render(serialize_row(row, {})) for row in rows],
+                         [self.render(serialize(message, {})) for message in messages])
+
+
+class MessageSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=1, students=2, messages=0)
+        cls.mine, cls.other = cls.data.conversations
+        cls.hits = [Message.objects.create(conversation_id=cls.mine, sender=cls.data.student,
+                                           text=f'Домашка {number}: <b>Рекурсия</b>') for number in range(3)]
+        Message.objects.create(conversation_id=cls.mine, sender=cls.data.owner, text='Без совпадений')
+        Message.objects.create(conversation_id=cls.other, sender=cls.data.owner, text='Чужая рекурсия')
+
+    def get(self, url, data=None):
+        client = APIClient()
+        client.force_authenticate(self.data.student)
+        response = client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_hits_are_scoped_paginated_and_highlighted(self):
+        first = self.get(reverse('message_search'), {'q': 'РЕКУРС', 'page_size': 2})
+        self.assertEqual([hit['id'] for hit in first['results']], [self.hits[2].id, self.hits[1].id])
+        self.assertEqual(first['results'][0]['conversation'], self.mine.id)
+        self.assertEqual(first['results'][0]['highlight'], 'Домашка 2: &lt;b&gt;<mark>Рекурс</mark>ия&lt;/b&gt;')
+        rest = self.get(first['next'])
+        self.assertEqual([hit['id'] for hit in rest['results']], [self.hits[0].id])
+        self.assertIsNone(rest['next'])
+
+        Message.objects.filter(id=self.hits[0].id).update(text='Исправлено')
+        self.assertEqual(len(self.get(reverse('message_search'), {'q': 'рекурс'})['results']), 2)
+
+    def test_jump_opens_history_at_hit(self):
+        hit = self.get(reverse('message_search'), {'q': 'Домашка 1'})['results'][0]
+        history = self.get(hit['jump'])
+        self.assertEqual([message['id'] for message in history['results']['messages']],
+                         [self.hits[1].id, self.hits[0].id])
+        newer = self.get(history['previous'])
+        self.assertEqual(newer['results']['messages'][-1]['id'], self.hits[2].id)
+
+    def test_context_is_loaded_in_one_query(self):
+        later = Message.objects.create(conversation_id=self.mine, sender=self.data.owner, text='Потом')
+        hits = self.get(reverse('message_search'), {'q': 'рекурс'})['results']
+        messages = list(Message.objects.filter(conversation_id=self.mine).order_by('timestamp', 'id')
+                        .values_list('id', flat=True))
+        for hit in hits:
+            position = messages.index(hit['id'])
+            self.assertEqual([message['id'] for message in hit['context']['before']],
+                             messages[max(position - 2, 0):position])
+            self.assertEqual([message['id'] for message in hit['context']['after']],
+                             messages[position + 1:position + 3])
+        self.assertEqual(hits[0]['context']['after'][-1]['id'], later.id)
+
+        client = APIClient()
+        client.force_authenticate(self.data.student)
+        with self.assertNumQueries(2):
+            client.get(reverse('message_search'), {'q': 'рекурс'})
+
+    @skipUnless(connection.vendor == 'sqlite', 'шаги виртуальной машины считает только SQLite')
+    def test_context_cost_does_not_grow_with_conversation(self):
+        def steps():
+            # число инструкций VDBE на запрос соседей - мера прочитанного
+            counter = [0]
+            connection.ensure_connection()
+            connection.connection.set_progress_handler(lambda: counter.__setitem__(0, counter[0] + 1) and 0, 1)
+            try:
+                list(context_queryset(self.hits))
+            finally:
+                connection.connection.set_progress_handler(None, 1)
+            return counter[0]
+
+        short = steps()
+        Message.objects.bulk_create(Message(conversation_id=self.mine, sender=self.data.owner, text=str(number))
+                                    for number in range(2000))
+        self.assertEqual(sequential_scans(context_queryset(self.hits))[0], [])
+        self.assertLess(steps(), short * 1.5)
+
+    def test_short_query_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.data.student)
+        self.assertEqual(client.get(reverse('message_search'), {'q': 'ab'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCAL_CACHES, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatConsumerTests(TestCase):
+    """
+    Сокеты диалога студента с владельцем курса через JWT-мидлварь и роутинг, как в asgi.py.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=1, students=2, messages=4)
+        cls.student, cls.owner = cls.data.student, cls.data.owner
+        # нечетные сообщения seed() отправлены владельцем
+        cls.incoming = list(Message.objects.filter(conversation_id=cls.data.conversation, sender=cls.owner)
+                            .order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def communicator(self, query=''):
+        return WebsocketCommunicator(WEBSOCKET_APPLICATION, f'/ws/chat/{self.data.conversation.id}/{query}')
+
+    async def connect(self, user):
+        communicator = self.communicator(f'?token={AccessToken.for_user(user)}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['e'], 'presence_state')
+        return communicator
+
+    async def drain(self, communicator, timeout=0.1):
+        events = []
+        while not await communicator.receive_nothing(timeout):
+            events.append(await communicator.receive_json_from())
+        return events
+
+    async def test_connect_requires_participant_token(self):
+        outsider = self.data.students[1]
+        for query in ('', '?token=invalid', f'?token={AccessToken.for_user(outsider)}'):
+            with self.subTest(query=query[:12]):
+                communicator = self.communicator(query)
+                connected, _ = await communicator.connect()
+                self.assertFalse(connected)
+        # участник проходит, кадры подписываются пользователем из токена
+        communicator = await self.connect(self.student)
+        await communicator.send_json_to({'type': 'typing'})
+        self.assertEqual(await self.drain(communicator), [{'v': 1, 'e': 'presence', 'u': self.student.id, 'on': True},
+                                                          {'v': 1, 'e': 'typing', 'u': self.student.id}])
+        await communicator.disconnect()
+
+    async def test_presence_counts_sockets(self):
+        owner = await self.connect(self.owner)
+        await self.drain(owner)
+        first = await self.connect(self.student)
+        self.assertEqual(await self.drain(owner), [{'v': 1, 'e': 'presence', 'u': self.student.id, 'on': True}])
+        second = await self.connect(self.student)
+        await first.disconnect()
+        self.assertEqual(await self.drain(owner), [])
+        await second.disconnect()
+        self.assertEqual(await self.drain(owner), [{'v': 1, 'e': 'presence', 'u': self.student.id, 'on': False}])
+        await owner.disconnect()
+
+    async def test_broadcast_reaches_json_and_msgpack_clients(self):
+        owner = await self.connect(self.owner)
+        communicator = self.communicator(f'?token={AccessToken.for_user(self.student)}')
+        communicator.scope['subprotocols'] = [envelope.MSGPACK_SUBPROTOCOL]
+        connected, subprotocol = await communicator.connect()
+        self.assertEqual((connected, subprotocol), (True, envelope.MSGPACK_SUBPROTOCOL))
+        self.assertEqual(envelope.decode_frame(bytes_data=await communicator.receive_from())['e'], 'presence_state')
+        await self.drain(owner)
+
+        await communicator.send_to(bytes_data=envelope.encode({'type': 'message', 'message': 'Привет'}))
+        sent = await owner.receive_json_from()
+        self.assertEqual((sent['e'], sent['u'], sent['m']), ('msg', self.student.id, 'Привет'))
+        # до сообщения сокет студента мог получить свое же событие присутствия
+        received = envelope.decode_frame(bytes_data=await communicator.receive_from())
+        if received['e'] == 'presence':
+            received = envelope.decode_frame(bytes_data=await communicator.receive_from())
+        self.assertEqual(received, sent)
+        await communicator.disconnect()
+        await owner.disconnect()
+
+    async def test_idle_socket_stays_online(self):
+        with mock.patch.object(presence, 'PRESENCE_TTL', 0.3), \
+                mock.patch.object(presence, 'PRESENCE_HEARTBEAT_INTERVAL', 0.05):
+            student = await self.connect(self.student)
+            # клиент молчит дольше PRESENCE_TTL: ключ продлевает таймер сокета
+            await asyncio.sleep(0.6)
+            self.assertEqual(presence.online_users(self.data.conversation.id, [self.student.id]), [self.student.id])
+            await student.disconnect()
+        self.assertEqual(presence.online_users(self.data.conversation.id, [self.student.id]), [])
+
+    async def test_typing_is_throttled(self):
+        owner = await self.connect(self.owner)
+        student = await self.connect(self.student)
+        await self.drain(owner)
+        with mock.patch.object(presence, 'TYPING_THROTTLE', 0.3):
+            for _ in range(3):
+                await student.send_json_to({'type': 'typing'})
+            self.assertEqual(await self.drain(owner), [{'v': 1, 'e': 'typing', 'u': self.student.id}])
+            await asyncio.sleep(0.3)
+            await student.send_json_to({'type': 'typing'})
+            self.assertEqual(len(await self.drain(owner)), 1)
+        await student.disconnect()
+        await owner.disconnect()
+
+    async def test_read_receipts_are_batched_and_flushed_by_timer(self):
+        owner = await self.connect(self.owner)
+        student = await self.connect(self.student)
+        await self.drain(owner)
+        first, last = self.incoming
+        with mock.patch.object(presence, 'READ_RECEIPT_FLUSH_INTERVAL', 0.4):
+            await student.send_json_to({'type': 'read', 'message_id': first})
+            self.assertEqual(await self.drain(owner), [{'v': 1, 'e': 'read', 'u': self.student.id, 'up': first}])
+            await student.send_json_to({'type': 'read', 'message_id': last})
+            await student.send_json_to({'type': 'read', 'message_id': first})
+            self.assertEqual(await self.drain(owner), [])
+            # клиент больше ничего не присылает: сброс по таймеру в конце окна
+            self.assertEqual(await owner.receive_json_from(timeout=1),
+                             {'v': 1, 'e': 'read', 'u': self.student.id, 'up': last})
+        await student.disconnect()
+        await owner.disconnect()
+        # база читается после отключения: пока консьюмер внутри async_to_sync, database_sync_to_async
+        # теста может попасть в его вложенный исполнитель и не выполниться (asgiref 3.7)
+        unread = await database_sync_to_async(Message.objects.filter(
+            conversation_id=self.data.conversation, sender=self.owner, read_at__isnull=True).count)()
+        self.assertEqual(unread, 0)
+
+    async def test_malformed_read_frame_is_ignored(self):
+        owner = await self.connect(self.owner)
+        student = await self.connect(self.student)
+        await self.drain(owner)
+        await self.drain(student)
+        for frame in ({}, {'message_id': 'x'}, {'message_id': -1}, {'message_id': None}):
+            await student.send_json_to({'type': 'read', **frame})
+        self.assertTrue(await student.receive_nothing(0.1))
+        # сокет жив: следующая отметка доходит
+        await student.send_json_to({'type': 'read', 'message_id': self.incoming[0]})
+        self.assertEqual(await self.drain(owner), [{'v': 1, 'e': 'read', 'u': self.student.id, 'up': self.incoming[0]}])
+        await student.disconnect()
+        await owner.disconnect()
+
+
+class EnvelopeTests(TestCase):
+
+    def test_round_trip(self):
+        message = Message(id=7, sender_id=3, text='Привет, "мир"', timestamp=timezone.now())
+        message.attachment.name = 'attachments/file.txt'
+        for event in (envelope.message_envelope(message), envelope.presence_state_envelope([1, 2]),
+                      envelope.read_envelope(3, 7)):
+            with self.subTest(event=event['e']):
+                packed = envelope.encode(event)
+                self.assertIsInstance(packed, bytes)
+                self.assertEqual(envelope.decode_frame(bytes_data=packed), event)
+                self.assertEqual(envelope.decode_frame(text_data=envelope.as_json(packed)), event)
+        self.assertIn('"m":"Привет, \\"мир\\""', envelope.as_json(envelope.encode(envelope.message_envelope(message))))
+
+
+class ChatEndpointBudgetTests(EndpointBudgetMixin, APITestCase):
+    urls_module = urls
+
+    def endpoint_requests(self):
+        owner, student = self.data.owner, self.data.student
+        return {
+            ('start_convo', 'POST'): dict(user=student, data={'email': owner.email}, status=302),
+            ('get_conversation', 'GET'): dict(kwargs={'pk': self.data.conversation.pk}, user=student),
+            ('conversations', 'GET'): dict(user=owner),
+            ('message_search', 'GET'): dict(user=student, data={'q': 'message 1'}),
+        }
@@ -3,6 +3,16 @@ from . import views
 
 urlpatterns = [
     path('start/', views.StartConvoView.as_view(), name='start_convo'),
+    path('search/', views.MessageSearchView.as_view(), name='message_search'),
     path('<int:pk>/', views.GetConversationView.as_view(), name='get_conversation'),
     path('', views.ConversationsListView.as_view(), name='conversations')
 ]
+
+# Бюджеты для chat/tests.py (см. gen_zone/testing.py):
+# имя URL -> метод -> (максимум запросов к БД, максимум байт ответа) на данных seed()
+QUERY_BUDGETS = {
+    'start_convo': {'POST': (89, 19000)},
+    'get_conversation': {'GET': (87, 21000)},
+    'conversations': {'GET': (442, 95000)},
+    'message_search': {'GET': (2, 8500)},
+}
@@ -1,4 +1,5 @@
 # views.py
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveAPIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -6,9 +7,12 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404, reverse
 from rest_framework import status
 from django.db.models import Q
+from rest_framework.utils.urls import replace_query_param
 from .models import Conversation, Message
+from .search import MIN_QUERY_LENGTH, highlight, search_messages, surrounding
 from users.models import User
-from .serializers import ConversationListSerializer, ConversationSerializer, MessageSerializer, CustomPageNumberPagination
+from .serializers import (ConversationListSerializer, ConversationSerializer, MessageSerializer,
+                          CustomPageNumberPagination, MessageKeysetPagination, MessageSearchPagination)
 
 
 
@@ -32,45 +36,48 @@ class StartConvoView(CreateAPIView):
         email = request.data.get('email')
         participant = get_object_or_404(User, email=email)
 
-        conversation = Conversation.objects.filter(Q(initiator=request.user, receiver=participant) |
-                                                   Q(initiator=participant, receiver=request.user)).first()
+        # Точечный поиск по уникальному ключу пары, вставка защищена тем же индексом
+        pair_low, pair_high = Conversation.pair_key(request.user.id, participant.id)
+        conversation, created = Conversation.objects.get_or_create(
+            pair_low=pair_low, pair_high=pair_high,
+            defaults={'initiator': request.user, 'receiver': participant},
+        )
 
-        if conversation:
-            return Response(ConversationSerializer(instance=conversation, context={"request": request}).data,
-                            status=status.HTTP_302_FOUND)
-        else:
-            conversation = Conversation.objects.create(initiator=request.user, receiver=participant)
-            serializer = ConversationSerializer(instance=conversation, context={"request": request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        serializer = ConversationSerializer(instance=conversation, context={"request": request})
+        if not created:
+            return Response(serializer.data, status=status.HTTP_302_FOUND)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 # Представление для получения разговора по его идентификатору
 class GetConversationView(RetrieveAPIView):
     """
-    получение диалога по его айди с пагинацией(обычно по 10).
+    получение диалога по его айди с keyset-пагинацией сообщений(обычно по 10).
 
     Параметры:
     - pk: Идентификатор разговора.
+    - before: курсор, вернуть сообщения старше него (ссылка "next").
+    - at: курсор, вернуть его сообщение и более старые (ссылка jump из поиска).
+    - after: курсор, вернуть сообщения новее него (ссылка "previous").
+    - page_size: количество сообщений на странице.
 
     Возвращает:
-    - 200 OK: Возвращает детали разговора с пагинированными сообщениями.
+    - 200 OK: Возвращает участников разговора и страницу сообщений (от новых к старым).
     P.S.
-    времено оставил message_set(возвращает все сообщения)
-    для изменения количества сообщений нужно добавить "?page_size=num"(максимум 100)
-    "http://127.0.0.1:8000/api/conversations/1/?page_size=20"
+    message_set больше не возвращается, история листается только курсорами:
+    "http://127.0.0.1:8000/api/conversations/1/?before=<cursor>&page_size=20"
     """
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated]
-    queryset = Conversation.objects.all()
-    pagination_class = CustomPageNumberPagination  # Используйте ваш класс пагинации
+    queryset = Conversation.objects.select_related('initiator', 'receiver')
+    pagination_class = MessageKeysetPagination
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        # Получаем все сообщения
-        messages = Message.objects.filter(conversation_id=instance.id).order_by('-timestamp')
+        # Сообщения выбираются по индексу (conversation_id, timestamp, id) без OFFSET
+        messages = Message.objects.filter(conversation_id=instance.id)
 
-        # Пагинируем сообщения, используя указанный класс пагинации
         paginated_messages = self.paginate_queryset(messages)
 
         # Сериализуем разговор с пагинированными сообщениями
@@ -96,4 +103,48 @@ class ConversationsListView(ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Conversation.objects.filter(Q(initiator=user) | Q(receiver=user))
\ No newline at end of file
+        return Conversation.objects.filter(Q(initiator=user) | Q(receiver=user))
+
+
+
+# Представление для поиска по сообщениям своих диалогов
+class MessageSearchView(ListAPIView):
+    """
+    поиск по тексту сообщений в диалогах текущего пользователя, от новых к старым.
+
+    Параметры:
+    - q: подстрока, не меньше трех символов, регистр не важен.
+    - before / after / page_size: keyset-пагинация, как у истории диалога; page_size - до 100.
+
+    Возвращает:
+    - 200 OK: найденные сообщения; у каждого conversation (id диалога), highlight (текст,
+      экранированный для HTML, совпадения в <mark></mark>) и jump - ссылка на историю диалога,
+      страница которой начинается с этого сообщения: до него - по "next", после - по "previous";
+      context - соседние сообщения диалога: before и after, до двух с каждой стороны, от старых к новым.
+    - 400 Bad Request: запрос короче трех символов.
+    """
+    serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = MessageSearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if len(query) < MIN_QUERY_LENGTH:
+            raise ValidationError({'q': f'Не меньше {MIN_QUERY_LENGTH} символов.'})
+        self.query = query
+        return search_messages(self.request.user, query)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        results = MessageSerializer(instance=page, many=True).data
+        context = surrounding(page)
+        for item, message in zip(results, page):
+            history = request.build_absolute_uri(reverse('get_conversation', kwargs={'pk': message.conversation_id_id}))
+            item['conversation'] = message.conversation_id_id
+            item['highlight'] = highlight(message.text, self.query)
+            item['jump'] = replace_query_param(history, self.paginator.at_query_param,
+                                               self.paginator.encode_cursor(message))
+            before, after = context.get(message.id, ([], []))
+            item['context'] = {'before': MessageSerializer(instance=before, many=True).data,
+                               'after': MessageSerializer(instance=after, many=True).data}
+        return self.get_paginated_response(results)
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Course, Module, Lesson, Step, Content
+from .models import Course, Module, Lesson, Step, Content, Review
 from django.utils.html import format_html
+from .teardown import delete_course
 
 class ContentInline(admin.StackedInline):
     model = Content
@@ -25,7 +26,7 @@ class ModuleInline(admin.StackedInline):
 class CourseAdmin(admin.ModelAdmin):
     inlines = [ModuleInline]
     readonly_fields = ('image_tag',)
-    list_display = ('title', 'description', 'owner', 'rating', 'price', 'image_tag')
+    list_display = ('title', 'description', 'owner', 'rating', 'rating_count', 'price', 'image_tag')
     search_fields = ('title', 'owner__username')
     list_filter = ('owner',)
 
@@ -34,6 +35,13 @@ class CourseAdmin(admin.ModelAdmin):
     
     image_tag.short_description = 'Image'
 
+    def delete_model(self, request, obj):
+        delete_course(obj)
+
+    def delete_queryset(self, request, queryset):
+        for course in queryset:
+            delete_course(course)
+
 @admin.register(Module)
 class ModuleAdmin(admin.ModelAdmin):
     inlines = [LessonInline]
@@ -45,16 +53,28 @@ class ModuleAdmin(admin.ModelAdmin):
 class LessonAdmin(admin.ModelAdmin):
     inlines = [StepInline]
     list_display = ('module', 'lesson_num', 'lesson_title', 'lesson_description')
-    list_filter = ('module__course', 'module')
+    list_filter = ('course', 'module')
     search_fields = ('lesson_title',)
 
 @admin.register(Step)
 class StepAdmin(admin.ModelAdmin):
     inlines = [ContentInline]
     list_display = ('lesson', 'step_num')
-    list_filter = ('lesson__module__course', 'lesson__module', 'lesson')
+    list_filter = ('course', 'lesson__module', 'lesson')
     search_fields = ('step_num',)
 
 @admin.register(Content)
 class ContentAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ('course', 'user', 'rating', 'created_at')
+    list_filter = ('rating',)
+    raw_id_fields = ('course', 'user')
+
+    def delete_queryset(self, request, queryset):
+        # по одному: Review.delete() вычитает оценку из рейтинга курса
+        for review in queryset:
+            review.delete()
@@ -0,0 +1,70 @@
+"""
+Копирование курса со всем деревом: Course -> Module -> Lesson -> Step -> Content.
+
+Каждый уровень читается одним запросом по денормализованному course_id и вставляется одним
+bulk_create; id новых строк возвращает сама вставка (RETURNING), и таблица соответствий
+старый id -> новый id уровня подставляет родителя следующему уровню. Все в одной транзакции,
+число запросов не зависит от размера курса (в SQLite Django делит большую вставку на пачки
+по 999 параметров, в PostgreSQL это один INSERT на уровень).
+
+Строки поискового индекса (SearchEntry) копируются так же, со ссылками на новые объекты.
+
+Файлы (preview, image, video, hls) не копируются: копия ссылается на те же имена в хранилище.
+Общие файлы не удаляются вместе с одним из курсов (см. teardown.sweep).
+"""
+from django.db import router, transaction
+
+from .models import Content, Course, Lesson, Module, SearchEntry, Step
+
+# Сверху вниз: уровень и поле его родителя
+TREE_LEVELS = ((Module, 'course_id'), (Lesson, 'module_id'), (Step, 'lesson_id'), (Content, 'step_id'))
+# Поля курса, которые переносятся в копию (рейтинг у копии свой)
+COURSE_FIELDS = ('title', 'description', 'preview', 'price')
+
+
+def _clone_level(model, parent_attname, parents, source_id, course_id):
+    fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+    rows = list(model.objects.filter(course_id=source_id).order_by('pk').values_list('pk', *fields))
+    clones = []
+    for _, *values in rows:
+        clone = model(**dict(zip(fields, values)))
+        setattr(clone, parent_attname, parents[getattr(clone, parent_attname)])
+        clone.course_id = course_id
+        clones.append(clone)
+    model.objects.bulk_create(clones)
+    return {row[0]: clone.pk for row, clone in zip(rows, clones)}
+
+
+def _clone_search_entries(source_id, course_id, clones):
+    # строку самого курса создал save() копии
+    rows = (SearchEntry.objects.filter(course_id=source_id)
+            .exclude(module=None, lesson=None, content=None)
+            .values_list('module_id', 'lesson_id', 'content_id', 'title', 'body'))
+    SearchEntry.objects.bulk_create([
+        SearchEntry(course_id=course_id, module_id=clones[Module].get(module_id),
+                    lesson_id=clones[Lesson].get(lesson_id), content_id=clones[Content].get(content_id),
+                    title=title, body=body)
+        for module_id, lesson_id, content_id, title, body in rows
+    ])
+
+
+def clone_course(course, owner, title=None):
+    """
+    Копия course с владельцем owner. Возвращает новый курс.
+    """
+    using = router.db_for_write(Course, instance=course)
+    with transaction.atomic(using=using):
+        clone = Course(owner=owner, **{name: getattr(course, name) for name in COURSE_FIELDS})
+        if title:
+            clone.title = title
+        clone.save(force_insert=True)
+
+        parents = {course.pk: clone.pk}
+        clones = {}
+        for model, parent_attname in TREE_LEVELS:
+            parents = clones[model] = _clone_level(model, parent_attname, parents, course.pk, clone.pk)
+        _clone_search_entries(course.pk, clone.pk, clones)
+
+        owner.courses_owned.add(clone)
+        owner.courses.add(clone)
+    return clone
@@ -0,0 +1,38 @@
+"""
+Проверяет денормализованный course_id уроков, шагов и контента (см. CoursePart в courses/models.py):
+он должен совпадать с course_id родителя. bulk_create и update() в обход save() могут его рассогласовать.
+
+    python manage.py check_course_roots          # ошибка, если есть расхождения
+    python manage.py check_course_roots --fix    # исправить сверху вниз по дереву
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from courses.models import Content, Lesson, Step
+
+# Сверху вниз: исправленный course_id урока проверяется уже у его шагов
+LEVELS = ((Lesson, 'module'), (Step, 'lesson'), (Content, 'step'))
+
+
+class Command(BaseCommand):
+    help = 'Проверяет (и с --fix исправляет) course_id уроков, шагов и контента'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='исправить расхождения')
+
+    def handle(self, *args, **options):
+        total = 0
+        with transaction.atomic():
+            for model, parent_name in LEVELS:
+                broken = model.objects.exclude(course_id=F(f'{parent_name}__course_id'))
+                count = broken.count()
+                total += count
+                self.stdout.write(f'{model.__name__}: {count}')
+                if count and options['fix']:
+                    parent_model = model._meta.get_field(parent_name).related_model
+                    parent_course = parent_model.objects.filter(pk=OuterRef(f'{parent_name}_id')).values('course_id')
+                    model.objects.filter(pk__in=broken.values('pk')).update(course_id=Subquery(parent_course))
+
+        if total and not options['fix']:
+            raise CommandError(f'course_id не совпадает с родителем: {total}')
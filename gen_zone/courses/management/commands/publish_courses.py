@@ -0,0 +1,28 @@
+"""
+Публикация курсов (см. courses/publishing.py). Пока курс не опубликован, студенты читают
+его черновик; команда публикует курсы разом, например при переходе на публикации.
+
+    python manage.py publish_courses              # курсы, которые еще не публиковались
+    python manage.py publish_courses --course 42  # новая версия указанных курсов
+"""
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from courses.publishing import publish
+
+
+class Command(BaseCommand):
+    help = 'Публикует черновики курсов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help='id курса (можно несколько)')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['course']:
+            courses = courses.filter(id__in=options['course'])
+        else:
+            courses = courses.filter(published_version=None)
+
+        for course in courses.order_by('id').iterator():
+            self.stdout.write(f'{course.id} {course.title}: версия {publish(course)}')
@@ -0,0 +1,23 @@
+"""
+Перестраивает поисковый индекс (SearchEntry, см. courses/search.py) по дереву курсов.
+
+save() поддерживает индекс сам; команда нужна после bulk_create, update() и загрузки данных
+в обход моделей (loaddata, SQL).
+
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --course 1 --course 2
+"""
+from django.core.management.base import BaseCommand
+
+from courses.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс курсов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help='id курса (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        entries = rebuild(options['course'])
+        self.stdout.write(f'Строк в индексе: {entries}')
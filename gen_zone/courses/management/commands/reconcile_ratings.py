@@ -0,0 +1,25 @@
+"""
+Пересчитывает рейтинг курсов с нуля по отзывам (см. courses/ratings.py).
+
+Рейтинг обновляется вместе с каждым отзывом; команда нужна после удаления отзывов queryset'ом,
+загрузки данных в обход моделей и для проверки расхождений (печатает, сколько курсов исправлено).
+
+    python manage.py reconcile_ratings
+    python manage.py reconcile_ratings --batch-size 1000
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.ratings import RECONCILE_BATCH_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг курсов по отзывам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=RECONCILE_BATCH_SIZE, help='курсов за транзакцию')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        checked, fixed = reconcile(options['batch_size'])
+        self.stdout.write(f'Проверено курсов: {checked}, исправлено: {fixed}')
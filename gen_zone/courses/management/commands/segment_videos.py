@@ -0,0 +1,48 @@
+"""
+HLS-нарезка загруженных видео (см. courses/video.py). Запускается после загрузки
+уроков или по расписанию; по умолчанию обрабатывает только видео без нарезки.
+
+    python manage.py segment_videos
+    python manage.py segment_videos --content 42 --segment-seconds 4
+"""
+import shutil
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from courses.models import Content
+from courses.video import HLS_SEGMENT_SECONDS, segment_video
+
+
+class Command(BaseCommand):
+    help = 'Нарезает видео уроков на HLS-сегменты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--content', type=int, action='append', help='id контента (можно несколько)')
+        parser.add_argument('--all', action='store_true', help='нарезать заново уже нарезанные видео')
+        parser.add_argument('--segment-seconds', type=int, default=HLS_SEGMENT_SECONDS)
+
+    def handle(self, *args, **options):
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise CommandError('ffmpeg не найден в PATH')
+
+        contents = Content.objects.filter(content_type=Content.VIDEO_TYPE).exclude(video='').exclude(video=None)
+        if options['content']:
+            contents = contents.filter(id__in=options['content'])
+        if not options['all']:
+            contents = contents.filter(Q(hls=None) | Q(hls=''))
+
+        failed = 0
+        for content in contents.order_by('id'):
+            try:
+                segment_video(content, ffmpeg, options['segment_seconds'])
+            except subprocess.CalledProcessError as exc:
+                failed += 1
+                self.stderr.write(f'{content.id} {content.video.name}: {exc.stderr.decode(errors="replace").strip()}')
+            else:
+                self.stdout.write(f'{content.id} {content.hls.name}')
+
+        if failed:
+            raise CommandError(f'не удалось нарезать видео: {failed}')
@@ -0,0 +1,24 @@
+"""
+Удаляет файлы удаленных курсов из очереди OrphanedFile (см. courses/teardown.py).
+
+Обычно очередь разбирает фоновый поток после удаления курса; команда нужна для cron при
+MEDIA_SWEEP_IN_BACKGROUND=0 и для остатков очереди, если процесс завершился до уборки.
+
+    python manage.py sweep_media
+"""
+from django.core.management.base import BaseCommand
+
+from courses.models import OrphanedFile
+from courses.teardown import SWEEP_BATCH_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы медиа из очереди OrphanedFile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='файлов за проход')
+
+    def handle(self, *args, **options):
+        queued = OrphanedFile.objects.count()
+        removed = sweep(options['batch_size'])
+        self.stdout.write(f'В очереди: {queued}, удалено файлов: {removed}')
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:03
+
+import courses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_content_remove_textcontent_step_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='hls',
+            field=models.FileField(blank=True, editable=False, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='content',
+            name='video',
+            field=models.FileField(blank=True, null=True, upload_to=courses.models.content_upload_path),
+        ),
+    ]
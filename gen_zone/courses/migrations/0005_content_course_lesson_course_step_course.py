@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_content_hls_content_video'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='content',
+            name='course',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='course',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='courses.course'),
+        ),
+        migrations.AddField(
+            model_name='step',
+            name='course',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to='courses.course'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_course_roots(apps, schema_editor):
+    """
+    Заполняет course_id уроков, шагов и контента из родителя: три UPDATE с подзапросом,
+    сверху вниз по дереву, без загрузки строк в Python.
+    """
+    Module = apps.get_model('courses', 'Module')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Step = apps.get_model('courses', 'Step')
+    Content = apps.get_model('courses', 'Content')
+
+    Lesson.objects.update(course_id=Subquery(Module.objects.filter(pk=OuterRef('module_id')).values('course_id')))
+    Step.objects.update(course_id=Subquery(Lesson.objects.filter(pk=OuterRef('lesson_id')).values('course_id')))
+    Content.objects.update(course_id=Subquery(Step.objects.filter(pk=OuterRef('step_id')).values('course_id')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_content_course_lesson_course_step_course'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_course_roots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:22
+
+import courses.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_orphanedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='published_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='LessonSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('module_num', models.IntegerField()),
+                ('lesson_num', models.IntegerField()),
+                ('data', models.BinaryField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_snapshots', to='courses.course')),
+            ],
+            options={
+                'unique_together': {('course', 'version', 'module_num', 'lesson_num')},
+            },
+            bases=(courses.models.SnapshotMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='CourseSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('outline', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='courses.course')),
+            ],
+            options={
+                'unique_together': {('course', 'version')},
+            },
+            bases=(courses.models.SnapshotMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Конфигурация текстового поиска PostgreSQL; search.SEARCH_CONFIG должна совпадать с ней
+SEARCH_CONFIG = 'russian'
+
+POSTGRES_INDEX = [
+    # колонка вычисляется базой при каждой вставке и изменении строки, Django о ней не знает
+    f"""ALTER TABLE courses_searchentry ADD COLUMN document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, title), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, body), 'B')) STORED""",
+    'CREATE INDEX courses_searchentry_document_idx ON courses_searchentry USING gin (document)',
+]
+POSTGRES_INDEX_DROP = [
+    'DROP INDEX courses_searchentry_document_idx',
+    'ALTER TABLE courses_searchentry DROP COLUMN document',
+]
+
+# Таблица FTS5 без своей копии текста (content=): его читает snippet() из courses_searchentry.
+# Синхронизируют ее триггеры - при любой записи в courses_searchentry, в том числе каскадной и
+# _raw_delete. Если Django пересоздаст courses_searchentry (AlterField в SQLite), триггеры пропадут.
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE courses_searchentry_fts USING fts5(
+        title, body, content='courses_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER courses_searchentry_fts_insert AFTER INSERT ON courses_searchentry BEGIN
+        INSERT INTO courses_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER courses_searchentry_fts_delete AFTER DELETE ON courses_searchentry BEGIN
+        INSERT INTO courses_searchentry_fts(courses_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER courses_searchentry_fts_update AFTER UPDATE OF title, body ON courses_searchentry BEGIN
+        INSERT INTO courses_searchentry_fts(courses_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO courses_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+SQLITE_INDEX_DROP = [
+    'DROP TRIGGER courses_searchentry_fts_insert',
+    'DROP TRIGGER courses_searchentry_fts_delete',
+    'DROP TRIGGER courses_searchentry_fts_update',
+    'DROP TABLE courses_searchentry_fts',
+]
+
+# Заполнение по существующим курсам, как search.rebuild: INSERT ... SELECT на уровень
+BACKFILL = [
+    """INSERT INTO courses_searchentry (course_id, title, body)
+        SELECT id, title, description FROM courses_course""",
+    """INSERT INTO courses_searchentry (course_id, module_id, title, body)
+        SELECT course_id, id, module_title, module_description FROM courses_module""",
+    """INSERT INTO courses_searchentry (course_id, lesson_id, title, body)
+        SELECT course_id, id, lesson_title, lesson_description FROM courses_lesson""",
+    """INSERT INTO courses_searchentry (course_id, content_id, title, body)
+        SELECT course_id, id, '', text FROM courses_content WHERE text <> ''""",
+]
+
+
+def create_search_index(apps, schema_editor):
+    statements = {'postgresql': POSTGRES_INDEX, 'sqlite': SQLITE_INDEX}.get(schema_editor.connection.vendor, [])
+    for statement in statements + BACKFILL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'postgresql': POSTGRES_INDEX_DROP, 'sqlite': SQLITE_INDEX_DROP}.get(
+        schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_course_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('content', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_entry', to='courses.content')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='courses.course')),
+                ('lesson', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_entry', to='courses.lesson')),
+                ('module', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_entry', to='courses.module')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('content', None), ('lesson', None), ('module', None)), fields=('course',), name='courses_searchentry_course_uniq'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
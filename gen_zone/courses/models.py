@@ -1,19 +1,124 @@
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, router, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Floor
+from django.dispatch import Signal
 from users.models import User as UsersUser
 from django.core.exceptions import ValidationError
 from django.core.management.utils import get_random_secret_key
 
+from . import paths
+
+
+# Рейтинг курсов course_ids изменился через add_ratings или bulk_update, в обход Course.save()
+# и post_save (typeahead.ratings_changed). Аргументы: course_ids, using
+ratings_changed = Signal()
+
 
 def course_preview_upload_path(instance, filename):
     return f'courses/{instance.title}_{get_random_secret_key()[:8]}/preview/{filename}'
 
-class Course(models.Model):
+class SearchIndexedMixin:
+    """
+    Объект в полнотекстовом поиске (search.py): его заголовок и текст (search_fields) лежат
+    в строке SearchEntry, которую save() создает или обновляет, если они изменились.
+    Строка удаляется каскадом вместе с объектом. bulk_create и update() индекс не обновляют
+    (manage.py rebuild_search_index).
+    """
+    # (поле заголовка или None, поле текста)
+    search_fields = ()
+    # поле SearchEntry со ссылкой на объект; строка курса ссылается только на курс
+    search_link = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = {'id', *(field for field in instance.search_fields if field)}
+        if instance.search_link:
+            loaded.add('course_id')
+        # отложенные поля (only/defer) не подгружаются: при сохранении строка просто обновится
+        instance._loaded_search = instance.search_values() if loaded <= set(field_names) else None
+        return instance
+
+    def search_values(self):
+        title_field, body_field = self.search_fields
+        course_id = self.pk if self.search_link is None else self.course_id
+        title = (getattr(self, title_field) or '') if title_field else ''
+        return course_id, title, getattr(self, body_field) or ''
+
+    def new_search_entry(self):
+        course_id, title, body = self.search_values()
+        link = {f'{self.search_link}_id': self.pk} if self.search_link else {}
+        return SearchEntry(course_id=course_id, title=title, body=body, **link)
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        values = self.search_values()
+        if created or values != getattr(self, '_loaded_search', None):
+            SearchEntry.objects.index(self, created)
+        self._loaded_search = values
+
+
+# Рейтинг курса сглаживается по Байесу: курс с немногими отзывами тянется к RATING_PRIOR_MEAN,
+# как будто у него уже есть RATING_PRIOR_WEIGHT отзывов с такой оценкой
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5
+
+
+def bayesian_score(rating_sum, rating_count):
+    """
+    Сглаженный рейтинг по сумме и числу оценок: числа или выражения БД (F, Subquery).
+    """
+    return (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + rating_sum) / (RATING_PRIOR_WEIGHT + rating_count)
+
+
+def rounded_rating(score):
+    # половина - вверх, одинаково в Python и в SQL (ROUND в PostgreSQL для float округляет к четному)
+    return Floor(score + 0.5) if hasattr(score, 'resolve_expression') else int(score + 0.5)
+
+
+class CourseQuerySet(models.QuerySet):
+
+    def add_ratings(self, rating_sum, rating_count):
+        """
+        Прибавляет rating_sum к сумме и rating_count к числу оценок курсов и пересчитывает
+        рейтинг - один UPDATE с F(), без чтения строк.
+        """
+        # в SET справа - старые значения строки, поэтому рейтинг считается по новым суммам явно
+        new_sum = F('rating_sum') + rating_sum
+        new_count = F('rating_count') + rating_count
+        score = bayesian_score(new_sum, new_count)
+        return self.update(rating_sum=new_sum, rating_count=new_count, rating_score=score,
+                           rating=rounded_rating(score))
+
+
+class Course(SearchIndexedMixin, models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     owner = models.ForeignKey(UsersUser, on_delete=models.CASCADE)
+    # rating - rating_score, округленный до целого; оба ведет Review (см. CourseQuerySet.add_ratings)
     rating = models.IntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_score = models.FloatField(default=RATING_PRIOR_MEAN, editable=False)
     preview = models.ImageField(upload_to=course_preview_upload_path, null=False, blank=False)
     price = models.IntegerField(default = 0)
+    # текущая опубликованная версия (CourseSnapshot.version), None - курс не публиковался
+    published_version = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    search_fields = ('title', 'description')
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # список курсов: ?ordering=-rating и ?min_rating=, ?ordering=price и ?max_price=
+            models.Index(fields=['rating'], name='courses_course_rating_idx'),
+            # ?ordering=-rating_score
+            models.Index(fields=['rating_score'], name='courses_course_score_idx'),
+            models.Index(fields=['price'], name='courses_course_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -22,49 +127,147 @@ class Course(models.Model):
         if not self.preview:
             raise ValidationError({'preview': 'Это поле обязательно.'})
 
-class Module(models.Model):
+class TracksParentMixin:
+    """
+    Запоминает место объекта в дереве курса (id родителя parent_name, id курса, номер num_field)
+    на момент загрузки из базы. По нему save() замечает перенос к другому родителю, а изменение
+    места (создание, перенос, перенумерация, удаление) сбрасывает индекс путей курса (paths.py),
+    если объект в нем есть (path_indexed).
+    """
+    parent_name = None
+    num_field = None
+    path_indexed = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_position = instance.tree_position()
+        return instance
+
+    def tree_position(self):
+        attnames = (self._meta.get_field(self.parent_name).attname, 'course_id', self.num_field)
+        return tuple(self.__dict__.get(attname) for attname in attnames)
+
+    def moved(self):
+        loaded = getattr(self, '_loaded_position', None)
+        return not self._state.adding and loaded is not None and self.tree_position()[0] != loaded[0]
+
+    def save(self, *args, **kwargs):
+        moved = self.moved()
+        loaded = getattr(self, '_loaded_position', None)
+        super().save(*args, **kwargs)
+        self._loaded_position = self.tree_position()
+        if moved:
+            # потомки переезжают вместе с объектом
+            for queryset in self.descendants():
+                queryset.update(course_id=self.course_id)
+        if self.path_indexed and self._loaded_position != loaded:
+            paths.invalidate(self.course_id, loaded and loaded[1])
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        if self.path_indexed:
+            paths.invalidate(self.course_id)
+        return result
+
+    def descendants(self):
+        return []
+
+
+class Module(SearchIndexedMixin, TracksParentMixin, models.Model):
     course = models.ForeignKey(Course, related_name='modules', on_delete=models.CASCADE)
     module_num = models.IntegerField()
     module_title = models.CharField(max_length=255)
     module_description = models.TextField()
 
+    parent_name = 'course'
+    num_field = 'module_num'
+    search_fields = ('module_title', 'module_description')
+    search_link = 'module'
+
     def __str__(self):
         return self.module_title
     
     class Meta:
         unique_together = ['course', 'module_num']
 
-    
+    def descendants(self):
+        return [Lesson.objects.filter(module=self), Step.objects.filter(lesson__module=self),
+                Content.objects.filter(step__lesson__module=self),
+                SearchEntry.objects.filter(Q(lesson__module=self) | Q(content__step__lesson__module=self))]
+
+
+class CoursePart(TracksParentMixin, models.Model):
+    """
+    Часть курса ниже модуля. course - денормализованный корень дерева: проверки владельца и
+    доступа (permissions.py) и пути загрузок берут его напрямую, без подъема по цепочке FK.
+    Заполняется из родителя при создании и при переносе к другому родителю.
+    bulk_create и update() его не заполняют - это делает вызывающий код
+    (проверка: manage.py check_course_roots).
+    """
+    course = models.ForeignKey(Course, related_name='%(class)ss', on_delete=models.CASCADE, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.course_id is None or self.moved():
+            parent_field = self._meta.get_field(self.parent_name)
+            if parent_field.is_cached(self):
+                self.course_id = getattr(self, self.parent_name).course_id
+            else:
+                self.course_id = parent_field.related_model.objects.values_list('course_id', flat=True).get(
+                    pk=getattr(self, parent_field.attname))
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'course'}
+        super().save(*args, **kwargs)
 
-class Lesson(models.Model):
+
+class Lesson(SearchIndexedMixin, CoursePart):
     module = models.ForeignKey(Module, related_name='lessons', on_delete=models.CASCADE)
     lesson_num = models.IntegerField()
     lesson_title = models.CharField(max_length=255)
     lesson_description = models.TextField()
 
+    parent_name = 'module'
+    num_field = 'lesson_num'
+    search_fields = ('lesson_title', 'lesson_description')
+    search_link = 'lesson'
+
     def __str__(self):
         return self.lesson_title
     
     class Meta:
         unique_together = ['module', 'lesson_num']
+
+    def descendants(self):
+        return [Step.objects.filter(lesson=self), Content.objects.filter(step__lesson=self),
+                SearchEntry.objects.filter(content__step__lesson=self)]
     
-class Step(models.Model):
+class Step(CoursePart):
     lesson = models.ForeignKey(Lesson, related_name='steps', on_delete=models.CASCADE)
     step_num = models.IntegerField()
 
+    parent_name = 'lesson'
+    num_field = 'step_num'
+
     def __str__(self):
         return f'{self.lesson.lesson_title}.{self.step_num}'
 
     class Meta:
         unique_together = ['lesson', 'step_num']
 
+    def descendants(self):
+        return [Content.objects.filter(step=self), SearchEntry.objects.filter(content__step=self)]
+
 
 
 def content_upload_path(instance, filename):
-    return f'courses/{instance.step.lesson.module.course.title}_{instance.step.lesson.module.course.id}/{instance.step.lesson.module.module_title}/{instance.step.lesson.lesson_title}/{filename}'
+    # по course_id, без подъема по цепочке шаг -> урок -> модуль -> курс
+    return f'courses/{instance.course_id}/steps/{instance.step_id}/{filename}'
 
 
-class Content(models.Model):
+class Content(SearchIndexedMixin, CoursePart):
     TEXT_TYPE = 'text'
     IMAGE_TYPE = 'image'
     VIDEO_TYPE = 'video'
@@ -80,12 +283,170 @@ class Content(models.Model):
     content_type = models.CharField(max_length=10, choices=CONTENT_TYPES)
     text = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to=content_upload_path, blank=True, null=True)
+    video = models.FileField(upload_to=content_upload_path, blank=True, null=True)
+    # HLS-плейлист видео (manage.py segment_videos), пусто до нарезки
+    hls = models.FileField(blank=True, null=True, editable=False)
     width = models.CharField(max_length=10, blank=True, null=True)
     height = models.CharField(max_length=10, blank=True, null=True)
 
+    parent_name = 'step'
+    num_field = 'content_num'
+    path_indexed = False
+    search_fields = (None, 'text')
+    search_link = 'content'
+
     class Meta:
         unique_together = ['step', 'content_num']
 
     def __str__(self):
         return f'{self.step} - Content {self.content_num} ({self.get_content_type_display()})'
 
+
+class SearchEntryManager(models.Manager):
+
+    def index(self, obj, created):
+        """
+        Записывает в индекс заголовок и текст obj (SearchIndexedMixin) в базе obj: один UPDATE или INSERT.
+        """
+        entry = obj.new_search_entry()
+        # в ту же базу, куда сохранен obj
+        using = obj._state.db
+        if not created:
+            if obj.search_link:
+                lookup = {f'{obj.search_link}_id': obj.pk}
+            else:
+                lookup = {'course_id': obj.pk, 'module': None, 'lesson': None, 'content': None}
+            if self.db_manager(using).filter(**lookup).update(course_id=entry.course_id, title=entry.title,
+                                                              body=entry.body):
+                return
+        # пустой текст (контент с картинкой или видео) не индексируется
+        if entry.title or entry.body:
+            entry.save(using=using, force_insert=True)
+
+
+class SearchEntry(models.Model):
+    """
+    Строка полнотекстового индекса (search.py): курс, модуль, урок или текстовый контент.
+    Ссылка на объект задает и удаление каскадом, и ссылку в ответе поиска; у строки курса
+    ссылок нет. course - курс объекта, как CoursePart.course.
+    Поисковый индекс базы над title и body создает миграция 0011: tsvector с GIN в PostgreSQL,
+    таблица FTS5 в SQLite.
+    """
+    course = models.ForeignKey(Course, related_name='search_entries', on_delete=models.CASCADE)
+    module = models.OneToOneField(Module, null=True, related_name='search_entry', on_delete=models.CASCADE)
+    lesson = models.OneToOneField(Lesson, null=True, related_name='search_entry', on_delete=models.CASCADE)
+    content = models.OneToOneField(Content, null=True, related_name='search_entry', on_delete=models.CASCADE)
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+
+    objects = SearchEntryManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course'], condition=Q(module=None, lesson=None, content=None),
+                                    name='courses_searchentry_course_uniq'),
+        ]
+
+
+class Review(models.Model):
+    """
+    Отзыв пользователя о курсе, один на пару (курс, пользователь). save() и delete() в той же
+    транзакции меняют сумму и число оценок курса (CourseQuerySet.add_ratings). Удаление queryset'ом
+    их не меняет - после него нужен manage.py reconcile_ratings; удаление пользователя
+    учитывается (ratings.user_deleting).
+    """
+    course = models.ForeignKey(Course, related_name='reviews', on_delete=models.CASCADE)
+    user = models.ForeignKey(UsersUser, related_name='reviews', on_delete=models.CASCADE)
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    text = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['course', 'user']
+        indexes = [
+            # отзывы курса, новые первыми
+            models.Index(fields=['course', 'created_at'], name='courses_review_course_new_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Review, instance=self)
+        with transaction.atomic(using=using):
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                Course.objects.filter(pk=self.course_id).add_ratings(self.rating, 1)
+                ratings_changed.send(sender=Review, course_ids=[self.course_id], using=using)
+                return
+            # прежняя оценка - из заблокированной строки: параллельная правка того же отзыва ждет
+            course_id, rating = Review.objects.using(using).select_for_update().values_list(
+                'course_id', 'rating').get(pk=self.pk)
+            super().save(*args, **kwargs)
+            if course_id != self.course_id:
+                Course.objects.filter(pk=course_id).add_ratings(-rating, -1)
+                Course.objects.filter(pk=self.course_id).add_ratings(self.rating, 1)
+                ratings_changed.send(sender=Review, course_ids=[course_id, self.course_id], using=using)
+            elif rating != self.rating:
+                Course.objects.filter(pk=self.course_id).add_ratings(self.rating - rating, 0)
+                ratings_changed.send(sender=Review, course_ids=[self.course_id], using=using)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Review, instance=self)
+        with transaction.atomic(using=using):
+            row = Review.objects.using(using).select_for_update().filter(pk=self.pk).values_list(
+                'course_id', 'rating').first()
+            result = super().delete(*args, **kwargs)
+            if row is not None:
+                Course.objects.filter(pk=row[0]).add_ratings(-row[1], -1)
+                ratings_changed.send(sender=Review, course_ids=[row[0]], using=using)
+        return result
+
+
+class OrphanedFile(models.Model):
+    """
+    Файл медиа, на который больше не ссылается удаленная запись (teardown.delete_course).
+    Строки добавляются в транзакции удаления, файлы удаляет teardown.sweep после коммита.
+    """
+    name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class SnapshotMixin:
+    """
+    Снимки публикации неизменяемы: новая версия - новые строки (publishing.py).
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError(f'{type(self).__name__} нельзя изменить после создания')
+        super().save(*args, **kwargs)
+
+
+class CourseSnapshot(SnapshotMixin, models.Model):
+    """
+    Опубликованная версия курса: оглавление в формате CourseSerializer, сжатый JSON.
+    """
+    course = models.ForeignKey(Course, related_name='snapshots', on_delete=models.CASCADE)
+    version = models.PositiveIntegerField()
+    outline = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['course', 'version']
+
+
+class LessonSnapshot(SnapshotMixin, models.Model):
+    """
+    Урок опубликованной версии со всеми шагами и контентом в формате LessonSerializer, сжатый JSON.
+    Читается одним запросом по (course, version, module_num, lesson_num).
+    """
+    course = models.ForeignKey(Course, related_name='lesson_snapshots', on_delete=models.CASCADE)
+    version = models.PositiveIntegerField()
+    module_num = models.IntegerField()
+    lesson_num = models.IntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ['course', 'version', 'module_num', 'lesson_num']
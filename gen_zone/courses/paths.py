@@ -0,0 +1,87 @@
+"""
+Разрешение вложенных URL курса (course/<id>/module/<n>/lesson/<n>/step/<n>/) в первичные ключи.
+
+Индекс курса {module_num: (module_id, {lesson_num: (lesson_id, {step_num: step_id})})} строится
+одним запросом (LEFT JOIN модулей, уроков и шагов) и хранится в кэше Django, пока структура курса
+не изменится: создание, удаление, перенумерация или перенос модуля, урока или шага сбрасывают его
+(см. TracksParentMixin в models.py). Объект по пути загружается одним запросом по первичному ключу
+и сверяется с путем; если индекс устарел (изменение в обход save(), повторно выданный id),
+он перестраивается.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+# Индекс обычно сбрасывается при изменении структуры, это страховка (сек)
+PATH_INDEX_TIMEOUT = 24 * 60 * 60
+
+
+def _key(course_id):
+    return f'courses:paths:{course_id}'
+
+
+def build_index(course_id):
+    from .models import Module
+
+    index = {}
+    rows = Module.objects.filter(course_id=course_id).values_list(
+        'module_num', 'id', 'lessons__lesson_num', 'lessons__id', 'lessons__steps__step_num', 'lessons__steps__id')
+    for module_num, module_id, lesson_num, lesson_id, step_num, step_id in rows:
+        _, lessons = index.setdefault(module_num, (module_id, {}))
+        if lesson_id is not None:
+            _, steps = lessons.setdefault(lesson_num, (lesson_id, {}))
+            if step_id is not None:
+                steps[step_num] = step_id
+    return index
+
+
+def get_index(course_id, rebuild=False):
+    key = _key(course_id)
+    index = None if rebuild else cache.get(key)
+    if index is None:
+        index = build_index(course_id)
+        cache.set(key, index, PATH_INDEX_TIMEOUT)
+    return index
+
+
+def resolve(course_id, module_num, lesson_num=None, step_num=None, rebuild=False):
+    """
+    pk модуля, урока (lesson_num) или шага (lesson_num и step_num) по пути; None, если его нет.
+    """
+    try:
+        module_id, lessons = get_index(course_id, rebuild)[module_num]
+        if lesson_num is None:
+            return module_id
+        lesson_id, steps = lessons[lesson_num]
+        if step_num is None:
+            return lesson_id
+        return steps[step_num]
+    except KeyError:
+        return None
+
+
+def get_by_path(queryset, course_id, module_num, lesson_num=None, step_num=None):
+    """
+    Как get_object_or_404 для Module, Lesson или Step по номерам из URL, но одним запросом
+    по первичному ключу. queryset может содержать select_related.
+    """
+    num_field, num = next((field, value) for field, value in (
+        ('step_num', step_num), ('lesson_num', lesson_num), ('module_num', module_num)) if value is not None)
+    for rebuild in (False, True):
+        pk = resolve(course_id, module_num, lesson_num, step_num, rebuild)
+        if pk is None:
+            continue
+        obj = queryset.filter(pk=pk).first()
+        if obj is not None and obj.course_id == course_id and getattr(obj, num_field) == num:
+            return obj
+    raise Http404(f'{queryset.model._meta.object_name} не найден')
+
+
+def invalidate(*course_ids):
+    keys = [_key(course_id) for course_id in set(course_ids) if course_id is not None]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        # иначе параллельный запрос до коммита успеет закэшировать старую структуру
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,6 +1,24 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 
+def course_owner_id(obj):
+    """
+    Владелец курса, к которому относится obj. У Module, Lesson, Step и Content есть course_id,
+    так что достаточно самого курса (уже загруженного через select_related или одним запросом по pk).
+    """
+    if hasattr(obj, 'owner_id'):
+        return obj.owner_id
+    if hasattr(obj, 'course_id'):
+        return obj.course.owner_id
+    return None
+
+
+def course_id_of(obj):
+    if hasattr(obj, 'owner_id'):
+        return obj.pk
+    return getattr(obj, 'course_id', None)
+
+
 class IsOwnerOrReadOnly(BasePermission):
     """
     Пользователь может редактировать только свои объекты.
@@ -10,18 +28,19 @@ class IsOwnerOrReadOnly(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        if hasattr(obj, 'course'):
-            return obj.course.owner == request.user
+        owner_id = course_owner_id(obj)
+        return owner_id is not None and owner_id == request.user.pk
 
-        if hasattr(obj, 'owner'):
-            return obj.owner == request.user
 
-        if hasattr(obj, 'module') and hasattr(obj.module, 'course'):
-            return obj.module.course.owner == request.user
+class IsAuthorOrReadOnly(BasePermission):
+    """
+    Отзыв может менять и удалять только его автор.
+    """
 
-        if hasattr(obj, 'lesson') and hasattr(obj.lesson, 'module'):
-            return obj.lesson.module.course.owner == request.user
-        return False
+    def has_object_permission(self, request, view, obj):
+        if request.method in SAFE_METHODS:
+            return True
+        return obj.user_id == request.user.pk
 
 
 class HasCourse(BasePermission):
@@ -30,18 +49,12 @@ class HasCourse(BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        if hasattr(obj, 'course'):
-            return obj.course in request.user.courses.all() or obj.course.owner == request.user
-
-        if hasattr(obj, 'owner'):
-            return obj in request.user.courses.all() or obj.owner == request.user
-
-        if hasattr(obj, 'module') and hasattr(obj.module, 'course'):
-            return obj.module.course in request.user.courses.all() or obj.module.course.owner == request.user
-
-        if hasattr(obj, 'lesson') and hasattr(obj.lesson, 'module'):
-            return obj.lesson.module.course == request.user.courses.all() or obj.lesson.module.course.owner == request.user
-        return False
+        course_id = course_id_of(obj)
+        if course_id is None:
+            return False
+        if course_owner_id(obj) == request.user.pk:
+            return True
+        return request.user.is_authenticated and request.user.courses.filter(pk=course_id).exists()
 
 
 class CanEditCourse(BasePermission):
@@ -0,0 +1,119 @@
+"""
+Публикация курса: черновик и опубликованные снимки.
+
+Автор правит дерево курса (Module -> Lesson -> Step -> Content) как раньше - это черновик.
+publish() собирает его в новую версию: оглавление курса (CourseSnapshot) и по одному блобу на урок
+со всеми шагами и контентом (LessonSnapshot), каждый - JSON ответа сериализатора, сжатый zlib.
+Снимки не меняются; Course.published_version указывает на текущую версию.
+
+Студенты читают курс, урок и шаг из текущего снимка одним запросом по ключу
+(курс, версия, модуль, урок) - без обхода пяти таблиц и без недоделанных правок.
+Владелец курса читает черновик. Курс, который ни разу не публиковали, отдается из дерева.
+Урок и шаг из снимка отдаются с Last-Modified - временем публикации версии.
+
+URL файлов в снимке - как у сериализатора без запроса (/media/...); preview курса и фото
+владельца при чтении дополняются до абсолютных, как в живом ответе. Рейтинг (LIVE_FIELDS) берется живой.
+"""
+import json
+import zlib
+
+from django.db import router, transaction
+from django.db.models import Max, OuterRef, Prefetch, Subquery
+from django.http import Http404
+
+from gen_zone.fast_json import FastJSONRenderer
+from .models import Course, CourseSnapshot, Lesson, LessonSnapshot, Module, Step
+from .serializers import CourseSerializer, LessonSerializer
+
+SNAPSHOT_COMPRESSION_LEVEL = 6
+# Поля курса, которые меняются без публикации (отзывы, ratings.py)
+LIVE_FIELDS = ('rating', 'rating_count', 'rating_score')
+
+
+def pack(data):
+    return zlib.compress(FastJSONRenderer().render(data), SNAPSHOT_COMPRESSION_LEVEL)
+
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def _draft_tree(course_id):
+    steps = Step.objects.order_by('step_num').prefetch_related('contents')
+    lessons = Lesson.objects.order_by('lesson_num').prefetch_related(Prefetch('steps', queryset=steps))
+    modules = Module.objects.order_by('module_num').prefetch_related(Prefetch('lessons', queryset=lessons))
+    return Course.objects.select_related('owner').prefetch_related(
+        Prefetch('modules', queryset=modules)).get(pk=course_id)
+
+
+def publish(course):
+    """
+    Публикует черновик course новой версией и делает ее текущей. Возвращает номер версии.
+    """
+    using = router.db_for_write(Course, instance=course)
+    with transaction.atomic(using=using):
+        # параллельные публикации одного курса выстраиваются в очередь
+        list(Course.objects.select_for_update().filter(pk=course.pk).values_list('pk'))
+        version = (CourseSnapshot.objects.filter(course_id=course.pk).aggregate(
+            last=Max('version'))['last'] or 0) + 1
+
+        tree = _draft_tree(course.pk)
+        CourseSnapshot.objects.create(course=tree, version=version, outline=pack(CourseSerializer(tree).data))
+        LessonSnapshot.objects.bulk_create([
+            LessonSnapshot(course=tree, version=version, module_num=module.module_num,
+                           lesson_num=lesson.lesson_num, data=pack(LessonSerializer(lesson).data))
+            for module in tree.modules.all() for lesson in module.lessons.all()
+        ])
+        Course.objects.filter(pk=course.pk).update(published_version=version)
+    course.published_version = version
+    return version
+
+
+def current_snapshot(course_id, snapshots, field):
+    """
+    Один запрос: (владелец, текущая версия, блоб field из snapshots этой версии, время публикации
+    версии, *LIVE_FIELDS) курса.
+    """
+    current = snapshots.filter(course_id=OuterRef('pk'), version=OuterRef('published_version'))
+    published = CourseSnapshot.objects.filter(course_id=OuterRef('pk'), version=OuterRef('published_version'))
+    return (Course.objects.filter(pk=course_id)
+            .annotate(blob=Subquery(current.values(field)[:1]),
+                      published_at=Subquery(published.values('created_at')[:1]))
+            .values_list('owner_id', 'published_version', 'blob', 'published_at', *LIVE_FIELDS))
+
+
+def _published(course_id, user, snapshots, field):
+    row = current_snapshot(course_id, snapshots, field).first()
+    if row is None:
+        raise Http404
+    owner_id, version, blob, published_at, *live = row
+    live = dict(zip(LIVE_FIELDS, live))
+    if version is None or owner_id == user.pk:
+        return None, live, None
+    if blob is None:
+        raise Http404
+    return unpack(blob), live, published_at
+
+
+def published_course(request, course_id):
+    """
+    Оглавление текущей версии курса для request.user или None, если ему нужен черновик.
+    """
+    # время публикации в ответ не идет: живой рейтинг меняется и без новой версии
+    data, live, _ = _published(course_id, request.user, CourseSnapshot.objects.all(), 'outline')
+    if data is not None:
+        data.update(live)
+        for item, key in ((data, 'preview'), (data.get('owner') or {}, 'photo')):
+            if item.get(key):
+                item[key] = request.build_absolute_uri(item[key])
+    return data
+
+
+def published_lesson(request, course_id, module_num, lesson_num):
+    """
+    (урок текущей версии курса со всеми шагами, время публикации версии) для request.user
+    или (None, None), если ему нужен черновик. Http404, если в опубликованной версии нет такого урока.
+    """
+    lessons = LessonSnapshot.objects.filter(module_num=module_num, lesson_num=lesson_num)
+    data, _, published_at = _published(course_id, request.user, lessons, 'data')
+    return data, published_at
@@ -0,0 +1,84 @@
+"""
+Рейтинг курса по отзывам (Review).
+
+Сумма оценок, их число и сглаженный по Байесу рейтинг хранятся в Course (rating_sum, rating_count,
+rating_score и округленный rating) и меняются одним UPDATE с F() на каждую вставку, правку или
+удаление отзыва (Review.save/delete, CourseQuerySet.add_ratings) - среднее по отзывам не считается
+при чтении, а сортировка каталога по рейтингу идет по индексу.
+
+reconcile() пересчитывает все с нуля пачками курсов - после удаления отзывов queryset'ом, загрузки
+данных в обход моделей или для проверки расхождений (manage.py reconcile_ratings).
+
+Все три пути шлют models.ratings_changed с id курсов: рейтинг меняется в обход Course.save().
+"""
+from django.db import router, transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.signals import pre_delete
+
+from users.models import User
+from .models import Course, Review, bayesian_score, ratings_changed, rounded_rating
+
+RECONCILE_BATCH_SIZE = 500
+RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_score', 'rating')
+
+
+def user_deleting(sender, instance, **kwargs):
+    """
+    Отзывы удаляемого пользователя уходят каскадом, без Review.delete(): вычитаем их оценки
+    из курсов одним UPDATE, пока строки еще есть.
+    """
+    course_ids = list(Review.objects.filter(user=instance).values_list('course_id', flat=True))
+    if not course_ids:
+        return
+    own_rating = Review.objects.filter(user=instance, course_id=OuterRef('pk')).values('rating')[:1]
+    Course.objects.filter(pk__in=course_ids).add_ratings(-Subquery(own_rating), -1)
+    ratings_changed.send(sender=User, course_ids=course_ids, using=router.db_for_write(Course))
+
+
+def _reconcile_batch(after, batch_size):
+    # строки пачки заблокированы: параллельный отзыв прибавит свою оценку уже к пересчитанному
+    courses = list(Course.objects.select_for_update().filter(pk__gt=after).order_by('pk')
+                   .only('id', *RATING_FIELDS)[:batch_size])
+    if not courses:
+        return courses, 0
+    totals = {
+        course_id: (total, count) for course_id, total, count in
+        Review.objects.filter(course_id__in=[course.pk for course in courses]).order_by()
+        .values('course_id').annotate(total=Sum('rating'), count=Count('id'))
+        .values_list('course_id', 'total', 'count')
+    }
+    changed = []
+    for course in courses:
+        total, count = totals.get(course.pk, (0, 0))
+        score = bayesian_score(total, count)
+        values = (total, count, score, rounded_rating(score))
+        if tuple(getattr(course, field) for field in RATING_FIELDS) != values:
+            for field, value in zip(RATING_FIELDS, values):
+                setattr(course, field, value)
+            changed.append(course)
+    if changed:
+        Course.objects.bulk_update(changed, RATING_FIELDS)
+        ratings_changed.send(sender=Course, course_ids=[course.pk for course in changed],
+                             using=router.db_for_write(Course))
+    return courses, len(changed)
+
+
+def reconcile(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Пересчитывает рейтинг всех курсов по отзывам, по batch_size курсов в транзакции.
+    Возвращает (проверено курсов, исправлено курсов).
+    """
+    using = router.db_for_write(Course)
+    checked = fixed = after = 0
+    while True:
+        with transaction.atomic(using=using):
+            courses, changed = _reconcile_batch(after, batch_size)
+        if not courses:
+            return checked, fixed
+        checked += len(courses)
+        fixed += changed
+        after = courses[-1].pk
+
+
+def connect():
+    pre_delete.connect(user_deleting, sender=User, dispatch_uid='courses.ratings.user_deleting')
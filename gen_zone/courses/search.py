@@ -0,0 +1,154 @@
+"""
+Полнотекстовый поиск по курсам: название и описание курса, модулей и уроков, текст контента.
+
+Индекс - таблица SearchEntry, строка на объект: save() обновляет ее (models.SearchIndexedMixin),
+удаляется она каскадом вместе с объектом. Над ней - индекс базы (миграция 0011):
+- PostgreSQL: генерируемая колонка document (tsvector, заголовок с весом A, текст - B) и GIN-индекс
+  по ней. Запрос - websearch_to_tsquery, ранжирование ts_rank_cd, сниппет ts_headline считается
+  только для строк запрошенной страницы.
+- SQLite (локальная разработка и тесты): таблица FTS5 courses_searchentry_fts, ее синхронизируют
+  триггеры. Ранжирование bm25 с весом заголовка, сниппет snippet().
+Найденные строки одним запросом (select_related) дополняются ссылками на курс, модуль, урок и шаг.
+"""
+import html
+import re
+
+from django.db import connections, router, transaction
+from django.urls import reverse
+
+from .models import SearchEntry
+
+# Должна совпадать с конфигурацией колонки document в миграции 0011
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'courses_searchentry_fts'
+# Во сколько раз совпадение в заголовке весомее совпадения в тексте (SQLite; в PostgreSQL - веса A и B)
+TITLE_WEIGHT = 5.0
+SEARCH_MAX_RESULTS = 50
+SNIPPET_WORDS = 16
+# Границы подсветки в сниппете от базы; в ответе текст экранируется, а они заменяются на <mark>
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def _postgresql_matches(cursor, query, limit, offset):
+    options = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}'
+    cursor.execute(
+        """SELECT id, rank, ts_headline(%s::regconfig, concat_ws(' ', title, body), query, %s)
+        FROM (
+            SELECT id, title, body, ts_rank_cd(document, query) AS rank, query
+            FROM courses_searchentry, websearch_to_tsquery(%s::regconfig, %s) query
+            WHERE document @@ query
+            ORDER BY rank DESC, id LIMIT %s OFFSET %s
+        ) page
+        ORDER BY rank DESC, id""",
+        [SEARCH_CONFIG, options, SEARCH_CONFIG, query, limit, offset],
+    )
+    return cursor.fetchall()
+
+
+def _sqlite_matches(cursor, query, limit, offset):
+    # каждое слово - строка в кавычках: синтаксис запросов FTS5 пользователю не виден
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return []
+    cursor.execute(
+        f"""SELECT rowid, -bm25({FTS_TABLE}, %s, 1.0) AS rank,
+            snippet({FTS_TABLE}, -1, %s, %s, '…', %s)
+        FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+        ORDER BY rank DESC, rowid LIMIT %s OFFSET %s""",
+        [TITLE_WEIGHT, MARK_START, MARK_END, SNIPPET_WORDS, ' '.join(f'"{term}"' for term in terms), limit, offset],
+    )
+    return cursor.fetchall()
+
+
+MATCHERS = {'postgresql': _postgresql_matches, 'sqlite': _sqlite_matches}
+
+
+def _highlight(snippet):
+    return html.escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def _hit(entry, rank, snippet):
+    """
+    Ответ на одну найденную строку: что найдено, где оно в курсе и ссылка на него в API.
+    """
+    path = {'id': entry.course_id}
+    if entry.module_id:
+        kind, title = 'module', entry.module.module_title
+        path['module_num'] = entry.module.module_num
+    elif entry.lesson_id:
+        kind, title = 'lesson', entry.lesson.lesson_title
+        path.update(module_num=entry.lesson.module.module_num, lesson_num=entry.lesson.lesson_num)
+    elif entry.content_id:
+        step = entry.content.step
+        kind, title = 'content', step.lesson.lesson_title
+        path.update(module_num=step.lesson.module.module_num, lesson_num=step.lesson.lesson_num,
+                    step_num=step.step_num)
+    else:
+        kind, title = 'course', entry.course.title
+    return {
+        'type': kind,
+        'title': title,
+        'course_title': entry.course.title,
+        'snippet': _highlight(snippet),
+        'rank': rank,
+        **path,
+        'url': reverse(f"{'step' if kind == 'content' else kind}-detail", kwargs=path),
+    }
+
+
+def search(query, limit=20, offset=0):
+    """
+    Строки индекса по запросу query, лучшие первыми: список словарей _hit. Два запроса к БД.
+    """
+    using = router.db_for_read(SearchEntry)
+    connection = connections[using]
+    if connection.vendor not in MATCHERS:
+        raise NotImplementedError(f'полнотекстовый поиск не поддерживается для {connection.vendor}')
+    with connection.cursor() as cursor:
+        matches = MATCHERS[connection.vendor](cursor, query, min(limit, SEARCH_MAX_RESULTS), offset)
+    if not matches:
+        return []
+
+    entries = SearchEntry.objects.using(using).select_related(
+        'course', 'module', 'lesson__module', 'content__step__lesson__module',
+    ).in_bulk([entry_id for entry_id, _, _ in matches])
+    # строка могла удалиться между запросами
+    return [_hit(entries[entry_id], rank, snippet) for entry_id, rank, snippet in matches if entry_id in entries]
+
+
+REBUILD_STATEMENTS = [
+    ('courses_course', 'id', """INSERT INTO courses_searchentry (course_id, title, body)
+        SELECT id, title, description FROM courses_course"""),
+    ('courses_module', 'course_id', """INSERT INTO courses_searchentry (course_id, module_id, title, body)
+        SELECT course_id, id, module_title, module_description FROM courses_module"""),
+    ('courses_lesson', 'course_id', """INSERT INTO courses_searchentry (course_id, lesson_id, title, body)
+        SELECT course_id, id, lesson_title, lesson_description FROM courses_lesson"""),
+    ('courses_content', 'course_id', """INSERT INTO courses_searchentry (course_id, content_id, title, body)
+        SELECT course_id, id, '', text FROM courses_content WHERE text <> ''"""),
+]
+
+
+def rebuild(course_ids=None):
+    """
+    Перестраивает индекс всех курсов или курсов course_ids по их дереву - после bulk_create,
+    update() и правок в обход save(). DELETE и INSERT ... SELECT на уровень, строки не загружаются.
+    Возвращает число строк в индексе этих курсов.
+    """
+    using = router.db_for_write(SearchEntry)
+    entries = SearchEntry.objects.using(using)
+    condition, params = '', []
+    if course_ids is not None:
+        params = list(course_ids)
+        if not params:
+            return 0
+        entries = entries.filter(course_id__in=params)
+        condition = ', '.join(['%s'] * len(params))
+    with transaction.atomic(using=using):
+        entries._raw_delete(using)
+        with connections[using].cursor() as cursor:
+            for table, course_column, statement in REBUILD_STATEMENTS:
+                if condition:
+                    statement += ' AND' if 'WHERE' in statement else ' WHERE'
+                    statement += f' {table}.{course_column} IN ({condition})'
+                cursor.execute(statement, params)
+        return entries.count()
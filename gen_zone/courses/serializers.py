@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Course, Module, Lesson, Step, Content
+from gen_zone.compiled_serializers import CompiledRepresentationMixin
+from .models import Course, Module, Lesson, Step, Content, Review
 #from users.serializers import UserSerializer
 
 
@@ -42,7 +43,7 @@ class SBModuleSerializer(serializers.ModelSerializer):
 class ContentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Content
-        fields = ['content_num', 'content_type', 'text', 'image', 'width', 'height']
+        fields = ['content_num', 'content_type', 'text', 'image', 'video', 'hls', 'width', 'height']
 
 class StepSerializer(serializers.ModelSerializer):
     contents = ContentSerializer(many=True, required=False)
@@ -77,6 +78,9 @@ class StepSerializer(serializers.ModelSerializer):
             if not created:
                 for key, value in content_data.items():
                     setattr(content, key, value)
+                if 'video' in content_data:
+                    # нарезка относилась к прежнему файлу
+                    content.hls = None
                 content.save()
 
         return instance
@@ -113,7 +117,7 @@ class LessonSerializer(serializers.ModelSerializer):
 
         return lesson
 
-class ModuleSerializer(serializers.ModelSerializer):
+class ModuleSerializer(CompiledRepresentationMixin, serializers.ModelSerializer):
     lessons = SBLessonSerializer(many=True, read_only=True)
 
     class Meta:
@@ -138,14 +142,22 @@ class ModuleSerializer(serializers.ModelSerializer):
 
         return module
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(CompiledRepresentationMixin, serializers.ModelSerializer):
     #   owner = UserSerializer(read_only=True)
     modules = SBModuleSerializer(many=True, read_only=True)
 
     class Meta:
         model = Course
-        fields = ['id', 'title', 'description', 'owner', 'rating', 'preview', 'price', 'modules']
-        read_only_fields = ['rating', 'id', 'modules', 'owner']
+        fields = ['id', 'title', 'description', 'owner', 'rating', 'rating_count', 'rating_score', 'preview',
+                  'price', 'modules']
+        read_only_fields = ['rating', 'rating_count', 'rating_score', 'id', 'modules', 'owner']
         extra_kwargs = {'preview': {'required': True}}
         depth = 1
-    
+
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Review
+        fields = ['id', 'user', 'rating', 'text', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
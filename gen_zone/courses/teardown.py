@@ -0,0 +1,129 @@
+"""
+Удаление курса целиком и уборка его файлов.
+
+course.delete() через Collector Django загружает в память каждый модуль, урок, шаг и контент,
+а файлы (preview, image, video, hls) остаются на диске. delete_course удаляет дерево снизу вверх
+запросами DELETE ... WHERE course_id = ? по денормализованному course_id (CoursePart), в одной
+транзакции. Имена файлов в том же проходе читаются потоком и записываются в OrphanedFile,
+число запросов и память не зависят от размера курса.
+
+Сами файлы удаляет sweep(): после коммита в фоновом потоке (MEDIA_SWEEP_IN_BACKGROUND)
+или командой manage.py sweep_media. Файл, на который еще ссылается другая запись (например,
+общий с копией курса), не удаляется.
+"""
+import os
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, router, transaction
+from django.db.models import Q
+
+from . import paths
+from .models import Content, Course, Lesson, Module, OrphanedFile, SearchEntry, Step
+
+# Поля с файлами медиа: модель -> поля
+FILE_FIELDS = {Course: ('preview',), Content: ('image', 'video', 'hls')}
+# Курс удаляется снизу вверх: у каждого уровня к моменту удаления нет потомков
+# (строки поискового индекса ссылаются на модули, уроки и контент)
+TREE_LEVELS = (SearchEntry, Content, Step, Lesson, Module)
+SWEEP_BATCH_SIZE = 500
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='media-sweeper')
+_pending = None
+
+
+def _queue_files(names):
+    batch = []
+    for name in names:
+        if name:
+            batch.append(OrphanedFile(name=name))
+        if len(batch) >= SWEEP_BATCH_SIZE:
+            OrphanedFile.objects.bulk_create(batch)
+            batch = []
+    OrphanedFile.objects.bulk_create(batch)
+
+
+def delete_course(course):
+    """
+    Удаляет курс со всем деревом и ставит его файлы в очередь на удаление.
+    """
+    using = router.db_for_write(Course, instance=course)
+    with transaction.atomic(using=using):
+        contents = (Content.objects.filter(course_id=course.pk)
+                    .filter(Q(image__gt='') | Q(video__gt='') | Q(hls__gt=''))
+                    .values_list(*FILE_FIELDS[Content]).iterator(chunk_size=SWEEP_BATCH_SIZE))
+        _queue_files(chain([course.preview.name], chain.from_iterable(contents)))
+
+        for model in TREE_LEVELS:
+            # _raw_delete - один DELETE без Collector: потомков у удаляемых строк уже нет
+            model.objects.filter(course_id=course.pk)._raw_delete(using)
+        # оставшиеся связи (записи на курс, избранное) - обычным Collector, без загрузки дерева
+        course.delete()
+        paths.invalidate(course.pk)
+
+        if settings.MEDIA_SWEEP_IN_BACKGROUND:
+            transaction.on_commit(schedule_sweep, using=using)
+
+
+def schedule_sweep():
+    """
+    Запускает sweep() в фоновом потоке. Если уборка уже идет, ставит еще одну за ней:
+    текущая могла уже увидеть пустую очередь.
+    """
+    global _pending
+    if _pending is None or _pending.done() or _pending.running():
+        _pending = _executor.submit(_sweep_in_thread)
+    return _pending
+
+
+def _sweep_in_thread():
+    try:
+        return sweep()
+    finally:
+        connection.close()
+
+
+def _referenced(names):
+    referenced = set()
+    for model, fields in FILE_FIELDS.items():
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__in': names})
+        for row in model.objects.filter(condition).values_list(*fields):
+            referenced.update(row)
+    return referenced
+
+
+def _delete_file(name):
+    default_storage.delete(name)
+    if name.endswith('.m3u8'):
+        # плейлист HLS: сегменты лежат в его каталоге (см. video.segment_video)
+        directory = os.path.dirname(name)
+        _, files = default_storage.listdir(directory)
+        for file in files:
+            default_storage.delete(f'{directory}/{file}')
+        try:
+            os.rmdir(default_storage.path(directory))
+        except (NotImplementedError, OSError):
+            pass
+
+
+def sweep(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Удаляет файлы из очереди OrphanedFile. Возвращает число удаленных файлов.
+    """
+    removed = 0
+    while True:
+        batch = list(OrphanedFile.objects.order_by('id')[:batch_size])
+        if not batch:
+            return removed
+        names = {orphan.name for orphan in batch}
+        for name in names - _referenced(names):
+            try:
+                _delete_file(name)
+            except FileNotFoundError:
+                continue
+            removed += 1
+        OrphanedFile.objects.filter(id__in=[orphan.id for orphan in batch]).delete()
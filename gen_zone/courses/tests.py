@@ -1,3 +1,923 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import Http404
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import CharField, ModelSerializer, ReadOnlyField, Serializer
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from benchmarks.query_plans import check_hot_queries, sequential_scans
+from gen_zone import response_middleware
+from gen_zone.compiled_serializers import compile_serializer
+from gen_zone.fast_json import FastJSONParser, FastJSONRenderer
+from gen_zone.db_router import PIN_COOKIE, REPLICA_ALIAS
+from gen_zone.testing import LOCAL_CACHES, EndpointBudgetMixin, png_file, seed
+from users.models import User
+from . import urls
+from . import cloning
+from . import paths
+from . import publishing
+from . import ratings
+from . import search
+from . import typeahead
+from . import teardown
+from .models import (Content, Course, CourseSnapshot, Lesson, LessonSnapshot, Module, OrphanedFile, Review,
+                     SearchEntry, Step, content_upload_path)
+from .permissions import IsOwnerOrReadOnly
+from .serializers import CourseSerializer, ModuleSerializer, StepSerializer
+from .views import CourseListCreateView
+
+
+def separate_replica():
+    replica = settings.DATABASES.get(REPLICA_ALIAS)
+    return replica is not None and not replica.get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(separate_replica(), 'нужна отдельная реплика: DATABASE_REPLICA_URL и DATABASE_REPLICA_TEST_MIRROR=0')
+@override_settings(CACHES=LOCAL_CACHES)
+class ReplicaRoutingTests(TestCase):
+    """
+    Primary и реплика - разные базы, одна и та же строка курса отличается названием,
+    так что по ответу видно, откуда было чтение.
+    """
+    databases = {'default', REPLICA_ALIAS} if separate_replica() else {'default'}
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='pass',
+                                              first_name='Owner', last_name='Owner')
+        self.course = Course.objects.create(title='primary', description='d', owner=self.owner, preview='p.png')
+        self.owner.save(using=REPLICA_ALIAS)
+        Course.objects.using(REPLICA_ALIAS).create(id=self.course.id, title='replica', description='d',
+                                                    owner=self.owner, preview='p.png')
+        self.client = APIClient()
+
+    def titles(self, response):
+        # список курсов отдается потоком
+        return [course['title'] for course in json.loads(b''.join(response.streaming_content))]
+
+    def test_safe_request_reads_from_replica(self):
+        response = self.client.get('/api/courses/courses/')
+        self.assertEqual(self.titles(response), ['replica'])
+
+    def test_streamed_nested_reads_use_same_database(self):
+        for alias in ('default', REPLICA_ALIAS):
+            Module.objects.using(alias).create(course_id=self.course.id, module_num=1, module_title=alias,
+                                               module_description='d')
+        response = self.client.get('/api/courses/courses/')
+        courses = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([module['module_title'] for module in courses[0]['modules']], [REPLICA_ALIAS])
+
+    def test_view_can_opt_out(self):
+        response = self.client.get(f'/api/courses/course/{self.course.id}/')
+        self.assertEqual(response.json()['title'], 'primary')
+
+    def test_write_pins_client_to_primary(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(f'/api/courses/course/{self.course.id}/module/',
+                                    {'module_title': 'm', 'module_description': 'd'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response = self.client.get('/api/courses/courses/')
+        self.assertEqual(self.titles(response), ['primary'])
+
+
+class OwnerRoleSerializer(ModelSerializer):
+    role = CharField(source='get_role_display')
+
+    class Meta:
+        model = User
+        fields = ('id', 'first_name', 'role')
+
+
+class CourseOwnerSerializer(ModelSerializer):
+    # прямая связь, вызываемый source во вложенном и атрибут, которого нет (DRF пропускает поле)
+    owner = OwnerRoleSerializer()
+    missing = ReadOnlyField(source='not_an_attribute')
+
+    class Meta:
+        model = Course
+        fields = ('id', 'title', 'owner', 'missing')
+
+
+class CompiledSerializerParityTests(TestCase):
+    """
+    Скомпилированное представление должно совпадать с DRF байт в байт, включая порядок ключей.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=2, students=2, messages=0)
+
+    def assertSameAsDrf(self, serializer_class, instance, context):
+        serializer = serializer_class(instance, context=context)
+        drf = Serializer.to_representation(serializer, instance)
+        compiled = compile_serializer(serializer_class)(instance, context)
+        self.assertEqual(JSONRenderer().render(compiled), JSONRenderer().render(drf))
+
+    def test_course(self):
+        request = APIRequestFactory().get('/api/courses/courses/')
+        for context in ({}, {'request': request}):
+            for course in Course.objects.all():
+                with self.subTest(course=course.id, request='request' in context):
+                    self.assertSameAsDrf(CourseSerializer, course, context)
+
+    def test_module(self):
+        for module in Module.objects.filter(course=self.data.course):
+            self.assertSameAsDrf(ModuleSerializer, module, {})
+
+    def test_sources_resolved_like_drf(self):
+        # у несохраненного курса владельца нет: DRF получает ObjectDoesNotExist и отдает None
+        for course in (*Course.objects.select_related('owner'), Course(title='Без владельца')):
+            with self.subTest(course=course.title):
+                self.assertSameAsDrf(CourseOwnerSerializer, course, {})
+        compiled = compile_serializer(CourseOwnerSerializer)(self.data.course, {})
+        self.assertEqual(compiled['owner']['role'], self.data.course.owner.get_role_display())
+        self.assertNotIn('missing', compiled)
+
+    def test_listing_uses_compiled_representation(self):
+        courses = Course.objects.all()
+        data = CourseSerializer(courses, many=True).data
+        self.assertEqual(data, [compile_serializer(CourseSerializer)(course, {}) for course in courses])
+
+    def test_custom_to_representation_is_not_compiled(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_serializer(StepSerializer)
+
+
+class FastJSONTests(TestCase):
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'text': 'Курс \u2028 \u2029 "quoted"',
+            'created': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 1, 2),
+            'price': Decimal('10.50'),
+            'id': uuid.UUID(int=1),
+            1: [None, True, 1.5],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # orjson не кодирует целые больше 64 бит - откат на реализацию DRF
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), JSONRenderer().render({'big': 2 ** 70}))
+        indented = 'application/json; indent=4'
+        self.assertEqual(FastJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+
+    def test_parser_matches_drf(self):
+        body = json.dumps({'title': 'Курс', 'items': [1, 2.5, None, False]}).encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        for invalid in (b'{"a": NaN}', b'{"a": '):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(invalid))
+
+    def test_course_list_is_streamed_in_chunks(self):
+        seed(courses=3, students=1, messages=0)
+        with mock.patch.object(CourseListCreateView, 'stream_chunk_size', 2):
+            response = APIClient().get('/api/courses/courses/')
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+
+        request = APIRequestFactory().get('/api/courses/courses/')
+        expected = CourseSerializer(Course.objects.all(), many=True, context={'request': request}).data
+        self.assertEqual(b''.join(chunks), JSONRenderer().render(expected))
+
+    def test_empty_course_list(self):
+        response = APIClient().get('/api/courses/courses/')
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+
+class CoursesEndpointBudgetTests(EndpointBudgetMixin, APITestCase):
+    urls_module = urls
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # отзыв второго студента - его читают, правят и удаляют в бюджетах review-detail
+        cls.review = Review.objects.create(course=cls.data.course, user=cls.data.students[1], rating=4)
+
+    def endpoint_requests(self):
+        owner, student = self.data.owner, self.data.student
+        course = {'id': self.data.course.id}
+        other_course = {'id': self.data.courses[-1].id}
+        module = {**course, 'module_num': 1}
+        lesson = {**module, 'lesson_num': 1}
+        step = {**lesson, 'step_num': 1}
+        review = {**course, 'review_id': self.review.id}
+        return {
+            ('course-list', 'GET'): {},
+            ('course-list', 'POST'): dict(user=owner, format='multipart', status=201,
+                                          data={'title': 'New', 'description': 'd', 'price': 1, 'preview': png_file()}),
+            ('course-search', 'GET'): dict(data={'q': 'lesson description'}),
+            ('course-typeahead', 'GET'): dict(data={'q': 'cour'}),
+            ('course-detail', 'GET'): dict(kwargs=course),
+            ('course-detail', 'PUT'): dict(kwargs=course, user=owner, data={'title': 'Renamed'}),
+            ('course-detail', 'DELETE'): dict(kwargs=course, user=owner, status=204),
+            ('module-create', 'POST'): dict(kwargs=course, user=owner, status=201,
+                                            data={'module_title': 'm', 'module_description': 'd'}),
+            ('module-detail', 'GET'): dict(kwargs=module),
+            ('module-detail', 'PUT'): dict(kwargs=module, user=owner, data={'module_title': 'm'}),
+            ('module-detail', 'DELETE'): dict(kwargs=module, user=owner, status=204),
+            ('lesson-create', 'POST'): dict(kwargs=module, user=owner, status=201,
+                                            data={'lesson_title': 'l', 'lesson_description': 'd'}),
+            ('lesson-detail', 'GET'): dict(kwargs=lesson),
+            ('lesson-detail', 'PUT'): dict(kwargs=lesson, user=owner, data={'lesson_title': 'l'}),
+            ('lesson-detail', 'DELETE'): dict(kwargs=lesson, user=owner, status=204),
+            ('step-create', 'POST'): dict(kwargs=lesson, user=owner, status=201, data={}),
+            ('step-detail', 'GET'): dict(kwargs=step),
+            ('step-detail', 'PATCH'): dict(kwargs=step, user=owner, format='json', data={'contents': [
+                {'content_num': 1, 'content_type': 'text', 'text': 'Updated'},
+            ]}),
+            ('add-course', 'GET'): dict(kwargs=other_course, user=student),
+            ('remove-course', 'GET'): dict(kwargs=course, user=student),
+            ('add-favorite-course', 'GET'): dict(kwargs=other_course, user=student),
+            ('remove-favorite-course', 'GET'): dict(kwargs=course, user=student),
+            ('add-in-progress-course', 'GET'): dict(kwargs=other_course, user=student),
+            ('remove-in-progress-course', 'GET'): dict(kwargs=course, user=student),
+            ('course-clone', 'POST'): dict(kwargs=course, user=owner, status=201, data={'title': 'Fork'}),
+            ('course-publish', 'POST'): dict(kwargs=course, user=owner, status=201),
+            ('review-list', 'GET'): dict(kwargs=course),
+            ('review-list', 'POST'): dict(kwargs=course, user=student, status=201, data={'rating': 5, 'text': 'ok'}),
+            ('review-detail', 'GET'): dict(kwargs=review),
+            ('review-detail', 'PUT'): dict(kwargs=review, user=self.data.students[1], data={'rating': 2}),
+            ('review-detail', 'DELETE'): dict(kwargs=review, user=self.data.students[1], status=204),
+        }
+
+
+class MediaStreamingTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.video = bytes(range(256)) * 64
+        os.makedirs(os.path.join(self.media_root, 'courses'))
+        with open(os.path.join(self.media_root, 'courses', 'lesson.mp4'), 'wb') as file:
+            file.write(self.video)
+        self.url = '/media/courses/lesson.mp4'
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.video)}')
+        self.assertEqual(b''.join(response.streaming_content), self.video[1000:2000])
+        response.close()
+
+    def test_asgi_streams_file_in_blocks(self):
+        async def fetch():
+            response = await self.async_client.get(self.url)
+            return response, [chunk async for chunk in response]
+
+        with mock.patch.object(response_middleware, 'FILE_BLOCK_SIZE', 4096):
+            response, chunks = async_to_sync(fetch)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(chunks), len(self.video) // 4096)
+        self.assertEqual(b''.join(chunks), self.video)
+
+    def test_offload_to_nginx(self):
+        with override_settings(MEDIA_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/courses/lesson.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Cache-Control'], f'max-age={settings.MEDIA_MAX_AGE}, public')
+        self.assertEqual(response.content, b'')
+
+    def test_offload_with_sendfile(self):
+        with override_settings(MEDIA_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'courses', 'lesson.mp4'))
+
+    def test_segment_videos_requires_ffmpeg(self):
+        with mock.patch('shutil.which', return_value=None), self.assertRaises(CommandError):
+            call_command('segment_videos')
+
+    @skipUnless(shutil.which('ffmpeg'), 'нужен ffmpeg')
+    def test_segment_videos(self):
+        seed(courses=1, modules=1, lessons=1, steps=1, contents=0, students=1, messages=0)
+        subprocess.run([shutil.which('ffmpeg'), '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=duration=3:size=64x64',
+                        '-c:v', 'libx264', os.path.join(self.media_root, 'courses', 'clip.mp4')], check=True)
+        content = Content.objects.create(step=Step.objects.get(), content_num=1, content_type=Content.VIDEO_TYPE,
+                                         video='courses/clip.mp4')
+
+        call_command('segment_videos', segment_seconds=1, stdout=io.StringIO())
+
+        content.refresh_from_db()
+        self.assertEqual(content.hls.name, 'courses/clip_hls/index.m3u8')
+        self.assertEqual(self.client.get('/media/' + content.hls.name).status_code, 200)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CourseRootTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=2, modules=1, lessons=1, steps=1, contents=1, students=1, messages=0)
+        cls.first, cls.second = cls.data.courses
+
+    def assertRoots(self, course, lesson):
+        self.assertEqual(Lesson.objects.get(pk=lesson.pk).course_id, course.id)
+        self.assertEqual(set(Step.objects.filter(lesson=lesson).values_list('course_id', flat=True)), {course.id})
+        self.assertEqual(set(Content.objects.filter(step__lesson=lesson).values_list('course_id', flat=True)),
+                         {course.id})
+
+    def test_new_parts_take_course_from_parent(self):
+        lesson = Lesson.objects.create(module=Module.objects.get(course=self.first), lesson_num=2,
+                                       lesson_title='New', lesson_description='')
+        step = Step.objects.create(lesson=Lesson.objects.get(pk=lesson.pk), step_num=1)
+        content = Content(step=step, content_num=1, content_type=Content.TEXT_TYPE)
+        content.save()
+        self.assertEqual((lesson.course_id, step.course_id, content.course_id), (self.first.id,) * 3)
+        self.assertEqual(content_upload_path(content, 'clip.mp4'), f'courses/{self.first.id}/steps/{step.id}/clip.mp4')
+
+    def test_moving_lesson_moves_descendants(self):
+        lesson = Lesson.objects.get(course=self.first)
+        lesson.module = Module.objects.get(course=self.second)
+        lesson.lesson_num = 2
+        lesson.save()
+        self.assertRoots(self.second, lesson)
+
+    def test_moving_module_moves_descendants(self):
+        module = Module.objects.get(course=self.first)
+        module.course = self.second
+        module.module_num = 2
+        module.save()
+        self.assertRoots(self.second, Lesson.objects.get(module=module))
+
+    def test_owner_check_is_one_comparison(self):
+        step = Step.objects.select_related('course').get(course=self.first)
+        request = APIRequestFactory().patch('/')
+        permission = IsOwnerOrReadOnly()
+        with self.assertNumQueries(0):
+            request.user = self.data.owner
+            self.assertTrue(permission.has_object_permission(request, None, step))
+            request.user = self.data.student
+            self.assertFalse(permission.has_object_permission(request, None, step))
+
+    def test_check_course_roots(self):
+        out = io.StringIO()
+        call_command('check_course_roots', stdout=out)
+        Step.objects.filter(course=self.first).update(course=self.second)
+        with self.assertRaises(CommandError):
+            call_command('check_course_roots', stdout=out)
+
+        call_command('check_course_roots', fix=True, stdout=out)
+        call_command('check_course_roots', stdout=out)
+        self.assertRoots(self.first, Lesson.objects.get(course=self.first))
+
+
+@override_settings(CACHES=LOCAL_CACHES, MEDIA_SWEEP_IN_BACKGROUND=1)
+class CourseTeardownTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.data = seed(courses=2, modules=2, lessons=2, steps=2, contents=1, students=1, messages=0)
+        self.course, self.other = self.data.courses
+        for course in self.data.courses:
+            self.write(course.preview.name)
+
+        first, second = Content.objects.filter(course=self.course)[:2]
+        first.image = self.write(f'courses/{self.course.id}/image.png')
+        first.hls = self.write(f'courses/{self.course.id}/clip_hls/index.m3u8')
+        self.write(f'courses/{self.course.id}/clip_hls/00000.ts')
+        first.save()
+        # общий с другим курсом файл остается на диске
+        second.video = self.write('courses/shared.mp4')
+        second.save()
+        Content.objects.filter(course=self.other).update(video='courses/shared.mp4')
+
+    def write(self, name):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'data')
+        return name
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def test_delete_removes_tree_and_sweeps_files(self):
+        client = APIClient()
+        client.force_authenticate(self.data.owner)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.delete(reverse('course-detail', kwargs={'id': self.course.id}))
+        self.assertEqual(response.status_code, 204)
+        self.assertIn(teardown.schedule_sweep, callbacks)
+
+        self.assertFalse(Course.objects.filter(pk=self.course.pk).exists())
+        for model in (Module, Lesson, Step, Content):
+            self.assertFalse(model.objects.filter(course_id=self.course.id).exists())
+        self.assertEqual(Step.objects.filter(course=self.other).count(), 8)
+        self.assertNotIn(self.course.id, self.data.student.courses.values_list('id', flat=True))
+        self.assertEqual(OrphanedFile.objects.count(), 4)
+
+        self.assertEqual(teardown.sweep(batch_size=2), 3)
+        self.assertFalse(OrphanedFile.objects.exists())
+        self.assertFalse(self.exists(self.course.preview.name))
+        self.assertFalse(self.exists(f'courses/{self.course.id}/image.png'))
+        self.assertFalse(self.exists(f'courses/{self.course.id}/clip_hls'))
+        self.assertTrue(self.exists('courses/shared.mp4'))
+        self.assertTrue(self.exists(self.other.preview.name))
+
+    def test_query_count_does_not_depend_on_course_size(self):
+        with CaptureQueriesContext(connection) as small:
+            teardown.delete_course(self.other)
+
+        lesson = Lesson.objects.filter(course=self.course).first()
+        steps = Step.objects.bulk_create([Step(lesson=lesson, course=self.course, step_num=number)
+                                          for number in range(3, 1003)])
+        Content.objects.bulk_create([Content(step=step, course=self.course, content_num=1,
+                                             content_type=Content.TEXT_TYPE, text='text') for step in steps])
+        with CaptureQueriesContext(connection) as large:
+            teardown.delete_course(self.course)
+        self.assertEqual(len(large), len(small))
+        self.assertFalse(Step.objects.exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CourseCloneTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=2, modules=2, lessons=2, steps=2, contents=2, students=1, messages=0)
+        cls.course, cls.other = cls.data.courses
+        Content.objects.filter(course=cls.course, content_num=2).update(
+            content_type=Content.IMAGE_TYPE, image=f'courses/{cls.course.id}/image.png')
+
+    @staticmethod
+    def tree(course):
+        return sorted(Content.objects.filter(course=course).values_list(
+            'step__lesson__module__module_num', 'step__lesson__lesson_num', 'step__step_num', 'content_num',
+            'content_type', 'text', 'image', 'step__course', 'step__lesson__course', 'step__lesson__module__course'))
+
+    def clone(self, course, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.data.owner)
+        return client.post(reverse('course-clone', kwargs={'id': course.id}), {'title': 'Fork'})
+
+    def test_clone_copies_tree_and_shares_media(self):
+        response = self.clone(self.course)
+        self.assertEqual(response.status_code, 201)
+        clone = Course.objects.get(pk=response.data['id'])
+        self.assertEqual((clone.title, clone.preview.name, clone.owner), ('Fork', self.course.preview.name, self.data.owner))
+        self.assertIn(clone, self.data.owner.courses_owned.all())
+
+        source_tree, clone_tree = self.tree(self.course), self.tree(clone)
+        self.assertEqual(len(clone_tree), 16)
+        self.assertEqual([row[:7] for row in clone_tree], [row[:7] for row in source_tree])
+        self.assertEqual({row[7:] for row in clone_tree}, {(clone.id,) * 3})
+        self.assertEqual(Module.objects.filter(course=clone).count(), 2)
+        self.assertEqual(Step.objects.filter(course=self.course).count(), 8)
+
+    def test_only_owner_can_clone(self):
+        self.assertEqual(self.clone(self.course, user=self.data.student).status_code, 403)
+
+    def test_query_count_does_not_depend_on_course_size(self):
+        def batches(model, count):
+            # в SQLite Django делит bulk_create на пачки по 999 параметров, в PostgreSQL пачка одна
+            fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+            return -(-count // connection.ops.bulk_batch_size(fields, [None] * count))
+
+        with CaptureQueriesContext(connection) as small:
+            cloning.clone_course(self.other, self.data.owner)
+
+        lesson = Lesson.objects.filter(course=self.course).first()
+        steps = Step.objects.bulk_create([Step(lesson=lesson, course=self.course, step_num=number)
+                                          for number in range(3, 503)])
+        Content.objects.bulk_create([Content(step=step, course=self.course, content_num=1,
+                                             content_type=Content.TEXT_TYPE, text='text') for step in steps])
+        with CaptureQueriesContext(connection) as large:
+            clone = cloning.clone_course(self.course, self.data.owner)
+        self.assertEqual(Content.objects.filter(course=clone).count(), 516)
+        extra_batches = (batches(Step, 508) - batches(Step, 8)) + (batches(Content, 516) - batches(Content, 16))
+        self.assertEqual(len(large), len(small) + extra_batches)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class PublishingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=1, modules=2, lessons=2, steps=2, contents=1, students=1, messages=0)
+        cls.course = cls.data.course
+
+    def request(self, method, name, user=None, data=None, **kwargs):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return getattr(client, method)(reverse(name, kwargs={'id': self.course.id, **kwargs}), data)
+
+    def read(self, name, user=None, data=None, **kwargs):
+        response = self.request('get', name, user, data, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def edit_draft(self):
+        lesson = Lesson.objects.get(course=self.course, module__module_num=1, lesson_num=1)
+        lesson.lesson_title = 'Draft title'
+        lesson.save()
+        Content.objects.filter(step__lesson=lesson).update(text='Draft text')
+
+    def test_students_read_published_version(self):
+        student, owner = self.data.student, self.data.owner
+        lesson = {'module_num': 1, 'lesson_num': 1}
+        before = [self.read('lesson-detail', student, {'page': 2}, **lesson),
+                  self.read('step-detail', student, step_num=2, **lesson),
+                  self.read('course-detail', student)]
+
+        response = self.request('post', 'course-publish', owner)
+        self.assertEqual((response.status_code, response.data['version']), (201, 1))
+        self.edit_draft()
+        Course.objects.filter(pk=self.course.pk).update(rating=5)
+
+        published = [self.read('lesson-detail', student, {'page': 2}, **lesson),
+                     self.read('step-detail', student, step_num=2, **lesson),
+                     self.read('course-detail', student)]
+        before[2]['rating'] = 5
+        self.assertEqual(published, before)
+        self.assertEqual(self.read('lesson-detail', owner, **lesson)['results']['lesson_title'], 'Draft title')
+
+        self.assertEqual(self.request('post', 'course-publish', owner).data['version'], 2)
+        self.assertEqual(self.read('lesson-detail', student, **lesson)['results']['lesson_title'], 'Draft title')
+        self.assertEqual(self.read('step-detail', student, step_num=1, **lesson)['contents'][0]['text'], 'Draft text')
+
+    def test_published_reads_are_one_query(self):
+        publishing.publish(self.course)
+        with self.assertNumQueries(3):
+            self.read('course-detail', self.data.student)
+            self.read('lesson-detail', self.data.student, module_num=2, lesson_num=2)
+            self.read('step-detail', None, module_num=2, lesson_num=2, step_num=1)
+
+    def test_published_reads_have_last_modified(self):
+        publishing.publish(self.course)
+        published_at = http_date(CourseSnapshot.objects.get(course=self.course).created_at.timestamp())
+        client = APIClient()
+        client.force_authenticate(self.data.student)
+        for url in (reverse('lesson-detail', kwargs={'id': self.course.id, 'module_num': 1, 'lesson_num': 1}),
+                    reverse('step-detail', kwargs={'id': self.course.id, 'module_num': 1, 'lesson_num': 1,
+                                                   'step_num': 1})):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url)['Last-Modified'], published_at)
+                self.assertEqual(client.get(url, HTTP_IF_MODIFIED_SINCE=published_at).status_code, 304)
+        # в оглавлении живой рейтинг, черновик владельца меняется без публикации
+        self.assertNotIn('Last-Modified', self.request('get', 'course-detail', self.data.student))
+        self.assertNotIn('Last-Modified', self.request('get', 'lesson-detail', self.data.owner, module_num=1,
+                                                       lesson_num=1))
+
+    def test_lesson_added_after_publish_is_draft_only(self):
+        publishing.publish(self.course)
+        module = Module.objects.get(course=self.course, module_num=1)
+        Lesson.objects.create(module=module, lesson_num=3, lesson_title='New', lesson_description='')
+        lesson = {'module_num': 1, 'lesson_num': 3}
+        self.assertEqual(self.request('get', 'lesson-detail', self.data.student, **lesson).status_code, 404)
+        self.assertEqual(self.request('get', 'lesson-detail', self.data.owner, **lesson).status_code, 200)
+
+    def test_snapshots_are_compressed_and_immutable(self):
+        publishing.publish(self.course)
+        snapshot = LessonSnapshot.objects.get(course=self.course, version=1, module_num=2, lesson_num=1)
+        data = publishing.unpack(snapshot.data)
+        self.assertEqual([step['step_num'] for step in data['steps']], [1, 2])
+        self.assertLess(len(snapshot.data), len(json.dumps(data)))
+        with self.assertRaises(ValueError):
+            snapshot.save()
+        self.assertEqual(CourseSnapshot.objects.get(course=self.course).version, 1)
+
+    def test_publish_courses_command(self):
+        out = io.StringIO()
+        call_command('publish_courses', stdout=out)
+        call_command('publish_courses', stdout=out)
+        call_command('publish_courses', course=[self.course.id], stdout=out)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.published_version, 2)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=2, modules=2, lessons=2, steps=2, contents=1, students=1, messages=0)
+        cls.course = cls.data.course
+
+    def find(self, query, **params):
+        response = APIClient().get(reverse('course-search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranked_hits_link_to_their_place(self):
+        lesson = Lesson.objects.get(course=self.course, module__module_num=2, lesson_num=1)
+        content = Content.objects.get(step__lesson=lesson, step__step_num=2)
+        content.text = 'Разбираем <b>рекурсию</b> на примерах: рекурсия и стек вызовов'
+        content.save()
+        lesson.lesson_title = 'Рекурсия'
+        lesson.save()
+
+        hits = self.find('рекурсия')
+        self.assertEqual([hit['type'] for hit in hits], ['lesson', 'content'])
+        self.assertEqual(hits[0]['url'], 'http://testserver' + reverse('lesson-detail', kwargs={
+            'id': self.course.id, 'module_num': 2, 'lesson_num': 1}))
+        self.assertEqual((hits[1]['module_num'], hits[1]['lesson_num'], hits[1]['step_num']), (2, 1, 2))
+        self.assertEqual(hits[1]['title'], 'Рекурсия')
+        self.assertIn('<mark>рекурсия</mark>', hits[1]['snippet'])
+        self.assertIn('&lt;b&gt;', hits[1]['snippet'])
+        self.assertGreater(hits[0]['rank'], hits[1]['rank'])
+
+        self.assertEqual(len(self.find('lesson', limit=5)), 5)
+        self.assertEqual(self.find('lesson', offset=5, limit=50), self.find('lesson', limit=50)[5:])
+        self.assertEqual(self.find('несуществующее'), [])
+        self.assertEqual(APIClient().get(reverse('course-search')).status_code, 400)
+
+    def test_index_follows_saves_moves_and_deletes(self):
+        module = Module.objects.get(course=self.course, module_num=1)
+        module.module_title = 'Графы'
+        with self.assertNumQueries(2):
+            module.save()
+        self.assertEqual([hit['module_num'] for hit in self.find('графы')], [1])
+        # перенумерация не трогает индекс
+        module.module_num = 3
+        with self.assertNumQueries(1):
+            module.save()
+
+        other = self.data.courses[1]
+        module.course = other
+        module.module_num = 5
+        module.save()
+        self.assertEqual(SearchEntry.objects.filter(course=other, lesson__module=module).count(), 2)
+        self.assertEqual(SearchEntry.objects.filter(course=other, content__step__lesson__module=module).count(), 4)
+
+        module.delete()
+        self.assertEqual(self.find('графы'), [])
+        self.assertFalse(SearchEntry.objects.filter(course=other, module=None, lesson=None, content=None)
+                         .exclude(course_id=other.id).exists())
+
+    def test_clone_and_delete_keep_index_in_step(self):
+        Content.objects.filter(course=self.course).update(text='Уникальный текст')
+        self.assertEqual(self.find('уникальный'), [])
+        call_command('rebuild_search_index', '--course', str(self.course.id), stdout=io.StringIO())
+        self.assertEqual(len(self.find('уникальный', limit=50)), 8)
+
+        clone = cloning.clone_course(self.course, self.data.owner, title='Копия')
+        self.assertEqual(SearchEntry.objects.filter(course=clone).count(),
+                         SearchEntry.objects.filter(course=self.course).count())
+        self.assertEqual({hit['id'] for hit in self.find('уникальный', limit=50)}, {self.course.id, clone.id})
+
+        teardown.delete_course(self.course)
+        self.assertEqual({hit['id'] for hit in self.find('уникальный', limit=50)}, {clone.id})
+        self.assertEqual(search.rebuild(), SearchEntry.objects.count())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TypeaheadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=3, modules=1, lessons=1, steps=1, contents=1, students=1, messages=0)
+
+    def setUp(self):
+        typeahead.reset()
+
+    def tearDown(self):
+        typeahead.reset()
+
+    def complete(self, prefix, limit=10):
+        return [(hit['title'], hit['rating']) for hit in typeahead.complete(prefix, limit)]
+
+    def test_prefixes_of_any_word_ranked_by_rating(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.complete('cour'), [('Course 2', 2), ('Course 1', 1), ('Course 0', 0)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete(' COURSE  1'), [('Course 1', 1)])
+            self.assertEqual(self.complete('1', limit=5), [('Course 1', 1)])
+            self.assertEqual(self.complete('teach', limit=2), [('Course 2', 2), ('Course 1', 1)])
+            self.assertEqual(self.complete('python'), [])
+            self.assertEqual(self.complete('  '), [])
+
+    def test_signals_update_index_in_place(self):
+        self.complete('cour')
+        course = self.data.courses[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            course.title = 'Основы Python'
+            course.rating = 10
+            course.save()
+            Course.objects.create(title='Python для детей', description='', owner=self.data.student, rating=3,
+                                  preview='courses/seed/kids.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.data.student.first_name = 'Анна'
+            self.data.student.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.data.courses[1].delete()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('pyth'), [('Основы Python', 10), ('Python для детей', 3)])
+            self.assertEqual(self.complete('анна'), [('Python для детей', 3)])
+            self.assertEqual(self.complete('course'), [('Course 2', 2)])
+
+    def test_change_does_not_touch_index_being_read(self):
+        index = typeahead.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.data.courses[1].delete()
+        # читатель, взявший индекс до изменения, дочитывает его целиком
+        self.assertEqual([hit['title'] for hit in index.complete('cour', 10)], ['Course 2', 'Course 1', 'Course 0'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('cour'), [('Course 2', 2), ('Course 0', 0)])
+
+    def test_review_ratings_update_index(self):
+        self.complete('cour')
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(course=self.data.courses[0], user=self.data.student, rating=5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('course 0'), [('Course 0', 3)])
+
+        # округленный рейтинг не изменился: версия та же, другие процессы не перестраивают индекс
+        version = typeahead._published_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            review.rating = 4
+            review.save()
+        self.assertEqual(typeahead._published_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ratings.reconcile()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.complete('cour'), [('Course 0', 3), ('Course 1', 3), ('Course 2', 3)])
+
+    def test_other_process_change_rebuilds_index(self):
+        self.complete('cour')
+        Course.objects.filter(pk=self.data.courses[0].pk).update(title='Renamed')
+        # другой процесс опубликовал новую версию
+        cache_version = typeahead._published_version()
+        typeahead.cache.set(typeahead.VERSION_KEY, cache_version + 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.complete('cour')), 3)
+        with mock.patch.object(typeahead, 'TYPEAHEAD_CHECK_INTERVAL', 0), self.assertNumQueries(1):
+            self.assertEqual(self.complete('renamed'), [('Renamed', 0)])
+
+
+class RatingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=2, modules=1, lessons=1, steps=1, contents=1, students=3, messages=0)
+        cls.course = cls.data.course
+
+    def request(self, method, user, data=None, **kwargs):
+        client = APIClient()
+        client.force_authenticate(user)
+        name = 'review-detail' if kwargs else 'review-list'
+        return getattr(client, method)(reverse(name, kwargs={'id': self.course.id, **kwargs}), data)
+
+    def aggregates(self):
+        course = Course.objects.get(pk=self.course.pk)
+        return course.rating_sum, course.rating_count, round(course.rating_score, 4), course.rating
+
+    def test_reviews_update_aggregates(self):
+        first, second, _ = self.data.students
+        self.assertEqual(self.request('post', first, {'rating': 5, 'text': 'Отлично'}).status_code, 201)
+        response = self.request('post', second, {'rating': 2})
+        self.assertEqual(response.status_code, 201)
+        # (5 * 3 + 7) / (5 + 2)
+        self.assertEqual(self.aggregates(), (7, 2, 3.1429, 3))
+
+        self.assertEqual(self.request('put', second, {'rating': 5}, review_id=response.data['id']).status_code, 200)
+        self.assertEqual(self.aggregates(), (10, 2, 3.5714, 4))
+        self.assertEqual(self.request('delete', second, review_id=response.data['id']).status_code, 204)
+        self.assertEqual(self.aggregates(), (5, 1, 3.3333, 3))
+        self.assertEqual(self.request('get', first).data['results'][0]['rating'], 5)
+        self.assertEqual(ratings.reconcile()[1], 1)  # второй курс: rating из seed() != сглаженному
+        self.assertEqual(ratings.reconcile(), (2, 0))
+
+    def test_review_has_last_modified(self):
+        review_id = self.request('post', self.data.student, {'rating': 4}).data['id']
+        response = self.request('get', self.data.student, review_id=review_id)
+        self.assertEqual(response['Last-Modified'], http_date(Review.objects.get(pk=review_id).updated_at.timestamp()))
+
+    def test_who_can_review(self):
+        first, second, outsider = self.data.students
+        self.assertEqual(self.request('post', self.data.owner, {'rating': 5}).status_code, 400)
+        User.courses.through.objects.filter(user=outsider).delete()
+        self.assertEqual(self.request('post', outsider, {'rating': 5}).status_code, 400)
+        self.assertEqual(self.request('post', first, {'rating': 6}).status_code, 400)
+        review = self.request('post', first, {'rating': 4}).data['id']
+        self.assertEqual(self.request('post', first, {'rating': 3}).status_code, 400)
+        self.assertEqual(self.request('put', second, {'rating': 1}, review_id=review).status_code, 403)
+        self.assertEqual(self.aggregates()[:2], (4, 1))
+
+    def test_user_deletion_and_reconcile(self):
+        first, second, _ = self.data.students
+        Review.objects.create(course=self.course, user=first, rating=5)
+        Review.objects.create(course=self.course, user=second, rating=1)
+        Review.objects.create(course=self.data.courses[1], user=second, rating=3)
+        second.delete()
+        self.assertEqual(self.aggregates(), (5, 1, 3.3333, 3))
+        self.assertEqual(Course.objects.get(pk=self.data.courses[1].pk).rating_count, 0)
+
+        # удаление queryset'ом рейтинг не меняет - его чинит reconcile_ratings
+        Review.objects.filter(user=first).delete()
+        self.assertEqual(self.aggregates()[:2], (5, 1))
+        output = io.StringIO()
+        call_command('reconcile_ratings', '--batch-size', '1', stdout=output)
+        self.assertIn('Проверено курсов: 2, исправлено: 1', output.getvalue())
+        self.assertEqual(self.aggregates(), (0, 0, 3.0, 3))
+        self.assertEqual(list(Course.objects.order_by('-rating_score', 'pk').values_list('pk', flat=True)),
+                         [course.pk for course in self.data.courses])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class PathResolverTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=1, modules=2, lessons=2, steps=2, contents=0, students=1, messages=0)
+        cls.course = cls.data.course
+
+    def setUp(self):
+        paths.cache.clear()
+
+    def step_url(self, module_num, lesson_num, step_num):
+        return reverse('step-detail', kwargs={'id': self.course.id, 'module_num': module_num,
+                                              'lesson_num': lesson_num, 'step_num': step_num})
+
+    def test_index_is_built_in_one_query(self):
+        with self.assertNumQueries(1):
+            index = paths.get_index(self.course.id)
+        step = Step.objects.get(course=self.course, lesson__module__module_num=2, lesson__lesson_num=1, step_num=2)
+        _, lessons = index[2]
+        _, steps = lessons[1]
+        self.assertEqual(steps[2], step.id)
+
+    def test_step_fetch_is_primary_key_lookup(self):
+        paths.get_index(self.course.id)
+        with CaptureQueriesContext(connection) as queries:
+            step = paths.get_by_path(Step.objects.all(), self.course.id, 1, 2, 1)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0]['sql'])
+        self.assertEqual((step.lesson.lesson_num, step.step_num), (2, 1))
+
+    def test_structural_edit_invalidates_index(self):
+        self.assertEqual(self.client.get(self.step_url(1, 1, 3)).status_code, 404)
+        Step.objects.create(lesson=Lesson.objects.get(course=self.course, module__module_num=1, lesson_num=1),
+                            step_num=3)
+        self.assertEqual(self.client.get(self.step_url(1, 1, 3)).status_code, 200)
+
+        lesson = Lesson.objects.get(course=self.course, module__module_num=2, lesson_num=2)
+        lesson.lesson_title = 'Renamed'
+        # урок и его строка поискового индекса
+        with self.assertNumQueries(2):
+            lesson.save()
+        self.assertIsNotNone(paths.cache.get(paths._key(self.course.id)))
+
+        lesson.lesson_num = 3
+        lesson.save()
+        self.assertIsNone(paths.cache.get(paths._key(self.course.id)))
+        self.assertEqual(self.client.get(self.step_url(2, 3, 1)).status_code, 200)
+
+    def test_stale_index_is_rebuilt(self):
+        paths.get_index(self.course.id)
+        # перенумерация в обход save() не сбрасывает индекс
+        Step.objects.filter(course=self.course, step_num=1).update(step_num=5)
+        Step.objects.filter(course=self.course, step_num=2).update(step_num=1)
+        step = paths.get_by_path(Step.objects.all(), self.course.id, 1, 1, 1)
+        self.assertEqual(step.step_num, 1)
+        with self.assertRaises(Http404):
+            paths.get_by_path(Step.objects.all(), self.course.id, 1, 1, 2)
+
+
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=10, students=10, messages=30)
+
+    def test_hot_queries_use_indexes(self):
+        results = check_hot_queries(self.data)
+        self.assertEqual({name: scans for name, (scans, plan) in results.items() if scans}, {})
+
+    def test_unindexed_query_is_flagged(self):
+        scans, plan = sequential_scans(Course.objects.order_by('description'))
+        self.assertEqual(scans, ['courses_course'])
+
+    def test_course_list_filters_and_ordering(self):
+        def titles(params):
+            response = self.client.get(reverse('course-list'), params)
+            return [course['title'] for course in json.loads(b''.join(response.streaming_content))]
+
+        self.assertEqual(titles({'ordering': '-rating', 'min_rating': 8}), ['Course 9', 'Course 8'])
+        self.assertEqual(titles({'ordering': 'price', 'max_price': 100}), ['Course 0', 'Course 1'])
+        self.assertEqual(self.client.get(reverse('course-list'), {'max_price': 'free'}).status_code, 400)
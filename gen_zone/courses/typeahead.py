@@ -0,0 +1,281 @@
+"""
+Подсказки при наборе (typeahead) по названиям курсов и именам владельцев - из памяти процесса.
+
+Индекс - отсортированный список ключей (ключ, id курса), ключ - название или имя владельца
+в нижнем регистре с начала каждого слова ("основы python", "python"). Префикс запроса ищется
+bisect'ом, из найденного диапазона берутся k курсов с наибольшим рейтингом; к базе подсказка
+не обращается.
+
+Индекс строится одним запросом (values_list курсов с именами владельцев) при первом обращении
+в процессе. Сохранение и удаление курса, переименование пользователя, изменение рейтинга отзывами
+(сигналы, после коммита) поправляют копию индекса процесса, она целиком заменяет прежний, и увеличивают
+номер версии в общем кэше. Опубликованный индекс не меняется: читатели обходятся без блокировки. Другие процессы
+сверяют свой номер с кэшем не чаще раза в TYPEAHEAD_CHECK_INTERVAL секунд и при расхождении
+перестраивают индекс. Пропавший из кэша номер (перезапуск Redis, cache.clear()) заменяется
+новым - индекс перестраивается везде.
+"""
+import copy
+import heapq
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save
+
+from users.models import User
+from .models import Course, ratings_changed
+
+VERSION_KEY = 'courses:typeahead:version'
+# Как долго процесс отвечает по индексу, не сверяясь с версией в кэше (сек)
+TYPEAHEAD_CHECK_INTERVAL = 1.0
+TYPEAHEAD_MAX_RESULTS = 20
+# Диапазон короткого префикса - заметная часть индекса: ответы на них запоминаются до изменения
+MEMO_PREFIX_LENGTH = 3
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD.findall(text.casefold()))
+
+
+def keys(text):
+    """
+    Ключи текста: он сам и его хвосты с начала каждого слова.
+    """
+    words = normalize(text).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+def owner_name(first_name, last_name):
+    return f'{first_name} {last_name}'.strip()
+
+
+class TypeaheadIndex:
+    """
+    Индекс одного процесса. courses: id -> (название, рейтинг, id владельца), owners: id -> имя.
+    Меняется только копия (copy()), пока ее не видят читатели.
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.courses, self.owners, self.entries = {}, {}, []
+        self.memo = {}
+        for course_id, title, rating, owner_id, first_name, last_name in rows:
+            self.courses[course_id] = (title, rating, owner_id)
+            self.owners[owner_id] = owner_name(first_name, last_name)
+            self.entries.extend((key, course_id) for key in self._course_keys(course_id))
+        self.entries.sort()
+
+    def copy(self):
+        index = copy.copy(self)
+        index.courses, index.owners, index.entries = dict(self.courses), dict(self.owners), list(self.entries)
+        index.memo = {}
+        return index
+
+    def _course_keys(self, course_id):
+        title, _, owner_id = self.courses[course_id]
+        return keys(title) | keys(self.owners.get(owner_id, ''))
+
+    def _remove(self, course_id):
+        self.memo.clear()
+        for key in self._course_keys(course_id):
+            position = bisect_left(self.entries, (key, course_id))
+            if position < len(self.entries) and self.entries[position] == (key, course_id):
+                del self.entries[position]
+
+    def _insert(self, course_id):
+        self.memo.clear()
+        for key in self._course_keys(course_id):
+            insort(self.entries, (key, course_id))
+
+    def put_course(self, course_id, title, rating, owner_id, name):
+        if course_id in self.courses:
+            self._remove(course_id)
+        self.owners.setdefault(owner_id, name)
+        self.courses[course_id] = (title, rating, owner_id)
+        self._insert(course_id)
+
+    def drop_course(self, course_id):
+        if course_id in self.courses:
+            self._remove(course_id)
+            del self.courses[course_id]
+
+    def set_ratings(self, ratings):
+        """
+        ratings: id курса -> рейтинг. Ключи от рейтинга не зависят, меняются только courses.
+        """
+        self.memo.clear()
+        for course_id, rating in ratings.items():
+            if course_id in self.courses:
+                title, _, owner_id = self.courses[course_id]
+                self.courses[course_id] = (title, rating, owner_id)
+
+    def has_ratings(self, ratings):
+        return all(self.courses[course_id][1] == rating
+                   for course_id, rating in ratings.items() if course_id in self.courses)
+
+    def rename_owner(self, owner_id, name):
+        if owner_id not in self.owners:
+            return
+        owned = [course_id for course_id, (_, _, owner) in self.courses.items() if owner == owner_id]
+        for course_id in owned:
+            self._remove(course_id)
+        self.owners[owner_id] = name
+        for course_id in owned:
+            self._insert(course_id)
+
+    def complete(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= MEMO_PREFIX_LENGTH:
+            if (prefix, limit) not in self.memo:
+                self.memo[prefix, limit] = self._complete(prefix, limit)
+            return self.memo[prefix, limit]
+        return self._complete(prefix, limit)
+
+    def _complete(self, prefix, limit):
+        start = bisect_left(self.entries, (prefix,))
+        # '\U0010ffff' больше любого символа: конец диапазона ключей с этим префиксом
+        end = bisect_left(self.entries, (prefix + '\U0010ffff',), start)
+        found = {course_id for _, course_id in self.entries[start:end]}
+        best = heapq.nsmallest(limit, found, key=lambda course_id: (-self.courses[course_id][1], course_id))
+        return [{'id': course_id, 'title': self.courses[course_id][0], 'rating': self.courses[course_id][1],
+                 'owner': self.owners.get(self.courses[course_id][2], '')} for course_id in best]
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def _published_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().int >> 72)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _build(version):
+    rows = Course.objects.values_list('id', 'title', 'rating', 'owner_id', 'owner__first_name', 'owner__last_name')
+    return TypeaheadIndex(version, rows)
+
+
+def get_index():
+    """
+    Индекс процесса; строится заново, если номер версии в кэше изменился.
+    """
+    global _index
+    index = _index
+    if index is not None and time.monotonic() - index.checked_at < TYPEAHEAD_CHECK_INTERVAL:
+        return index
+    version = _published_version()
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = _build(version)
+        _index.checked_at = time.monotonic()
+        return _index
+
+
+def complete(prefix, limit=10):
+    """
+    До limit курсов, у которых название или имя владельца начинается с prefix (с любого слова),
+    по убыванию рейтинга: [{'id', 'title', 'rating', 'owner'}].
+    """
+    return get_index().complete(prefix, min(limit, TYPEAHEAD_MAX_RESULTS))
+
+
+def _apply(change):
+    """
+    Публикует новую версию и вносит change в копию индекса процесса, если он был актуален, -
+    копия заменяет индекс одним присваиванием; change возвращает False, если применить изменение
+    нельзя. Иначе индекс перестроится при следующем обращении.
+    """
+    global _index
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # номера нет в кэше: все процессы перестроят индекс
+        _published_version()
+        return
+    with _lock:
+        index = _index
+        if index is not None and index.version == version - 1:
+            index = index.copy()
+            if change(index) is not False:
+                index.version = version
+                _index = index
+                return
+        _index = None
+
+
+def reset():
+    """
+    Сбрасывает индекс процесса и публикует новую версию: индекс перестроится везде
+    (после bulk_create и update() курсов, в обход сигналов).
+    """
+    global _index
+    with _lock:
+        _index = None
+    cache.delete(VERSION_KEY)
+
+
+def course_saved(sender, instance, **kwargs):
+    values = (instance.pk, instance.title, instance.rating, instance.owner_id)
+    owner = instance.owner if Course.owner.is_cached(instance) else None
+
+    def change(index):
+        name = owner_name(owner.first_name, owner.last_name) if owner else index.owners.get(values[3])
+        if name is None:
+            # владельца нет в индексе, а имя без запроса к базе неизвестно
+            return False
+        index.put_course(*values, name)
+
+    transaction.on_commit(lambda: _apply(change))
+
+
+def course_deleted(sender, instance, **kwargs):
+    course_id = instance.pk
+    transaction.on_commit(lambda: _apply(lambda index: index.drop_course(course_id)))
+
+
+def course_ratings_changed(sender, course_ids, using=None, **kwargs):
+    """
+    Отзывы меняют рейтинг UPDATE'ом без post_save курса: после коммита новые рейтинги читаются
+    с основной базы одним запросом. Округленный рейтинг меняется редко - если индекс процесса
+    актуален и рейтинги в нем те же, версия не увеличивается и другие процессы не перестраиваются.
+    """
+    using = using or router.db_for_write(Course)
+
+    def refresh():
+        ratings = dict(Course.objects.using(using).filter(pk__in=course_ids).values_list('id', 'rating'))
+        index = _index
+        if index is not None and index.version == cache.get(VERSION_KEY) and index.has_ratings(ratings):
+            return
+        _apply(lambda index: index.set_ratings(ratings))
+
+    transaction.on_commit(refresh, using=using)
+
+
+def user_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        # у нового пользователя нет курсов; вход (last_login) и другие частичные сохранения имени не меняют
+        return
+    owner_id, name = instance.pk, owner_name(instance.first_name, instance.last_name)
+    index = _index
+    if index is not None and index.owners.get(owner_id, name) == name:
+        # не владелец курсов или имя не менялось
+        return
+    transaction.on_commit(lambda: _apply(lambda index: index.rename_owner(owner_id, name)))
+
+
+def connect():
+    post_save.connect(course_saved, sender=Course, dispatch_uid='courses.typeahead.course_saved')
+    post_delete.connect(course_deleted, sender=Course, dispatch_uid='courses.typeahead.course_deleted')
+    post_save.connect(user_saved, sender=User, dispatch_uid='courses.typeahead.user_saved')
+    ratings_changed.connect(course_ratings_changed, dispatch_uid='courses.typeahead.course_ratings_changed')
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import CourseListCreateView, ModuleCreateView, ModuleDetailView, LessonCreateView, LessonDetailView, StepCreateView, StepDetailView, CourseViewSet
+from .views import CourseListCreateView, CourseSearchView, CourseTypeaheadView, ReviewListCreateView, ReviewDetailView, ModuleCreateView, ModuleDetailView, LessonCreateView, LessonDetailView, StepCreateView, StepDetailView, CourseViewSet
 
 urlpatterns = [
     path('courses/', CourseListCreateView.as_view(), name='course-list'),
+    path('courses/search/', CourseSearchView.as_view(), name='course-search'),
+    path('courses/typeahead/', CourseTypeaheadView.as_view(), name='course-typeahead'),
     path('course/<int:id>/', CourseViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='course-detail'),
     path('course/<int:id>/module/', ModuleCreateView.as_view(), name='module-create'),
     path('course/<int:id>/module/<int:module_num>/', ModuleDetailView.as_view(), name='module-detail'),
@@ -16,6 +18,41 @@ urlpatterns = [
     path('course/<int:id>/remove_course/', CourseViewSet.as_view({'get': 'remove_course'}), name='remove-course'),
     path('course/<int:id>/add_favorite_course/', CourseViewSet.as_view({'get': 'add_favorite_course'}), name='add-favorite-course'),
     path('course/<int:id>/remove_favorite_course/', CourseViewSet.as_view({'get': 'remove_favorite_course'}),   name='remove-favorite-course'),
-    path('course/<int:id>/add_in_progress_course/', CourseViewSet.as_view({'get': 'add_course_in_progress'}), name='add-favorite-course'),
-    path('course/<int:id>/remove_in_progress_course/', CourseViewSet.as_view({'get': 'remove_course_in_progress'}),   name='remove-favorite-course'),
+    path('course/<int:id>/add_in_progress_course/', CourseViewSet.as_view({'get': 'add_course_in_progress'}), name='add-in-progress-course'),
+    path('course/<int:id>/remove_in_progress_course/', CourseViewSet.as_view({'get': 'remove_course_in_progress'}),   name='remove-in-progress-course'),
+    path('course/<int:id>/clone/', CourseViewSet.as_view({'post': 'clone'}), name='course-clone'),
+    path('course/<int:id>/publish/', CourseViewSet.as_view({'post': 'publish'}), name='course-publish'),
+    path('course/<int:id>/reviews/', ReviewListCreateView.as_view(), name='review-list'),
+    path('course/<int:id>/reviews/<int:review_id>/', ReviewDetailView.as_view(), name='review-detail'),
 ]
+
+# Бюджеты для courses/tests.py (см. gen_zone/testing.py):
+# имя URL -> метод -> (максимум запросов к БД, максимум байт ответа) на данных seed().
+# Вложенные маршруты меряются с холодным индексом путей (paths.py): +1 запрос на его построение
+# GET курса, урока и шага: +1 запрос на проверку опубликованной версии (publishing.py); seed() не публикует
+# Запись названий, описаний и текста: +1 запрос на объект - строка поискового индекса (search.py)
+# DELETE и копия курса (teardown.py, cloning.py) - постоянное число запросов, не зависит от размера дерева
+QUERY_BUDGETS = {
+    'course-list': {'GET': (34, 7800), 'POST': (11, 800)},
+    'course-search': {'GET': (2, 7000)},
+    # индекс подсказок строится одним запросом; кэш очищен - процесс перестраивает его
+    'course-typeahead': {'GET': (1, 1000)},
+    'course-detail': {'GET': (13, 2600), 'PUT': (14, 2600), 'DELETE': (23, 0)},
+    'module-create': {'POST': (5, 100)},
+    'module-detail': {'GET': (3, 600), 'PUT': (5, 600), 'DELETE': (15, 0)},
+    'lesson-create': {'POST': (6, 100)},
+    'lesson-detail': {'GET': (10, 1000), 'PUT': (8, 2200), 'DELETE': (13, 0)},
+    'step-create': {'POST': (5, 100)},
+    'step-detail': {'GET': (4, 700), 'PATCH': (9, 200)},
+    'add-course': {'GET': (3, 200)},
+    'remove-course': {'GET': (3, 200)},
+    'add-favorite-course': {'GET': (3, 100)},
+    'remove-favorite-course': {'GET': (3, 100)},
+    'add-in-progress-course': {'GET': (3, 200)},
+    'remove-in-progress-course': {'GET': (3, 200)},
+    'course-clone': {'POST': (17, 100)},
+    'course-publish': {'POST': (19, 100)},
+    # запись отзыва: строка отзыва и UPDATE суммы и числа оценок курса в одной транзакции (ratings.py)
+    'review-list': {'GET': (1, 600), 'POST': (6, 300)},
+    'review-detail': {'GET': (1, 300), 'PUT': (6, 300), 'DELETE': (6, 0)},
+}
@@ -0,0 +1,39 @@
+"""
+Нарезка видео уроков на HLS-сегменты.
+
+ffmpeg копирует потоки без перекодирования (-c copy), поэтому нарезка быстрая, но плеер
+получит исходные кодеки: для HLS в браузерах видео должно быть в H.264/AAC.
+Сегменты и плейлист пишутся в новый каталог рядом с видео: повторная нарезка не перезаписывает
+старые файлы, и клиент не увидит наполовину обновленный плейлист или сегменты другой нарезки,
+пока его кэшированные копии не истекут (MEDIA_MAX_AGE, см. MediaWhiteNoiseMiddleware).
+"""
+import os
+import shutil
+import subprocess
+
+from django.core.files.storage import default_storage
+
+HLS_SEGMENT_SECONDS = 6
+
+
+def segment_video(content, ffmpeg, segment_seconds=HLS_SEGMENT_SECONDS):
+    """
+    Нарезает content.video и сохраняет плейлист в content.hls.
+    Ошибка ffmpeg - subprocess.CalledProcessError, частично записанные сегменты удаляются.
+    """
+    root, _ = os.path.splitext(content.video.name)
+    directory = default_storage.get_available_name(f'{root}_hls')
+    path = default_storage.path(directory)
+    os.makedirs(path)
+    try:
+        subprocess.run([
+            ffmpeg, '-v', 'error', '-nostdin', '-i', content.video.path,
+            '-c', 'copy', '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(path, '%05d.ts'), os.path.join(path, 'index.m3u8'),
+        ], check=True, capture_output=True)
+    except subprocess.CalledProcessError:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+    content.hls.name = f'{directory}/index.m3u8'
+    content.save(update_fields=['hls'])
@@ -1,21 +1,33 @@
+from django.db import IntegrityError
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from .models import Course, Module, Lesson, Step, Content
-from .permissions import IsOwnerOrReadOnly
+from rest_framework.views import APIView
+from gen_zone.fast_json import StreamingListMixin
+from gen_zone.response_middleware import set_last_modified
+from .models import Course, Module, Lesson, Step, Content, Review
+from .cloning import clone_course
+from . import publishing, search, typeahead
+from .paths import get_by_path
+from .permissions import IsAuthorOrReadOnly, IsOwnerOrReadOnly
+from .teardown import delete_course
 from .serializers import (
     CourseSerializer,
     LessonSerializer,
     ModuleSerializer,
     StepSerializer,
-    ContentSerializer
+    ContentSerializer,
+    ReviewSerializer
 )
         
 
-class CourseListCreateView(generics.ListCreateAPIView):
+class CourseListCreateView(StreamingListMixin, generics.ListCreateAPIView):
     """
     Список всех курсов и создание нового курса:
     для создания курса нужно быть авторизованным
@@ -25,10 +37,29 @@ class CourseListCreateView(generics.ListCreateAPIView):
     - description: Описание курса.
     - owner: Владелец курса.
     - modules: модули -> уроки 
+    Список отдается потоком (StreamingListMixin).
+    Параметры списка (по индексам rating, rating_score и price):
+    - ordering: rating, -rating, rating_score, -rating_score, price, -price.
+    - min_rating: курсы с рейтингом не ниже.
+    - max_price: курсы не дороже.
     """
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['rating', 'rating_score', 'price']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        try:
+            if params.get('min_rating'):
+                queryset = queryset.filter(rating__gte=int(params['min_rating']))
+            if params.get('max_price'):
+                queryset = queryset.filter(price__lte=int(params['max_price']))
+        except ValueError:
+            raise ValidationError({'detail': 'min_rating и max_price должны быть целыми числами'})
+        return queryset
 
     def post(self, request):
         """
@@ -49,11 +80,69 @@ class CourseListCreateView(generics.ListCreateAPIView):
         else:
             return Response({"error": "Только зарегистрированные пользователи могут создавать курсы"}, status=status.HTTP_401_UNAUTHORIZED)
 
+class CourseSearchView(APIView):
+    """
+    Полнотекстовый поиск по курсам, модулям, урокам и тексту шагов (search.py).
+    Параметры:
+    - q (обязательный): запрос.
+    - limit: сколько результатов (по умолчанию 20, не больше 50).
+    - offset: сколько лучших результатов пропустить.
+    Ответ - список, лучшие совпадения первыми:
+    - type: course, module, lesson или content (текст шага).
+    - title: название найденного объекта (для content - урока), course_title: название курса.
+    - snippet: фрагмент текста, совпадения в <mark></mark>, остальное экранировано.
+    - rank: релевантность, больше - лучше.
+    - id, module_num, lesson_num, step_num и url: где найденное в курсе.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        params = request.query_params
+        query = params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'Обязательный параметр.'})
+        try:
+            limit = int(params.get('limit', 20))
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            raise ValidationError({'detail': 'limit и offset должны быть целыми числами'})
+        if limit < 1 or offset < 0:
+            raise ValidationError({'detail': 'limit должен быть положительным, offset - не меньше нуля'})
+
+        hits = search.search(query, limit, offset)
+        for hit in hits:
+            hit['url'] = request.build_absolute_uri(hit['url'])
+        return Response(hits, status=status.HTTP_200_OK)
+
+
+class CourseTypeaheadView(APIView):
+    """
+    Подсказки при наборе: курсы, у которых название или имя владельца начинается с q
+    (с начала любого слова), по убыванию рейтинга. Отвечает из памяти процесса (typeahead.py).
+    Параметры:
+    - q (обязательный): начало слова.
+    - limit: сколько подсказок (по умолчанию 10, не больше 20).
+    Ответ - список: id, title, rating, owner (имя владельца).
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            raise ValidationError({'detail': 'limit должен быть целым числом'})
+        if limit < 1:
+            raise ValidationError({'detail': 'limit должен быть положительным'})
+        return Response(typeahead.complete(request.query_params.get('q', ''), limit), status=status.HTTP_200_OK)
+
+
 class CourseViewSet(viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     lookup_field = 'id'
+    # add_course/remove_course и др. - GET с записью, проверки должны видеть свежие данные
+    use_primary_db = True
 
     @action(detail=True, methods=['get'])
     def add_course(self, request, id=None):
@@ -134,6 +223,36 @@ class CourseViewSet(viewsets.ModelViewSet):
             return Response({"error": f"Course {course.title} is not in favorites for user {user.email}"},
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'])
+    def clone(self, request, id=None):
+        """
+        Копия курса со всеми модулями, уроками, шагами и контентом для владельца курса.
+        Параметры:
+        - title (необязательный): название копии, по умолчанию как у курса.
+        Файлы не копируются, копия ссылается на те же.
+        """
+        course = self.get_object()
+        clone = clone_course(course, request.user, title=request.data.get('title'))
+        return Response({"success": f"Курс {course.title} скопирован", "id": clone.id},
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def publish(self, request, id=None):
+        """
+        Публикует текущий черновик курса новой версией: студенты видят ее вместо прежней.
+        """
+        course = self.get_object()
+        version = publishing.publish(course)
+        return Response({"success": f"Курс {course.title} опубликован", "version": version},
+                        status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        # студенты - из опубликованной версии, владелец - черновик
+        data = publishing.published_course(request, kwargs['id'])
+        if data is not None:
+            return Response(data)
+        return super().retrieve(request, *args, **kwargs)
+
     def get_course(self, id):
         return get_object_or_404(Course, id=id)
 
@@ -156,7 +275,8 @@ class CourseViewSet(viewsets.ModelViewSet):
         course = self.get_course(id)
         self.check_object_permissions(request, course)
 
-        course.delete()
+        # дерево удаляется запросами по course_id, файлы - фоновой уборкой
+        delete_course(course)
 
         return Response({"success": "Курс успешно удален"}, status=status.HTTP_204_NO_CONTENT)
 
@@ -229,9 +349,8 @@ class ModuleDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_object(self):
         id = self.kwargs.get('id')
         module_num = self.kwargs.get('module_num')
-        course = get_object_or_404(Course, id=id)
-
-        module = get_object_or_404(Module, course=course, module_num=module_num)
+        # курс нужен только для проверки владельца - одним запросом с модулем
+        module = get_by_path(Module.objects.select_related('course'), id, module_num)
         self.check_object_permissions(self.request, module)
         return module
         
@@ -262,7 +381,7 @@ class ModuleDetailView(generics.RetrieveUpdateDestroyAPIView):
     def destroy(self, request, *args, **kwargs):
         module = self.get_object()
         module_num = kwargs.get('module_num')
-        course = get_object_or_404(Course, id=module.course.id)
+        course = module.course
 
         module.delete()
         modules_to_update = course.modules.filter(module_num__gt=module_num)
@@ -310,8 +429,8 @@ class LessonCreateView(generics.CreateAPIView):
         module_num = kwargs.get('module_num')
         
         try:
-            module = Module.objects.get(course__id=id, module_num=module_num)
-        except Module.DoesNotExist:
+            module = get_by_path(Module.objects.all(), id, module_num)
+        except Http404:
             return Response({"error": "Модуль не найден"}, status=status.HTTP_404_NOT_FOUND)
         
         serializer = LessonSerializer(data=request.data)
@@ -356,10 +475,19 @@ class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
         lesson_num = self.kwargs.get('lesson_num')
         module_num = self.kwargs.get('module_num')
 
-        lesson = get_object_or_404(Lesson, module__course__id=id, module__module_num=module_num, lesson_num=lesson_num)
+        lesson = get_by_path(Lesson.objects.select_related('course'), id, module_num, lesson_num)
         return lesson
 
     def get(self, request, *args, **kwargs):
+        published, published_at = publishing.published_lesson(request, kwargs['id'], kwargs['module_num'],
+                                                              kwargs['lesson_num'])
+        if published is not None:
+            page = self.paginate_queryset(published['steps'])
+            if page:
+                published['steps'] = page
+                return set_last_modified(self.get_paginated_response(published), published_at)
+            return set_last_modified(Response(published), published_at)
+
         lesson = self.get_object()
 
         # Получаем номер страницы из параметра запроса
@@ -435,7 +563,7 @@ class StepCreateView(generics.CreateAPIView):
         module_num = self.kwargs.get('module_num')
         lesson_num = self.kwargs.get('lesson_num')
 
-        lesson = get_object_or_404(Lesson, module__course__id = id, module__module_num=module_num, lesson_num=lesson_num)
+        lesson = get_by_path(Lesson.objects.select_related('course'), id, module_num, lesson_num)
         self.check_object_permissions(request, lesson)
         serializer = StepSerializer(data=request.data)
         if serializer.is_valid():
@@ -471,13 +599,18 @@ class StepDetailView(generics.RetrieveUpdateDestroyAPIView):
         lesson_num = self.kwargs.get('lesson_num')
         step_num = self.kwargs.get('step_num')
 
-        step = get_object_or_404(Step, lesson__module__course__id = id,
-                                 lesson__module__module_num = module_num,
-                                 lesson__lesson_num = lesson_num,
-                                 step_num=step_num,)
+        step = get_by_path(Step.objects.select_related('course'), id, module_num, lesson_num, step_num)
         return step
 
     def get(self, request, *args, **kwargs):
+        published, published_at = publishing.published_lesson(request, kwargs['id'], kwargs['module_num'],
+                                                              kwargs['lesson_num'])
+        if published is not None:
+            for step in published['steps']:
+                if step['step_num'] == kwargs['step_num']:
+                    return set_last_modified(Response(step, status=status.HTTP_200_OK), published_at)
+            raise Http404
+
         step = self.get_object(self, request, *args, **kwargs)
         self.check_object_permissions(request, step)
         serializer = StepSerializer(step)
@@ -491,4 +624,57 @@ class StepDetailView(generics.RetrieveUpdateDestroyAPIView):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+
+class ReviewListCreateView(generics.ListCreateAPIView):
+    """
+    Отзывы о курсе и новый отзыв.
+    Параметры отзыва:
+    - rating (обязательный): оценка от 1 до 5.
+    - text: текст отзыва.
+    Оставить отзыв может записанный на курс пользователь, один раз; владелец курса - нет.
+    Сумма, число оценок и рейтинг курса обновляются вместе с отзывом (ratings.py).
+    Список - новые первыми, курсорная пагинация (?cursor=).
+    """
+    serializer_class = ReviewSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    class ReviewPagination(CursorPagination):
+        page_size = 20
+        ordering = '-created_at'
+
+    pagination_class = ReviewPagination
+
+    def get_queryset(self):
+        return Review.objects.filter(course_id=self.kwargs['id'])
+
+    def perform_create(self, serializer):
+        course = get_object_or_404(Course.objects.only('id', 'owner_id'), pk=self.kwargs['id'])
+        user = self.request.user
+        if course.owner_id == user.pk:
+            raise ValidationError({'detail': 'Нельзя оценить свой курс'})
+        if not user.courses.filter(pk=course.pk).exists():
+            raise ValidationError({'detail': 'Оценить курс могут только записанные на него'})
+        try:
+            serializer.save(course=course, user=user)
+        except IntegrityError:
+            raise ValidationError({'detail': 'Вы уже оставили отзыв об этом курсе'})
+
+
+class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Отзыв о курсе: получение, правка и удаление автором.
+    Параметры: rating (от 1 до 5), text.
+    """
+    serializer_class = ReviewSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    lookup_url_kwarg = 'review_id'
+
+    def get_queryset(self):
+        return Review.objects.filter(course_id=self.kwargs['id'])
+
+    def retrieve(self, request, *args, **kwargs):
+        review = self.get_object()
+        return set_last_modified(Response(self.get_serializer(review).data), review.updated_at)
@@ -0,0 +1,88 @@
+"""
+Кэшированная схема OpenAPI для /swagger.json, /swagger/ и /redoc/.
+
+drf_yasg на каждый запрос схемы обходит все view и сериализаторы, хотя схема меняется только
+вместе с кодом. Здесь она строится один раз на версию кода (code_version: хеш исходников
+проекта и версий DRF/drf_yasg), хранится в памяти процесса и в общем кэше Django, так что
+другие воркеры и перезапуски ее не пересчитывают. manage.py precompute_schema заполняет кэш при релизе.
+
+Адрес API (host и схема в спецификации) берется только из API_SCHEMA_URL. Если он не задан,
+в спецификации их нет, и Swagger UI обращается к тому адресу, с которого загрузил схему.
+Запрос в генерацию не передается: по заголовку Host клиент не может заставить сервер
+строить схему заново и заполнять кэш новыми ключами.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+import drf_yasg
+import rest_framework
+from django.conf import settings
+from django.core.cache import cache
+from drf_yasg import openapi
+from drf_yasg.renderers import _SpecRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+
+API_INFO = openapi.Info(
+    title="Your API",
+    default_version='v1',
+    description="Your API description"
+)
+# Схема прошлой версии кода вытесняется из общего кэша через это время (сек)
+SCHEMA_CACHE_TIMEOUT = 30 * 24 * 60 * 60
+# Схем в памяти процесса (разные версии)
+SCHEMA_MEMORY_ENTRIES = 16
+
+_schemas = {}
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    digest = hashlib.sha1(f'{rest_framework.VERSION} {drf_yasg.__version__}'.encode())
+    skip = {os.path.abspath(settings.MEDIA_ROOT), os.path.abspath(settings.STATIC_ROOT)}
+    for root, dirs, files in os.walk(settings.BASE_DIR):
+        dirs[:] = sorted(name for name in dirs if not name.startswith(('.', '__pycache__'))
+                         and os.path.join(root, name) not in skip)
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, settings.BASE_DIR).encode())
+                with open(path, 'rb') as file:
+                    digest.update(file.read())
+    return digest.hexdigest()[:12]
+
+
+def get_schema(version=''):
+    """
+    Схема версии API: из памяти, из общего кэша или, если ее там нет, сгенерированная
+    и сохраненная в оба.
+    """
+    key = f'openapi:{code_version()}:{settings.API_SCHEMA_URL}:{version}'
+    schema = _schemas.get(key)
+    if schema is not None:
+        return schema
+
+    schema = cache.get(key)
+    if schema is None:
+        generator = CachedSchemaView.generator_class(API_INFO, version, settings.API_SCHEMA_URL or None)
+        schema = generator.get_schema(None, public=True)
+        if schema is None:
+            raise PermissionDenied()
+        cache.set(key, schema, SCHEMA_CACHE_TIMEOUT)
+
+    if len(_schemas) >= SCHEMA_MEMORY_ENTRIES:
+        _schemas.clear()
+    _schemas[key] = schema
+    return schema
+
+
+class CachedSchemaView(get_schema_view(API_INFO, public=True, permission_classes=(permissions.AllowAny,))):
+
+    def get(self, request, version='', format=None):
+        if not isinstance(request.accepted_renderer, _SpecRenderer):
+            # страница Swagger UI/ReDoc не обходит view, сама схема загружается отдельным запросом
+            return super().get(request, version, format)
+        return Response(get_schema(request.version or version or ''))
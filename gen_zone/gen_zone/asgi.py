@@ -16,7 +16,7 @@ application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
         "websocket": AllowedHostsOriginValidator(
-            URLRouter(routing.websocket_urlpatterns)
+            WebSocketJWTAuthMiddleware(URLRouter(routing.websocket_urlpatterns))
         ),
 
     }
@@ -0,0 +1,228 @@
+"""
+Скомпилированные read-сериализаторы.
+
+DRF на каждый объект обходит `_readable_fields`, для каждого поля вызывает get_attribute
+и to_representation. Для горячих списков это основная стоимость CPU. Здесь по классу
+сериализатора один раз генерируется функция, которая строит тот же dict одним выражением:
+атрибуты читаются напрямую, простые поля приводятся через str/int, вложенные сериализаторы
+компилируются в собственные функции. Результат совпадает с DRF (см. тесты паритета в courses и chat).
+
+Напрямую читаются только поля модели без связи и менеджеры связей "ко многим". Остальные source
+(метод или свойство, прямая или обратная связь "к одному") читаются через Field.get_attribute, как
+в DRF: вызываемое значение вызывается, отсутствующий связанный объект дает None, а поле, для
+которого DRF бросил бы SkipField, в результат не попадает.
+
+Поддерживаются только поля с предсказуемым представлением; сериализатор с собственным
+to_representation, SerializerMethodField, source='*' или точечным source не компилируется
+(ImproperlyConfigured при первом использовании).
+
+Сериализатор подключается примесью CompiledRepresentationMixin. Функция строится по полям
+класса, поэтому сериализаторы, меняющие набор полей в __init__, подключать нельзя.
+"""
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import Manager
+from rest_framework import fields, relations, serializers
+from rest_framework.fields import SkipField
+from rest_framework.settings import api_settings
+
+# Поля, чье to_representation не зависит от контекста: вызываем связанный метод шаблонного поля
+_CONTEXT_FREE_FIELDS = (
+    fields.BooleanField, fields.ChoiceField, fields.DateTimeField, fields.DateField, fields.TimeField,
+    fields.DecimalField, fields.DurationField, fields.UUIDField, fields.JSONField,
+)
+# to_representation этих полей - просто приведение типа
+_CONVERTERS = {
+    fields.CharField.to_representation: 'str',
+    fields.IntegerField.to_representation: 'int',
+    fields.FloatField.to_representation: 'float',
+}
+
+_compiled = {}
+# значение поля, которое DRF пропустил бы (SkipField)
+_SKIP = object()
+
+
+def _file_url(value, context):
+    if not value:
+        return None
+    try:
+        url = value.url
+    except AttributeError:
+        return None
+    request = context.get('request', None)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _stored_file_url(storage):
+    def file_url(name, context):
+        if not name:
+            return None
+        request = context.get('request', None)
+        url = storage.url(name)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+    return file_url
+
+
+def _file_name(value, context):
+    return value.name if value else None
+
+
+def _all(value):
+    return value.all() if isinstance(value, Manager) else value
+
+
+def _read_attribute(field, convert):
+    """
+    Значение поля по Field.get_attribute, как в Serializer.to_representation.
+    """
+    def read(obj, context):
+        try:
+            value = field.get_attribute(obj)
+        except SkipField:
+            return _SKIP
+        return None if value is None else convert(value, context)
+    return read
+
+
+def _is_plain(model, attr):
+    # поле модели без связи или менеджер связи "ко многим": getattr без вызовов и запросов-сюрпризов
+    try:
+        field = model._meta.get_field(attr)
+    except (AttributeError, FieldDoesNotExist):
+        return False
+    return not field.is_relation or field.one_to_many or field.many_to_many
+
+
+def _is_foreign_key(model, attr):
+    try:
+        field = model._meta.get_field(attr)
+    except (AttributeError, FieldDoesNotExist):
+        return False
+    return field.concrete and (field.many_to_one or field.one_to_one)
+
+
+class _Compiler:
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.namespace = {'_all': _all, '_SKIP': _SKIP}
+        self.skippable = False
+
+    def bind(self, value):
+        name = f'_f{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def compile(self, serializer):
+        serializer_class = type(serializer)
+        if serializer_class.to_representation not in (serializers.Serializer.to_representation,
+                                                      CompiledRepresentationMixin.to_representation):
+            raise ImproperlyConfigured(f'{serializer_class.__name__} переопределяет to_representation')
+
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        outer_skippable, self.skippable = self.skippable, False
+        items = [f'{field.field_name!r}: {self.expression(field, model)}'
+                 for field in serializer._readable_fields]
+        source = 'def serialize(obj, context):\n    return {' + ', '.join(items) + '}\n'
+        if self.skippable:
+            source = ('def serialize(obj, context):\n    data = {' + ', '.join(items) + '}\n'
+                      '    return {key: value for key, value in data.items() if value is not _SKIP}\n')
+        self.skippable = outer_skippable
+        namespace = dict(self.namespace)
+        exec(compile(source, f'<compiled {serializer_class.__name__}>', 'exec'), namespace)
+        return namespace['serialize']
+
+    def expression(self, field, model):
+        name = f'{type(field.parent).__name__}.{field.field_name}'
+        if len(field.source_attrs) != 1:
+            raise ImproperlyConfigured(f'{name}: поддерживается только простой source')
+        attr = field.source_attrs[0]
+
+        if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None and _is_foreign_key(model, attr):
+            # как use_pk_only_optimization в DRF: значение внешнего ключа без запроса к связанной модели
+            return self.read(model._meta.get_field(attr).attname)
+
+        if self.rows or _is_plain(model, attr):
+            return self.representation(field, model, attr, self.read(attr))
+        if isinstance(field, relations.ManyRelatedField):
+            raise ImproperlyConfigured(f'{name}: связь по source, который не является полем модели')
+        # значение уже прочитано _read_attribute и не None
+        convert = eval(f'lambda value, context: {self.representation(field, model, attr, "value")}', self.namespace)
+        self.skippable = True
+        return f'{self.bind(_read_attribute(field, convert))}(obj, context)'
+
+    def representation(self, field, model, attr, value):
+        """
+        Выражение представления поля; value - выражение его значения.
+        """
+        name = f'{type(field.parent).__name__}.{field.field_name}'
+
+        if isinstance(field, relations.RelatedField):
+            raise ImproperlyConfigured(f'{name}: поддерживается только первичный ключ по внешнему ключу модели')
+
+        if isinstance(field, relations.ManyRelatedField):
+            child = field.child_relation
+            if self.rows or not isinstance(child, relations.PrimaryKeyRelatedField) or child.pk_field is not None:
+                raise ImproperlyConfigured(f'{name}: поддерживается только список первичных ключей')
+            return f'[item.pk for item in _all({value})]'
+
+        if isinstance(field, serializers.ListSerializer):
+            if self.rows:
+                raise ImproperlyConfigured(f'{name}: вложенные списки недоступны для строк .values()')
+            child = self.bind(self.compile(field.child))
+            return f'[{child}(item, context) for item in _all({value})]'
+
+        if isinstance(field, serializers.BaseSerializer):
+            if self.rows:
+                raise ImproperlyConfigured(f'{name}: вложенные объекты недоступны для строк .values()')
+            return self.guarded(value, f'{self.bind(self.compile(field))}(v, context)')
+
+        if isinstance(field, fields.FileField):
+            if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+                return f'({value} or None)' if self.rows else f'{self.bind(_file_name)}({value}, context)'
+            if self.rows:
+                storage = model._meta.get_field(attr).storage
+                return f'{self.bind(_stored_file_url(storage))}({value}, context)'
+            return f'{self.bind(_file_url)}({value}, context)'
+
+        converter = _CONVERTERS.get(type(field).to_representation)
+        if converter is not None:
+            return self.guarded(value, f'{converter}(v)')
+        if type(field).to_representation is fields.ReadOnlyField.to_representation:
+            return value
+        if isinstance(field, _CONTEXT_FREE_FIELDS):
+            return self.guarded(value, f'{self.bind(field.to_representation)}(v)')
+        raise ImproperlyConfigured(f'{name}: {type(field).__name__} не поддерживается')
+
+    def read(self, attr):
+        return f'obj[{attr!r}]' if self.rows else f'obj.{attr}'
+
+    def guarded(self, value, conversion):
+        # None не проходит через to_representation, как и в Serializer.to_representation
+        return f'(None if (v := {value}) is None else {conversion})'
+
+
+def compile_serializer(serializer_class, rows=False):
+    """
+    Функция (obj, context) -> dict для экземпляров модели или, при rows=True,
+    для строк .values() без аргументов (ключи - attname полей).
+    """
+    key = (serializer_class, rows)
+    function = _compiled.get(key)
+    if function is None:
+        function = _compiled[key] = _Compiler(rows).compile(serializer_class())
+    return function
+
+
+class CompiledRepresentationMixin:
+    """
+    Подключает скомпилированное представление к ModelSerializer.
+    Запись, валидация и схема остаются обычными DRF.
+    """
+
+    def to_representation(self, instance):
+        return compile_serializer(type(self))(instance, self.context)
@@ -0,0 +1,133 @@
+"""
+PostgreSQL backend с пулом соединений внутри процесса.
+
+Подключается через ENGINE = 'gen_zone.db_pool' (в settings управляется env DB_POOL).
+Под ASGI каждый запрос выполняется в своем контексте, и Django заводит для него
+отдельный DatabaseWrapper, поэтому CONN_MAX_AGE не переиспользует соединения между
+запросами. Пул общий на процесс: соединение берется из него на время запроса
+(или кадра websocket) и возвращается в конце (CONN_MAX_AGE = 0), а не закрывается.
+"""
+import threading
+import time
+from collections import deque
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2 import extensions
+
+from .creation import DatabaseCreation
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный LIFO-пул psycopg2-соединений.
+
+    - max_size: сколько простаивающих соединений держать; лишние при возврате закрываются.
+      Выдача не блокируется: одновременных соединений не больше, чем одновременных
+      запросов, а потерянное (не возвращенное) соединение не может "занять" пул навсегда.
+    - health_check_after: соединение, простоявшее дольше, проверяется SELECT 1 перед выдачей.
+    """
+
+    def __init__(self, max_size=10, health_check_after=30):
+        self.max_size = max_size
+        self.health_check_after = health_check_after
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, connect):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, released_at = self._idle.pop()
+            if self._is_healthy(connection, released_at):
+                return connection
+            connection.close()
+        return connect()
+
+    def release(self, connection):
+        try:
+            if not connection.closed:
+                status = connection.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    connection.close()
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+        except Exception:
+            connection.close()
+        if connection.closed:
+            return
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def _is_healthy(self, connection, released_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - released_at < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            connection.close()
+
+
+def get_pool(alias, settings_dict, conn_params):
+    # пул привязан и к параметрам подключения: тестовый раннер меняет NAME у того же alias
+    key = (alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = settings_dict.get('POOL_OPTIONS', {})
+            pool = _pools[key] = ConnectionPool(
+                max_size=int(options.get('max_size', 10)),
+                health_check_after=float(options.get('health_check_after', 30)),
+            )
+        return pool
+
+
+def close_pools(database_name):
+    with _pools_lock:
+        pools = [pool for (_, params), pool in _pools.items() if ('dbname', database_name) in params]
+    for pool in pools:
+        pool.close_all()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, settings_dict, alias='default'):
+        if settings_dict.get('CONN_MAX_AGE'):
+            raise ImproperlyConfigured(
+                'gen_zone.db_pool возвращает соединения в пул в конце запроса, CONN_MAX_AGE должен быть 0'
+            )
+        super().__init__(settings_dict, alias)
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, self.settings_dict, conn_params)
+        connection = self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # у соединения из пула super().get_new_connection не вызывался
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
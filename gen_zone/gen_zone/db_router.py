@@ -0,0 +1,88 @@
+"""
+Маршрутизация чтений на реплику.
+
+Чтения уходят в alias 'replica' только внутри безопасного HTTP-запроса (GET/HEAD/OPTIONS),
+который не отказался от реплики. Все остальное (запись, websocket, manage.py) идет в 'default'.
+Если в запросе была запись, последующие чтения этого запроса идут в primary,
+а клиент на REPLICA_PIN_SECONDS получает cookie, закрепляющую его за primary
+(read-your-writes при отставании реплики).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'db_pin_primary'
+
+# True - чтения этого контекста можно отдавать реплике
+_replica_reads = ContextVar('replica_reads', default=False)
+# True - в этом контексте была запись
+_wrote = ContextVar('wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_primary():
+    """
+    Явно отправляет все чтения блока в primary.
+    """
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _wrote.get() and replica_configured():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика содержит те же данные, что и primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтения с реплики для безопасных запросов.
+
+    View отказывается от реплики атрибутом `use_primary_db = True`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        allowed = (
+            request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+            and replica_configured()
+        )
+        replica_token = _replica_reads.set(allowed)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+            return response
+        finally:
+            _replica_reads.reset(replica_token)
+            _wrote.reset(wrote_token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        if getattr(view_class, 'use_primary_db', False):
+            _replica_reads.set(False)
+        return None
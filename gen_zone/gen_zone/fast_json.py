@@ -0,0 +1,131 @@
+"""
+Быстрый JSON для REST API.
+
+FastJSONRenderer и FastJSONParser используют orjson, если он установлен, и ведут себя как
+стандартные JSONRenderer/JSONParser DRF во всем остальном: те же компактные разделители,
+UTF-8 без экранирования, экранирование U+2028/U+2029, формат дат и Decimal из
+rest_framework.utils.encoders. Без orjson, для отступов (Browsable API, `; indent=4`) и для
+значений, которые orjson не умеет (целые больше 64 бит), работает реализация DRF.
+
+StreamingListMixin отдает неразбитые на страницы списки потоком: объекты читаются из базы
+пачками через QuerySet.iterator() и пишутся в ответ по мере сериализации.
+"""
+import contextvars
+from functools import partial
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from . import instrumentation
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # datetime и dataclass отдаются в encoders.JSONEncoder, чтобы формат совпадал с DRF
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+_default = encoders.JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        # orjson понимает только UTF-8 и всегда отвергает NaN/Infinity, как strict-режим DRF
+        if orjson is None or not self.strict or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class StreamingListMixin:
+    """
+    Для ListAPIView без пагинации. Ответ в JSON стримится пачками по stream_chunk_size объектов;
+    для других форматов (Browsable API) и при включенной пагинации работает обычный list().
+    """
+    stream_chunk_size = 100
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None or not isinstance(request.accepted_renderer, FastJSONRenderer):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        chunks = self.stream_chunks(queryset, serializer, request.accepted_renderer)
+        # тело пишется, когда middleware уже отработали: каждая пачка, со всеми вложенными
+        # запросами сериализатора, читается в контексте запроса - из той же базы
+        # (ReplicaRoutingMiddleware) и с учетом в его статистике (PerfInstrumentationMiddleware)
+        next_chunk = partial(contextvars.copy_context().run, self.next_chunk, chunks)
+
+        if isinstance(request._request, ASGIRequest):
+            # под ASGI синхронный итератор Django собрал бы целиком в память
+            content = self.async_chunks(next_chunk)
+        else:
+            content = iter(next_chunk, None)
+        return StreamingHttpResponse(content, content_type=request.accepted_renderer.media_type)
+
+    @staticmethod
+    def next_chunk(chunks):
+        stats = instrumentation.current_stats()
+        if stats is None:
+            return next(chunks, None)
+        with instrumentation.collect(stats):
+            chunk = next(chunks, None)
+        stats.response_bytes += len(chunk or b'')
+        return chunk
+
+    def stream_chunks(self, queryset, serializer, renderer):
+        iterator = queryset.iterator(chunk_size=self.stream_chunk_size)
+        separator = b'['
+        while True:
+            batch = [serializer.to_representation(obj) for obj in islice(iterator, self.stream_chunk_size)]
+            if not batch:
+                break
+            # '[a,b]' без скобок - элементы пачки через запятую
+            yield separator + renderer.render(batch)[1:-1]
+            separator = b','
+        yield b'[]' if separator == b'[' else b']'
+
+    @staticmethod
+    async def async_chunks(next_chunk):
+        # thread_sensitive: итерация идет в потоке запроса, где открыто соединение с базой
+        next_chunk = sync_to_async(next_chunk, thread_sensitive=True)
+        while True:
+            chunk = await next_chunk()
+            if chunk is None:
+                break
+            yield chunk
@@ -0,0 +1,258 @@
+"""
+Инструментация запросов и кадров websocket.
+
+На каждый HTTP-запрос (PerfInstrumentationMiddleware) и кадр ChatConsumer
+(InstrumentedConsumerMixin) считаются: количество запросов к БД, время в БД,
+повторяющиеся SQL (отпечатки), время сериализаторов DRF и размер ответа.
+HTTP-ответы получают заголовок Server-Timing, агрегаты копятся в процессе по
+имени URL и отдаются в /debug/perf/ (только staff). Потоковый ответ учитывается
+при закрытии: запросы, сделанные при отдаче тела (StreamingListMixin), входят в его статистику.
+
+Включается настройкой PERF_INSTRUMENTATION.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import ListSerializer, Serializer
+
+# Верхние границы корзин гистограмм
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, float('inf'))
+
+_current = ContextVar('perf_stats', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def fingerprint(sql):
+    """
+    Сводит SQL к форме без литералов: одинаковые отпечатки в одном запросе - признак N+1.
+    """
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _NUMBER.sub('?', sql)
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.response_bytes = 0
+        self.fingerprints = Counter()
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def elapsed(self):
+        return perf_counter() - self.started
+
+    def server_timing(self):
+        duplicated = sum(count - 1 for count in self.duplicates().values())
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {duplicated} dup"',
+            f'serializer;dur={self.serializer_time * 1000:.1f}',
+            f'total;dur={self.elapsed() * 1000:.1f}',
+        ])
+
+
+class QueryRecorder:
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.queries += 1
+            self.stats.db_time += perf_counter() - started
+            self.stats.fingerprints[fingerprint(sql)] += 1
+
+
+class EndpointAggregate:
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.response_bytes = 0
+        self.latency_histogram = [0] * len(LATENCY_BUCKETS_MS)
+        self.query_histogram = [0] * len(QUERY_BUCKETS)
+        self.duplicates = Counter()
+
+    def add(self, stats, elapsed):
+        self.count += 1
+        self.total_time += elapsed
+        self.db_time += stats.db_time
+        self.serializer_time += stats.serializer_time
+        self.queries += stats.queries
+        self.max_queries = max(self.max_queries, stats.queries)
+        self.response_bytes += stats.response_bytes
+        self.latency_histogram[bisect_left(LATENCY_BUCKETS_MS, elapsed * 1000)] += 1
+        self.query_histogram[bisect_left(QUERY_BUCKETS, stats.queries)] += 1
+        for sql, count in stats.duplicates().items():
+            self.duplicates[sql] += count - 1
+
+    def percentile_ms(self, percent):
+        """
+        Оценка перцентиля по гистограмме: верхняя граница корзины.
+        """
+        threshold = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_histogram):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_time * 1000, 1),
+            'p50_ms': self.percentile_ms(50),
+            'p95_ms': self.percentile_ms(95),
+            'avg_queries': round(self.queries / self.count, 1),
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_time * 1000 / self.count, 2),
+            'avg_serializer_ms': round(self.serializer_time * 1000 / self.count, 2),
+            'avg_response_bytes': self.response_bytes // self.count,
+            'latency_histogram': dict(zip(map(str, LATENCY_BUCKETS_MS), self.latency_histogram)),
+            'query_histogram': dict(zip(map(str, QUERY_BUCKETS), self.query_histogram)),
+            'duplicated_sql': [
+                {'sql': sql[:300], 'extra_executions': count}
+                for sql, count in self.duplicates.most_common(5)
+            ],
+        }
+
+
+_aggregates = {}
+_aggregates_lock = threading.Lock()
+
+
+def record(name, stats):
+    elapsed = stats.elapsed()
+    with _aggregates_lock:
+        _aggregates.setdefault(name, EndpointAggregate()).add(stats, elapsed)
+
+
+def top_offenders(order_by='total_ms', limit=20):
+    with _aggregates_lock:
+        rows = [{'name': name, **aggregate.as_dict()} for name, aggregate in _aggregates.items()]
+    return sorted(rows, key=lambda row: row[order_by], reverse=True)[:limit]
+
+
+def reset():
+    with _aggregates_lock:
+        _aggregates.clear()
+
+
+def current_stats():
+    return _current.get()
+
+
+class collect:
+    """
+    Контекст сбора статистики: вешает QueryRecorder на все соединения текущего контекста.
+    С stats продолжает сбор в уже начатую статистику (тело потокового ответа).
+    """
+
+    def __init__(self, stats=None):
+        self.resumed = stats
+
+    def __enter__(self):
+        self.stats = self.resumed or RequestStats()
+        self.token = _current.set(self.stats)
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(QueryRecorder(self.stats)))
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+        _current.reset(self.token)
+
+
+def _timed_data(data_property):
+    fget = data_property.fget
+
+    def data(self):
+        stats = _current.get()
+        # вложенные сериализаторы считаются в составе внешнего
+        if stats is None or stats.serializing:
+            return fget(self)
+        stats.serializing = True
+        started = perf_counter()
+        try:
+            return fget(self)
+        finally:
+            stats.serializer_time += perf_counter() - started
+            stats.serializing = False
+
+    data.instrumented = True
+    return property(data)
+
+
+def instrument_serializers():
+    for serializer_class in (Serializer, ListSerializer):
+        if not getattr(serializer_class.data.fget, 'instrumented', False):
+            serializer_class.data = _timed_data(serializer_class.data)
+
+
+class PerfInstrumentationMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        instrument_serializers()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with collect() as stats:
+            response = self.get_response(request)
+        # у потокового ответа заголовок уходит до тела: в нем только время до начала отдачи
+        response['Server-Timing'] = stats.server_timing()
+
+        match = request.resolver_match
+        name = match.view_name if match else 'unresolved'
+        if response.streaming:
+            response._resource_closers.append(lambda: record(name, stats))
+        else:
+            stats.response_bytes = len(response.content)
+            record(name, stats)
+        return response
+
+
+class InstrumentedConsumerMixin:
+    """
+    Для синхронных websocket-консьюмеров: статистика на каждый входящий кадр.
+    """
+
+    def websocket_receive(self, message):
+        if not settings.PERF_INSTRUMENTATION:
+            return super().websocket_receive(message)
+        instrument_serializers()
+        with collect() as stats:
+            super().websocket_receive(message)
+        record(f'ws:{type(self).__name__}', stats)
+
+    def send(self, text_data=None, bytes_data=None, close=False):
+        stats = _current.get()
+        if stats is not None:
+            stats.response_bytes += len(text_data.encode()) if text_data is not None else len(bytes_data or b'')
+        super().send(text_data=text_data, bytes_data=bytes_data, close=close)
@@ -0,0 +1,23 @@
+"""
+Генерирует схему OpenAPI текущей версии кода и кладет ее в общий кэш (см. gen_zone/api_schema.py),
+чтобы первый запрос к /swagger.json после релиза не ждал генерации. Запускается при релизе
+с теми же настройками (API_SCHEMA_URL, кэш), что и воркеры:
+
+    python manage.py precompute_schema
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gen_zone.api_schema import code_version, get_schema
+
+
+class Command(BaseCommand):
+    help = 'Предварительно генерирует и кэширует схему OpenAPI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--api-version', default='', help='версия API (request.version)')
+
+    def handle(self, *args, **options):
+        schema = get_schema(options['api_version'])
+        url = settings.API_SCHEMA_URL or 'адрес, с которого загружена схема'
+        self.stdout.write(f'схема {code_version()} для {url}: {len(schema["paths"])} путей')
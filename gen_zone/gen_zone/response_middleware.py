@@ -0,0 +1,209 @@
+"""
+Доставка ответов: сжатие, условные GET для API, раздача статики и медиа.
+
+- MediaWhiteNoiseMiddleware - whitenoise для статики и MEDIA_ROOT с Range-запросами
+  (перемотка видео) и передачей медиа фронтовому серверу (MEDIA_OFFLOAD).
+- CompressionMiddleware - brotli или gzip для текстовых ответов от COMPRESSION_MIN_SIZE байт.
+- ApiConditionalGetMiddleware - ETag, Last-Modified (set_last_modified) и 304 для ответов DRF.
+"""
+import os
+from urllib.parse import quote, urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.middleware.http import ConditionalGetMiddleware
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.regex_helper import _lazy_re_compile
+from rest_framework.response import Response
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import IsDirectoryError, MissingFileError
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Медиа (картинки, видео) уже сжаты, сжимаются только текстовые форматы
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'image/svg+xml', 'text/')
+# Максимальное качество (11) слишком медленное для сжатия на лету
+BROTLI_QUALITY = 5
+
+re_accepts_brotli = _lazy_re_compile(r'\bbr\b')
+
+# Размер блока при отдаче файлов (у FileResponse 4 КБ - слишком мелко для видео)
+FILE_BLOCK_SIZE = 256 * 1024
+# Заголовок для MEDIA_OFFLOAD
+OFFLOAD_HEADERS = {'x-accel-redirect': 'X-Accel-Redirect', 'x-sendfile': 'X-Sendfile'}
+
+
+def _brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in sequence:
+        # flush после каждого куска: клиент получает данные по мере стриминга
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _brotli_async_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    async for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def _read_blocks(file, block_size):
+    # не thread_sensitive: чтение файла не должно занимать поток, в котором работает ORM
+    read = sync_to_async(file.read, thread_sensitive=False)
+    while block := await read(block_size):
+        yield block
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    brotli, если клиент его принимает и установлен пакет Brotli, иначе gzip (GZipMiddleware Django).
+    Потоковые ответы сжимаются по кускам.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or not self.compressible(response):
+            return response
+        if brotli is not None and re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return self.compress_brotli(response)
+        return super().process_response(request, response)
+
+    @staticmethod
+    def compressible(response):
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return False
+        return response.streaming or len(response.content) >= settings.COMPRESSION_MIN_SIZE
+
+    @staticmethod
+    def compress_brotli(response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _brotli_async_sequence(response.streaming_content)
+            else:
+                response.streaming_content = _brotli_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # как в GZipMiddleware: сжатое тело уже не побайтово равно исходному
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+def set_last_modified(response, modified):
+    """
+    Last-Modified ответа API - для view, у данных которых есть надежное время изменения
+    (снимок публикации, updated_at). ApiConditionalGetMiddleware ответит 304 на If-Modified-Since.
+    """
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified.timestamp())
+    return response
+
+
+class ApiConditionalGetMiddleware(ConditionalGetMiddleware):
+    """
+    ETag по содержимому и 304 на If-None-Match для GET-ответов DRF; если view поставил
+    Last-Modified (set_last_modified), то и на If-Modified-Since. Клиенту предписано
+    перепроверять ответ при каждом запросе (no-cache), так что повторная загрузка без изменений
+    стоит один короткий 304 вместо всего тела. Потоковые ответы (StreamingListMixin) не трогаются.
+    """
+
+    def process_response(self, request, response):
+        if not isinstance(response, Response) or request.method not in ('GET', 'HEAD'):
+            return response
+        if not response.has_header('Cache-Control'):
+            patch_cache_control(response, private=True, no_cache=True)
+        return super().process_response(request, response)
+
+
+class MediaWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    Whitenoise, который кроме статики раздает MEDIA_ROOT.
+
+    Медиа загружаются во время работы, поэтому файл ищется на диске при запросе, а не при старте.
+    Пути загрузок детерминированы (content_upload_path): после удаления файла (teardown.sweep)
+    новый файл с тем же именем получит тот же URL. Поэтому медиа не кэшируется навсегда,
+    а живет в кэше MEDIA_MAX_AGE секунд и потом перепроверяется по ETag/Last-Modified.
+
+    Range-запросы (206) и условные запросы обрабатывает whitenoise. Под WSGI файл отдается через
+    wsgi.file_wrapper (sendfile без копирования в Python), под ASGI - асинхронно блоками
+    FILE_BLOCK_SIZE: синхронный итератор Django 4.2 под ASGI сначала прочитал бы файл в память целиком.
+    С MEDIA_OFFLOAD тело медиа отдает nginx (X-Accel-Redirect) или Apache (X-Sendfile), приложение
+    только проверяет наличие файла и ставит заголовки.
+    """
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        self.media_prefix = ensure_leading_trailing_slash(urlparse(settings.MEDIA_URL).path)
+        self.media_root = os.path.abspath(settings.MEDIA_ROOT).rstrip(os.path.sep) + os.path.sep
+        self.offload_header = OFFLOAD_HEADERS.get(settings.MEDIA_OFFLOAD)
+        self.offload_prefix = ensure_leading_trailing_slash(settings.MEDIA_OFFLOAD_PREFIX)
+        self.media_max_age = settings.MEDIA_MAX_AGE
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.media_prefix):
+            media_file = self.find_media_file(request.path_info)
+            if media_file is not None:
+                if self.offload_header and request.method in ('GET', 'HEAD'):
+                    return self.offload(media_file, request)
+                return self.serve(media_file, request)
+        return super().__call__(request)
+
+    def serve(self, static_file, request):
+        response = super().serve(static_file, request)
+        response.block_size = FILE_BLOCK_SIZE
+        if response.file_to_stream is not None and isinstance(request, ASGIRequest):
+            # файл уже в _resource_closers ответа и будет закрыт вместе с ним
+            response.streaming_content = _read_blocks(response.file_to_stream, FILE_BLOCK_SIZE)
+        return response
+
+    def offload(self, media_file, request):
+        # тип, кэш и ETag - от whitenoise, Range и условные запросы обработает фронтовой сервер
+        response = HttpResponse()
+        del response['Content-Type']
+        for key, value in media_file.get_response('HEAD', {}).headers:
+            if key != 'Content-Length':
+                response[key] = value
+        name = request.path_info[len(self.media_prefix):]
+        if self.offload_header == 'X-Accel-Redirect':
+            response[self.offload_header] = self.offload_prefix + quote(name)
+        else:
+            response[self.offload_header] = os.path.join(self.media_root, name)
+        return response
+
+    def find_media_file(self, url):
+        if not self.url_is_canonical(url):
+            return None
+        path = os.path.join(self.media_root, url[len(self.media_prefix):])
+        if os.path.commonprefix((self.media_root, path)) != self.media_root:
+            return None
+        try:
+            return self.find_file_at_path(path, url)
+        except (MissingFileError, IsDirectoryError):
+            return None
+
+    def add_cache_headers(self, headers, path, url):
+        if url.startswith(self.media_prefix):
+            headers['Cache-Control'] = f'max-age={self.media_max_age}, public'
+        else:
+            super().add_cache_headers(headers, path, url)
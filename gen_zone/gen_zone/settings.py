@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 import datetime
 from pathlib import Path
 import os
+import dj_database_url
 from dotenv import load_dotenv
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -60,10 +61,17 @@ INSTALLED_APPS = [
     'users',
     'courses',
     'chat',
+    'benchmarks',
+    'gen_zone',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # статика и медиа отдаются до остальных middleware и не сжимаются на лету
+    'gen_zone.response_middleware.MediaWhiteNoiseMiddleware',
+    'gen_zone.response_middleware.CompressionMiddleware',
+    'gen_zone.instrumentation.PerfInstrumentationMiddleware',
+    'gen_zone.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,8 +79,16 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # ниже CompressionMiddleware: ETag считается по несжатому телу
+    'gen_zone.response_middleware.ApiConditionalGetMiddleware',
 ]
 
+# Ответы меньше этого размера не сжимаются: выигрыш меньше накладных расходов
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Server-Timing и статистика запросов/времени по эндпоинтам (/debug/perf/)
+PERF_INSTRUMENTATION = int(os.environ.get('PERF_INSTRUMENTATION', DEBUG))
+
 ROOT_URLCONF = 'gen_zone.urls'
 
 TEMPLATES = [
@@ -109,6 +125,13 @@ CHANNEL_LAYERS = {
         }
     },
 }
+# Эфемерное состояние чата (присутствие, "печатает", троттлинг) живет в кэше, а не в Postgres
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://:{os.environ.get('REDIS_PASSWORD')}@{os.environ.get('REDIS_HOST')}:{os.environ.get('REDIS_PORT')}/1",
+    }
+}
 # CHANNEL_LAYERS = {
 #     "default": {
 #         "BACKEND": "channels.layers.InMemoryChannelLayer"
@@ -157,6 +180,37 @@ DATABASES = {
         'HOST': os.environ.get('POSTGRES_HOST', 'roundhouse.proxy.rlwy.net'),
     }
 }
+# DATABASE_URL (если задан) имеет приоритет над POSTGRES_*
+if os.environ.get('DATABASE_URL'):
+    DATABASES['default'] = dj_database_url.config()
+
+# Реплика только для чтения: безопасные запросы читают с нее (gen_zone/db_router.py)
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.config('DATABASE_REPLICA_URL')
+    # DATABASE_REPLICA_TEST_MIRROR=0 - отдельная тестовая база для реплики (проверка маршрутизации)
+    if int(os.environ.get('DATABASE_REPLICA_TEST_MIRROR', 1)):
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['gen_zone.db_router.PrimaryReplicaRouter']
+# Сколько секунд клиент после записи читает только из primary
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+for database in DATABASES.values():
+    # Постоянные соединения: без них каждый запрос открывает новое соединение к удаленному Postgres.
+    # Под WSGI/manage.py этого достаточно, под ASGI (uvicorn из Procfile) соединения
+    # между запросами переиспользует только пул ниже.
+    database['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+    database['CONN_HEALTH_CHECKS'] = True
+
+    # Пул соединений внутри процесса (отключается DB_POOL=0): соединение берется из пула
+    # на запрос и возвращается в него в конце запроса, поэтому CONN_MAX_AGE для пула всегда 0
+    if int(os.environ.get('DB_POOL', 1)) and database['ENGINE'] == 'django.db.backends.postgresql':
+        database['ENGINE'] = 'gen_zone.db_pool'
+        database['CONN_MAX_AGE'] = 0
+        database['POOL_OPTIONS'] = {
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'health_check_after': float(os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', 30)),
+        }
 
 
 # Password validation
@@ -199,6 +253,17 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static/')
 ]
 
+# collectstatic добавляет хеш в имена и предсжимает файлы (gzip, brotli),
+# whitenoise отдает хешированную статику с вечным кэшем
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
@@ -206,6 +271,17 @@ STATICFILES_DIRS = [
 #Media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Адрес API в схеме OpenAPI (https://host); пусто - без host, клиент берет адрес, откуда загрузил схему
+API_SCHEMA_URL = os.environ.get('API_SCHEMA_URL', '')
+
+# Отдача медиа фронтовым сервером: '' - само приложение, 'x-accel-redirect' - nginx
+# (internal location MEDIA_OFFLOAD_PREFIX с alias на MEDIA_ROOT), 'x-sendfile' - Apache/lighttpd
+MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD', '')
+MEDIA_OFFLOAD_PREFIX = os.environ.get('MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+# Сколько браузер держит медиа без перепроверки (сек): URL загрузок переиспользуются, вечный кэш нельзя
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 3600))
+# Файлы удаленных курсов удаляются фоновым потоком после коммита; 0 - только manage.py sweep_media (cron)
+MEDIA_SWEEP_IN_BACKGROUND = int(os.environ.get('MEDIA_SWEEP_IN_BACKGROUND', 1))
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -217,6 +293,16 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # orjson, если установлен; иначе поведение стандартных JSONRenderer/JSONParser
+    'DEFAULT_RENDERER_CLASSES': (
+        'gen_zone.fast_json.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'gen_zone.fast_json.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 
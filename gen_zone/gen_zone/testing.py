@@ -0,0 +1,175 @@
+"""
+Общие инструменты тестов: фабрика данных и проверка бюджетов эндпоинтов.
+
+Бюджеты объявляются рядом с маршрутами, в QUERY_BUDGETS каждого urls.py:
+имя URL -> HTTP-метод -> (максимум запросов к БД, максимум байт ответа).
+Числа рассчитаны на данные seed() с параметрами по умолчанию и холодный кэш.
+"""
+import io
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from chat.models import Conversation, Message
+from courses import search
+from courses.models import Content, Course, Lesson, Module, Step
+from users.models import User
+
+PASSWORD = 'Seed-password-1'
+# Кэш в памяти процесса вместо Redis из настроек
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def png_file(name='preview.png'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def seed(courses=3, modules=3, lessons=3, steps=3, contents=2, students=5, messages=30):
+    """
+    Заполняет базу реалистичным деревом: курсы -> модули -> уроки -> шаги -> контент,
+    студенты с записями на курсы и диалоги с сообщениями. Один bulk_create на уровень,
+    поисковый индекс строится по готовому дереву (search.rebuild).
+    """
+    owner = User.objects.create_user(email='owner@example.com', password=PASSWORD, first_name='Owner',
+                                     last_name='Teacher', username='Owner Teacher',
+                                     role=User.Roles.TEACHER, is_active=True)
+    # хеш пароля считается один раз: на больших масштабах (manage.py loadtest) это основная стоимость
+    password = make_password(PASSWORD)
+    student_list = User.objects.bulk_create([
+        User(email=f'student{number}@example.com', password=password, first_name='Student',
+             last_name=str(number), username=f'Student {number}', is_active=True)
+        for number in range(students)
+    ])
+
+    course_list = Course.objects.bulk_create([
+        Course(title=f'Course {number}', description='Course description ' * 5, owner=owner,
+               rating=number, price=100 * number, preview=f'courses/seed/preview_{number}.png')
+        for number in range(courses)
+    ])
+    module_list = Module.objects.bulk_create([
+        Module(course=course, module_num=number, module_title=f'Module {number}',
+               module_description='Module description ' * 3)
+        for course in course_list for number in range(1, modules + 1)
+    ])
+    lesson_list = Lesson.objects.bulk_create([
+        Lesson(module=module, course_id=module.course_id, lesson_num=number, lesson_title=f'Lesson {number}',
+               lesson_description='Lesson description ' * 3)
+        for module in module_list for number in range(1, lessons + 1)
+    ])
+    step_list = Step.objects.bulk_create([
+        Step(lesson=lesson, course_id=lesson.course_id, step_num=number)
+        for lesson in lesson_list for number in range(1, steps + 1)
+    ])
+    Content.objects.bulk_create([
+        Content(step=step, course_id=step.course_id, content_num=number, content_type=Content.TEXT_TYPE, text='Step text ' * 20)
+        for step in step_list for number in range(1, contents + 1)
+    ])
+    search.rebuild()
+
+    owner.courses_owned.add(*course_list)
+    User.courses.through.objects.bulk_create([
+        User.courses.through(user=student, course=course)
+        for student in student_list for course in course_list[:2]
+    ])
+    for relation in (User.courses_favorite, User.courses_in_progress):
+        relation.through.objects.bulk_create([
+            relation.through(user=student, course=course_list[0]) for student in student_list
+        ])
+
+    conversation_list = [
+        Conversation.objects.create(initiator=student, receiver=owner) for student in student_list
+    ]
+    Message.objects.bulk_create([
+        Message(conversation_id=conversation, sender=owner if number % 2 else conversation.initiator,
+                text=f'Message {number}')
+        for conversation in conversation_list for number in range(messages)
+    ])
+
+    return SimpleNamespace(owner=owner, student=student_list[0], students=student_list,
+                           courses=course_list, course=course_list[0],
+                           conversations=conversation_list, conversation=conversation_list[0])
+
+
+class EndpointBudgetMixin:
+    """
+    Примешивается к APITestCase. Прогоняет каждый запрос из endpoint_requests()
+    и сравнивает число запросов к БД и размер ответа с QUERY_BUDGETS модуля маршрутов.
+    Каждый запрос выполняется в откатываемой транзакции, поэтому DELETE не влияет на соседей.
+    """
+    urls_module = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root, CACHES=LOCAL_CACHES)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed()
+
+    def endpoint_requests(self):
+        """
+        {(имя URL, метод): dict(kwargs=..., data=..., user=..., format=..., status=...)}
+        Без status ожидается успешный ответ (< 400).
+        """
+        raise NotImplementedError
+
+    def test_every_endpoint_has_budget(self):
+        names = {pattern.name for pattern in self.urls_module.urlpatterns
+                 if isinstance(pattern, URLPattern) and pattern.name}
+        self.assertEqual(names - set(self.urls_module.QUERY_BUDGETS), set(), 'нет бюджета для маршрутов')
+        budgeted = {(name, method) for name, methods in self.urls_module.QUERY_BUDGETS.items() for method in methods}
+        self.assertEqual(budgeted ^ set(self.endpoint_requests()), set(),
+                         'бюджеты и запросы теста должны совпадать')
+
+    def test_endpoints_within_budget(self):
+        for (name, method), options in self.endpoint_requests().items():
+            max_queries, max_bytes = self.urls_module.QUERY_BUDGETS[name][method]
+            with self.subTest(url=name, method=method):
+                options = dict(options)
+                expected_status = options.pop('status', None)
+                queries, response, body = self.measure(name, method, **options)
+                if expected_status is None:
+                    self.assertLess(response.status_code, 400, body[:500])
+                else:
+                    self.assertEqual(response.status_code, expected_status, body[:500])
+                self.assertLessEqual(
+                    len(queries), max_queries,
+                    f'{method} {name}: {len(queries)} запросов при бюджете {max_queries}\n'
+                    + '\n'.join(query['sql'] for query in queries)
+                )
+                self.assertLessEqual(len(body), max_bytes, f'{method} {name}: {len(body)} байт при бюджете {max_bytes}')
+
+    def measure(self, name, method, kwargs=None, data=None, user=None, format=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        url = reverse(name, kwargs=kwargs)
+        # каждый запрос меряется с холодным кэшем, результат не зависит от порядка
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method.lower())(url, data=data, format=format)
+                # потоковый ответ читается внутри, его запросы к БД тоже считаются
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+            transaction.set_rollback(True)
+        return queries.captured_queries, response, body
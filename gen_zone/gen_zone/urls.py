@@ -15,23 +15,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.conf import settings
-from django.conf.urls.static import static
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 #Test
-from .views import HelloWorldView
+from .views import HealthView, HelloWorldView, PerfStatsView
+from .api_schema import CachedSchemaView
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Your API",
-        default_version='v1',
-        description="Your API description"
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+# схема кэшируется по версии кода (см. api_schema.py), cache_page не нужен
+schema_view = CachedSchemaView
 
 
 urlpatterns = [
@@ -42,11 +31,9 @@ urlpatterns = [
     # path('ws/', include('chat.routing.websocket_urlpatterns')),
     #Test
     path('', HelloWorldView.as_view(), name='hello_world'),
+    path('api/health/', HealthView.as_view(), name='health'),
+    path('debug/perf/', PerfStatsView.as_view(), name='perf-stats'),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
-
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
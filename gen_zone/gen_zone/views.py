@@ -1,11 +1,60 @@
+from django.db import connection
 from django.http import HttpResponse
+from rest_framework import status
 from rest_framework.decorators import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from users.models import User
+from . import instrumentation
 
 class HelloWorldView(APIView):
 
     def get(self, request):
         print(request.user)
         return HttpResponse("Hello, World!")
+
+
+class HealthView(APIView):
+    """
+    Проверка живости: один SELECT 1 к базе, без аутентификации и сериализации моделей.
+    На нем benchmarks/db_connections.py меряет стоимость соединения с БД.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return Response({'status': 'ok'})
+
+
+class PerfStatsView(APIView):
+    """
+    Топ эндпоинтов этого воркера по статистике PerfInstrumentationMiddleware.
+
+    Параметры:
+    - order_by: total_ms (по умолчанию), avg_queries, max_queries, avg_db_ms, avg_serializer_ms, avg_response_bytes.
+    - limit: количество строк (по умолчанию 20).
+    DELETE сбрасывает накопленную статистику.
+    """
+    permission_classes = [IsAdminUser]
+    order_fields = ('total_ms', 'avg_queries', 'max_queries', 'avg_db_ms', 'avg_serializer_ms', 'avg_response_bytes')
+
+    def get(self, request):
+        order_by = request.query_params.get('order_by', 'total_ms')
+        if order_by not in self.order_fields:
+            return Response({'error': f'order_by должен быть одним из {", ".join(self.order_fields)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError({'detail': 'limit должен быть целым числом'})
+        if limit < 1:
+            raise ValidationError({'detail': 'limit должен быть положительным'})
+        return Response(instrumentation.top_offenders(order_by, limit))
+
+    def delete(self, request):
+        instrumentation.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,3 +1,211 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from gen_zone import api_schema, instrumentation, response_middleware
+from gen_zone.testing import PASSWORD, EndpointBudgetMixin, seed
+from . import urls
+
+
+class UsersEndpointBudgetTests(EndpointBudgetMixin, APITestCase):
+    urls_module = urls
+
+    def endpoint_requests(self):
+        owner, student = self.data.owner, self.data.student
+        new_password = PASSWORD + '-new'
+        return {
+            ('register', 'POST'): dict(status=201, data={
+                'first_name': 'New', 'last_name': 'User', 'email': 'new@example.com',
+                'password': new_password, 'password_conf': new_password,
+            }),
+            ('email-verify', 'GET'): dict(data={'token': str(RefreshToken.for_user(student).access_token)}),
+            ('check_status', 'POST'): dict(data={'email': student.email}),
+            ('get-another-mail', 'POST'): dict(status=201, data={'email': student.email}),
+            ('login', 'POST'): dict(data={'email': student.email, 'password': PASSWORD}),
+            ('token_refresh', 'POST'): dict(data={'refresh': str(RefreshToken.for_user(student))}),
+            ('account-list', 'GET'): {},
+            ('account-detail', 'GET'): dict(kwargs={'pk': owner.pk}, user=owner),
+            ('account-detail', 'PUT'): dict(kwargs={'pk': student.pk}, user=student,
+                                            data={'first_name': 'Renamed', 'last_name': 'Student'}),
+            ('account-detail', 'DELETE'): dict(kwargs={'pk': student.pk}, user=student, status=204),
+            ('change-password', 'PUT'): dict(user=student, data={'old_password': PASSWORD,
+                                                                 'new_password': new_password}),
+        }
+
+
+class ResponseDeliveryTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(courses=1, students=3, messages=0)
+
+    def test_large_response_is_gzipped(self):
+        plain = self.client.get(reverse('account-list'))
+        response = self.client.get(reverse('account-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertGreater(len(plain.content), 1024)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+
+    @skipIf(response_middleware.brotli is None, 'Brotli не установлен')
+    def test_brotli_is_preferred(self):
+        response = self.client.get(reverse('account-list'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(response_middleware.brotli.decompress(response.content)),
+                         self.client.get(reverse('account-list')).json())
+
+    def test_small_response_is_not_compressed(self):
+        response = self.client.get(reverse('email-verify'), {'token': 'broken'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_unchanged_api_response_is_304(self):
+        response = self.client.get(reverse('account-list'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        cached = self.client.get(reverse('account-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+
+        response = self.client.get(reverse('account-list'), HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_media_is_revalidated(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, 'photos'))
+            with open(os.path.join(media_root, 'photos', 'avatar.png'), 'wb') as file:
+                file.write(b'png')
+
+            response = self.client.get('/media/photos/avatar.png')
+            self.assertEqual(response.status_code, 200)
+            # URL загрузок переиспользуются после удаления файла: вечного кэша нет
+            self.assertEqual(response['Cache-Control'], 'max-age=3600, public')
+            self.assertEqual(b''.join(response.streaming_content), b'png')
+            response.close()
+
+            self.assertEqual(self.client.get('/media/photos/missing.png').status_code, 404)
+            self.assertEqual(self.client.get('/media/photos/').status_code, 404)
+            self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+@override_settings(PERF_INSTRUMENTATION=1)
+class PerfInstrumentationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed(courses=1, students=3, messages=0)
+        cls.data.owner.is_staff = True
+        cls.data.owner.save(update_fields=['is_staff'])
+
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(instrumentation.fingerprint('SELECT * FROM t WHERE id = 5 AND x IN (%s, %s)'),
+                         instrumentation.fingerprint('SELECT * FROM t WHERE id = 17 AND x IN (%s)'))
+
+    def test_requests_are_timed_and_aggregated(self):
+        for _ in range(2):
+            response = self.client.get(reverse('account-list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ dup", serializer;dur=[\d.]+, total;dur=')
+
+        self.client.force_authenticate(self.data.owner)
+        rows = {row['name']: row for row in self.client.get(reverse('perf-stats'), {'limit': 5}).json()}
+        self.assertEqual(rows['account-list']['count'], 2)
+        self.assertEqual(rows['account-list']['avg_response_bytes'], len(response.content))
+        self.assertGreater(rows['account-list']['avg_queries'], 0)
+
+        self.assertEqual(self.client.delete(reverse('perf-stats')).status_code, 204)
+        self.assertNotIn('account-list', {row['name'] for row in self.client.get(reverse('perf-stats')).json()})
+
+    def test_streamed_body_is_counted(self):
+        response = self.client.get(reverse('course-list'))
+        body = b''.join(response.streaming_content)
+        response.close()
+
+        self.client.force_authenticate(self.data.owner)
+        rows = {row['name']: row for row in self.client.get(reverse('perf-stats')).json()}
+        self.assertEqual(rows['course-list']['avg_response_bytes'], len(body))
+        # курс и его модули читаются при отдаче тела, после выхода из middleware
+        self.assertGreaterEqual(rows['course-list']['avg_queries'], 2)
+
+    def test_stats_view_validates_parameters(self):
+        self.client.force_authenticate(self.data.student)
+        self.assertEqual(self.client.get(reverse('perf-stats')).status_code, 403)
+        self.client.force_authenticate(self.data.owner)
+        for params in ({'limit': 'abc'}, {'limit': 0}, {'order_by': 'title'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('perf-stats'), params).status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   API_SCHEMA_URL='')
+class ApiSchemaCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        api_schema._schemas.clear()
+        self.addCleanup(api_schema._schemas.clear)
+
+    def count_generations(self):
+        return mock.patch.object(OpenAPISchemaGenerator, 'get_schema', autospec=True,
+                                 side_effect=OpenAPISchemaGenerator.get_schema)
+
+    def test_schema_is_generated_once(self):
+        with self.count_generations() as get_schema:
+            first = self.client.get('/swagger.json')
+            second = self.client.get('/swagger.json')
+        self.assertEqual(get_schema.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertIn('/api/courses/courses/', first.json()['paths'])
+
+    def test_workers_share_cached_schema(self):
+        self.client.get('/swagger.json')
+        api_schema._schemas.clear()
+        with self.count_generations() as get_schema:
+            response = self.client.get('/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        get_schema.assert_not_called()
+
+    def test_host_header_does_not_change_schema(self):
+        with self.count_generations() as get_schema:
+            schemas = [self.client.get('/swagger.json', HTTP_HOST=host).json()
+                       for host in ('testserver', 'a.example.com', 'b.example.com')]
+        self.assertEqual(get_schema.call_count, 1)
+        self.assertNotIn('host', schemas[0])
+        self.assertEqual(schemas[1:], schemas[:1] * 2)
+
+    def test_configured_api_url(self):
+        with override_settings(API_SCHEMA_URL='https://api.example.com'):
+            schema = self.client.get('/swagger.json', HTTP_HOST='other.example.com').json()
+        self.assertEqual((schema['host'], schema['schemes']), ('api.example.com', ['https']))
+
+    def test_precompute_schema(self):
+        call_command('precompute_schema', stdout=io.StringIO())
+        api_schema._schemas.clear()
+        with self.count_generations() as get_schema:
+            response = self.client.get('/swagger.json')
+        get_schema.assert_not_called()
+        self.assertIn('/api/courses/courses/', response.json()['paths'])
+
+
+class HealthViewTests(APITestCase):
+
+    def test_health_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('health'))
+        self.assertEqual(response.json(), {'status': 'ok'})
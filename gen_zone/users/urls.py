@@ -12,4 +12,19 @@ urlpatterns = [
     path('list/', views.AllUsersView.as_view(), name='account-list'),
     path('<int:pk>/', views.UserDetailView.as_view(), name='account-detail'),
     path('change-password/', views.ChangePasswordView.as_view(), name='change-password'),
-]
\ No newline at end of file
+]
+
+# Бюджеты для users/tests.py (см. gen_zone/testing.py):
+# имя URL -> метод -> (максимум запросов к БД, максимум байт ответа) на данных seed()
+# DELETE пользователя: +2 запроса на его отзывы - вычесть оценки из курсов и удалить (courses/ratings.py)
+QUERY_BUDGETS = {
+    'register': {'POST': (4, 300)},
+    'email-verify': {'GET': (1, 100)},
+    'check_status': {'POST': (1, 100)},
+    'get-another-mail': {'POST': (1, 100)},
+    'login': {'POST': (1, 800)},
+    'token_refresh': {'POST': (0, 300)},
+    'account-list': {'GET': (278, 62000)},
+    'account-detail': {'GET': (38, 8100), 'PUT': (50, 11000), 'DELETE': (15, 0)},
+    'change-password': {'PUT': (1, 100)},
+}
\ No newline at end of file
@@ -143,6 +143,8 @@ class RegisterView(viewsets.GenericViewSet):
 
 class VerifyEmailView(generics.GenericAPIView):
     serializer_class = EmailVerificationSerializer
+    # GET с записью: пользователь читается из primary, а не с реплики
+    use_primary_db = True
 
     def get(self, request):
         """